@@ -0,0 +1,182 @@
+"""Micro-benchmarks for AggregationService.update_aggregation.
+
+Feeds synthetic review sets into the aggregation engine through in-memory
+collections and records wall time and peak memory per review count.
+
+Usage (from image/):
+    python benchmarks/bench_aggregation.py
+    python benchmarks/bench_aggregation.py --sizes 10 1000 100000
+    python benchmarks/bench_aggregation.py --save-baseline
+    python benchmarks/bench_aggregation.py --check --tolerance 0.25
+
+``--check`` exits with status 1 when any size is slower or uses more memory
+than the stored baseline by more than the tolerance.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from fakes import FakeCollection, FakeDatabase, new_gid
+
+from db.mongodb import db
+from models.aggregation_model import AggregationCreate
+from services.aggregation_service import AggregationService
+
+DEFAULT_SIZES = [10, 100, 1_000, 10_000, 100_000, 1_000_000]
+BASELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "baselines", "aggregation.json"
+)
+
+# Reviews are drawn from a fixed pool so a 1M review set costs one list of
+# references rather than a million distinct dicts.
+REVIEW_POOL_SIZE = 1_000
+
+TEXTS = [
+    "Ramps at both entrances, the side door is heavy though.",
+    "Quiet study rooms on the second floor.",
+    "Signage is clear but the elevator is slow.",
+    "Staff were helpful and the restrooms were accessible.",
+    "",
+]
+
+
+def make_review_pool(gid: str, seed: int = 0):
+    rng = random.Random(seed)
+    defaults = AggregationCreate(GID=gid)
+    categories = [
+        field[: -len("_dict")]
+        for field in AggregationCreate.model_fields
+        if field.endswith("_dict")
+    ]
+
+    pool = []
+    for _ in range(REVIEW_POOL_SIZE):
+        review = {"GID": gid, "user_name": f"user{rng.randrange(10_000)}"}
+        for category in categories:
+            features = getattr(defaults, f"{category}_dict")
+            review[f"{category}_dict"] = {
+                key: rng.choice(["True", "False", "true", "n/a"]) for key in features
+            }
+            review[f"{category}_rating"] = rng.randint(0, 5)
+            review[f"{category}_text"] = rng.choice(TEXTS)
+        pool.append(review)
+    return pool
+
+
+def make_reviews(size: int, pool):
+    return [pool[i % len(pool)] for i in range(size)]
+
+
+def install_fake_db(gid: str, reviews):
+    db.db = FakeDatabase(
+        reviews=FakeCollection(reviews),
+        aggregation=FakeCollection(),
+    )
+
+
+def run_once(gid: str, reviews, trace_memory: bool):
+    install_fake_db(gid, reviews)
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    asyncio.run(AggregationService.update_aggregation(gid))
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def bench_size(size: int, repeats: int):
+    gid = new_gid()
+    reviews = make_reviews(size, make_review_pool(gid))
+
+    # Timing and memory are measured in separate passes because tracemalloc
+    # slows allocation-heavy code down by a large factor.
+    runs = max(1, repeats if size <= 100_000 else 1)
+    wall = min(run_once(gid, reviews, trace_memory=False)[0] for _ in range(runs))
+    _, peak = run_once(gid, reviews, trace_memory=True)
+
+    return {
+        "reviews": size,
+        "wall_s": round(wall, 6),
+        "per_review_us": round(wall / size * 1e6, 3),
+        "peak_mb": round(peak / (1024 * 1024), 3),
+    }
+
+
+def load_baseline():
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH) as f:
+        return json.load(f)
+
+
+def save_baseline(results):
+    os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+    baseline = load_baseline()
+    baseline.update({str(r["reviews"]): r for r in results})
+    with open(BASELINE_PATH, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def check_regressions(results, tolerance: float):
+    baseline = load_baseline()
+    regressions = []
+    for result in results:
+        expected = baseline.get(str(result["reviews"]))
+        if not expected:
+            continue
+        for metric in ("wall_s", "peak_mb"):
+            limit = expected[metric] * (1 + tolerance)
+            if result[metric] > limit:
+                regressions.append(
+                    f"{result['reviews']} reviews: {metric} {result[metric]} "
+                    f"> {limit:.6f} (baseline {expected[metric]})"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.20)
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        result = bench_size(size, args.repeats)
+        results.append(result)
+        print(
+            f"{result['reviews']:>9} reviews  {result['wall_s']:>10.4f}s  "
+            f"{result['per_review_us']:>8.2f}us/review  {result['peak_mb']:>9.2f}MB peak"
+        )
+
+    if args.save_baseline:
+        save_baseline(results)
+        print(f"Baseline written to {BASELINE_PATH}")
+
+    if args.check:
+        regressions = check_regressions(results, args.tolerance)
+        if regressions:
+            print("Regressions detected:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Build time, update cost and query latency of the building autocomplete index.
+
+Indexes synthetic buildings with multi-word names and street addresses, then
+reports build time, the latency of re-indexing one renamed building (what a
+create or update costs) and latency percentiles for prefix, multi-word and
+misspelled queries.
+
+Usage (from image/):
+    python benchmarks/bench_autocomplete.py --buildings 50000
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+# Imported for its side effects only: it puts src/ on sys.path and sets the
+# environment Settings() requires, before any service module is imported.
+import fakes  # noqa: F401
+
+from services.building_autocomplete_service import BuildingAutocompleteIndex
+
+WORDS = (
+    "north south east west main oak pine maple cedar elm river lake hill park "
+    "memorial science arts student health campus city county public central "
+    "grand union market harbor valley summit liberty franklin lincoln madison"
+).split()
+KINDS = (
+    "library hall center museum gym cafe pool arena theatre school college "
+    "tower annex lab clinic hospital station stadium gallery church"
+).split()
+SUFFIXES = ["St", "Ave", "Rd", "Blvd", "Way", "Ln", "Dr"]
+QUERIES = {
+    "prefix": ["m", "ma", "mem", "memorial", "lib", "sci", "gra", "har"],
+    "words": ["main lib", "oak park mus", "city hall", "12 main", "student cen"],
+    "typo": ["libary", "musuem", "stadum", "memorail", "hospitl", "galery"],
+}
+
+
+def make_building(i, rng):
+    name = " ".join(rng.choice(WORDS).title() for _ in range(rng.randint(1, 3)))
+    return {
+        "GID": f"bench-gid-{i}",
+        "buildingName": f"{name} {rng.choice(KINDS).title()}",
+        "address": (
+            f"{rng.randint(1, 9999)} {rng.choice(WORDS).title()} "
+            f"{rng.choice(SUFFIXES)}, {rng.choice(WORDS).title()}ville"
+        ),
+        "category": "bench",
+        "latitude": 0.0,
+        "longitude": 0.0,
+    }
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--buildings", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    buildings = [make_building(i, rng) for i in range(args.buildings)]
+
+    start = time.perf_counter()
+    index = BuildingAutocompleteIndex.build(buildings)
+    build_seconds = time.perf_counter() - start
+
+    update_ms = []
+    for _ in range(200):
+        renamed = make_building(rng.randrange(args.buildings), rng)
+        start = time.perf_counter()
+        index.replace(renamed)
+        update_ms.append((time.perf_counter() - start) * 1000)
+
+    stats = index.stats()
+    print(
+        f"{stats['buildings']} buildings, {stats['entries']} entries "
+        f"({stats['array_bytes'] / 2**20:.1f} MB of arrays), "
+        f"built in {build_seconds:.2f}s"
+    )
+    print(
+        f"re-index one building: median {statistics.median(update_ms):.3f} ms, "
+        f"p95 {percentile(update_ms, 0.95):.3f} ms"
+    )
+    for kind, queries in QUERIES.items():
+        query_ms = []
+        for i in range(args.queries):
+            start = time.perf_counter()
+            index.search(queries[i % len(queries)], args.k)
+            query_ms.append((time.perf_counter() - start) * 1000)
+        print(
+            f"{kind} queries top-{args.k}: "
+            f"median {statistics.median(query_ms):.3f} ms, "
+            f"p95 {percentile(query_ms, 0.95):.3f} ms, "
+            f"p99 {percentile(query_ms, 0.99):.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Compares the legacy HTTP review bridge with the in-process atomic update.
+
+The legacy path replays what the old ``review_bulding_bridge.main`` did per
+review: an HTTP GET of the building from the public API followed by an HTTP
+POST to update-building. The in-process path calls
+``ReviewBuildingBridge.apply_review``, one ``find_one_and_update`` against
+MongoDB. Both run against real services, so the database settings come from
+the usual environment/.env and the API base URL is passed explicitly.
+
+Usage (from image/):
+    python benchmarks/bench_review_bridge.py --gid <GID> --samples 50 \\
+        --legacy-url https://<function-url>/api/buildings
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from app_logic.review_bulding_bridge import ReviewBuildingBridge  # noqa: E402
+from db.mongodb import close_mongo_connection, connect_to_mongo  # noqa: E402
+from models.review_model import ReviewCreate  # noqa: E402
+
+
+def summarize(name, samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(
+        f"{name:<12} n={len(samples):<4} mean={statistics.mean(samples) * 1000:8.1f}ms "
+        f"p50={statistics.median(samples) * 1000:8.1f}ms p95={p95 * 1000:8.1f}ms"
+    )
+
+
+def bench_legacy(base_url, gid, samples):
+    import requests
+
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        building = requests.get(f"{base_url}/{gid}").json()
+        building["mobility_accessibility_count"] += 1
+        requests.post(f"{base_url}/update-building", json=building)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def bench_in_process(gid, samples):
+    await connect_to_mongo()
+    try:
+        review = ReviewCreate(
+            GID=gid, user_name="benchmark", mobility_accessibility_rating=4
+        )
+        timings = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            await ReviewBuildingBridge.apply_review(review)
+            timings.append(time.perf_counter() - start)
+        return timings
+    finally:
+        await close_mongo_connection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--gid", required=True, help="GID of a disposable building")
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--legacy-url", help="Base URL of /api/buildings")
+    args = parser.parse_args()
+
+    if args.legacy_url:
+        summarize("legacy-http", bench_legacy(args.legacy_url, args.gid, args.samples))
+    summarize("in-process", asyncio.run(bench_in_process(args.gid, args.samples)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Index size and query latency of the review search index.
+
+Builds a ReviewSearchIndex over synthetic review texts spread across
+buildings, then reports build time, index memory, the latency of re-indexing
+one building (what a new review costs) and query latency percentiles.
+
+Usage (from image/):
+    python benchmarks/bench_search.py --reviews 100000 --buildings 10000
+    python benchmarks/bench_search.py --reviews 100000 --save-baseline
+    python benchmarks/bench_search.py --reviews 100000 --check --tolerance 0.25
+
+``--check`` exits with status 1 when the build, the index or query latency
+is worse than the stored baseline for the same review count by more than the
+tolerance.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+# Imported for its side effects only: it puts src/ on sys.path and sets the
+# environment Settings() requires, before any service module is imported.
+import fakes  # noqa: F401
+
+from models.aggregation_model import ACCESSIBILITY_CATEGORIES
+from services.review_search_service import ReviewSearchIndex
+
+BASELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "baselines", "search.json"
+)
+CHECKED_METRICS = ("build_s", "index_mb", "query_p95_ms")
+
+PHRASES = [
+    "quiet study rooms upstairs",
+    "the ramp at the side entrance is steep",
+    "staff were helpful and patient",
+    "elevator was out of order",
+    "braille signage on every floor",
+    "hearing loop at the front desk",
+    "gender neutral restroom near the lobby",
+    "loud music made it hard to focus",
+    "wide aisles and automatic doors",
+    "dim lighting and no captions on screens",
+    "clear signs and a simple layout",
+    "changing table in the family restroom",
+]
+QUERIES = [
+    "quiet study room",
+    "wheelchair ramp entrance",
+    "hearing loop",
+    "gender neutral bathroom",
+    "braille signs",
+    "automatic doors wide aisles",
+    "captions",
+    "helpful staff",
+]
+
+
+def make_entries(reviews, buildings, seed):
+    rng = random.Random(seed)
+    entries = {}
+    for _ in range(reviews):
+        GID = f"bench-gid-{rng.randrange(buildings)}"
+        text = ". ".join(rng.sample(PHRASES, rng.randint(1, 3)))
+        entries.setdefault(GID, []).append((rng.choice(ACCESSIBILITY_CATEGORIES), text))
+    return entries
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def load_baseline():
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH) as f:
+        return json.load(f)
+
+
+def save_baseline(result):
+    os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+    baseline = load_baseline()
+    baseline[str(result["reviews"])] = result
+    with open(BASELINE_PATH, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def check_regressions(result, tolerance: float):
+    expected = load_baseline().get(str(result["reviews"]))
+    if not expected:
+        return []
+    regressions = []
+    for metric in CHECKED_METRICS:
+        limit = expected[metric] * (1 + tolerance)
+        if result[metric] > limit:
+            regressions.append(
+                f"{result['reviews']} reviews: {metric} {result[metric]} "
+                f"> {limit:.6f} (baseline {expected[metric]})"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reviews", type=int, default=100_000)
+    parser.add_argument("--buildings", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.20)
+    args = parser.parse_args()
+
+    entries = make_entries(args.reviews, args.buildings, args.seed)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = ReviewSearchIndex()
+    for GID, texts in entries.items():
+        index.replace_gid(GID, texts)
+    build_seconds = time.perf_counter() - start
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rng = random.Random(args.seed)
+    gids = list(entries)
+    update_ms = []
+    for _ in range(200):
+        GID = rng.choice(gids)
+        start = time.perf_counter()
+        index.replace_gid(GID, entries[GID])
+        update_ms.append((time.perf_counter() - start) * 1000)
+
+    query_ms = []
+    for i in range(args.queries):
+        start = time.perf_counter()
+        index.search(QUERIES[i % len(QUERIES)], args.k)
+        query_ms.append((time.perf_counter() - start) * 1000)
+
+    stats = index.stats()
+    result = {
+        "reviews": args.reviews,
+        "buildings": stats["gids"],
+        "postings": stats["postings"],
+        "build_s": round(build_seconds, 3),
+        "index_mb": round(stats["array_bytes"] / 2**20, 3),
+        "traced_mb": round(traced / 2**20, 3),
+        "reindex_median_ms": round(statistics.median(update_ms), 4),
+        "reindex_p95_ms": round(percentile(update_ms, 0.95), 4),
+        "query_median_ms": round(statistics.median(query_ms), 3),
+        "query_p95_ms": round(percentile(query_ms, 0.95), 3),
+        "query_p99_ms": round(percentile(query_ms, 0.99), 3),
+    }
+    print(
+        f"{stats['documents']} texts, {stats['gids']} buildings, "
+        f"{stats['postings']} postings over {stats['terms']} hashed terms"
+    )
+    print(
+        f"build {result['build_s']:.1f}s, index arrays {result['index_mb']:.1f} MB, "
+        f"traced {result['traced_mb']:.1f} MB"
+    )
+    print(
+        f"re-index one building: median {result['reindex_median_ms']:.3f} ms, "
+        f"p95 {result['reindex_p95_ms']:.3f} ms"
+    )
+    print(
+        f"query top-{args.k}: median {result['query_median_ms']:.2f} ms, "
+        f"p95 {result['query_p95_ms']:.2f} ms, "
+        f"p99 {result['query_p99_ms']:.2f} ms"
+    )
+
+    if args.save_baseline:
+        save_baseline(result)
+        print(f"Baseline written to {BASELINE_PATH}")
+
+    if args.check:
+        regressions = check_regressions(result, args.tolerance)
+        if regressions:
+            print("Regressions detected:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions against baseline.")
+
+if __name__ == "__main__":
+    main()
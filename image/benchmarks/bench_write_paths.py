@@ -0,0 +1,203 @@
+"""Round trips and latency of the service write paths, before and after.
+
+Each write runs twice against in-memory collections that sleep ``--rtt-ms``
+per database call: once as the call sequence the services used to issue
+(insert/update followed by a read-back) and once through the current
+service method.
+
+Usage (from image/):
+    python benchmarks/bench_write_paths.py --rtt-ms 5 --samples 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from fakes import FakeCollection, FakeDatabase, new_gid
+
+from db.mongodb import db
+from models.aggregation_model import AggregationCreate
+from models.building_model import BuildingCreate, BuildingUpdate
+from models.profile_model import ProfileCreate, ProfileUpdate
+from models.user_model import UserCreate
+from services.aggregation_service import AggregationService
+from services.building_service import BuildingService
+from services.profile_service import ProfileService
+from services.user_service import UserService
+
+CATEGORY_FIELDS = [
+    "mobility_accessibility",
+    "cognitive_accessibility",
+    "hearing_accessibility",
+    "vision_accessibility",
+    "bathroom_accessibility",
+    "lgbtq_inclusivity",
+    "sensory_considerations",
+    "overall_inclusivity",
+]
+
+
+def building_payload(gid):
+    payload = {
+        "buildingName": f"Building {gid}",
+        "category": "Establishment",
+        "GID": gid,
+        "address": "1 Main St",
+        "latitude": 0.0,
+        "longitude": 0.0,
+    }
+    for category in CATEGORY_FIELDS:
+        payload[f"{category}_dict"] = {}
+        payload[f"{category}_rating"] = 0
+        payload[f"{category}_text_aggregate"] = ""
+        payload[f"{category}_count"] = 0
+    return payload
+
+
+def profile_payload(email):
+    return {
+        "gender": "n/a",
+        "age": 30,
+        "email": email,
+        "user_name": email.split("@")[0],
+        "mobility": {"wheelchair": True},
+        "cognitive": {},
+        "hearing": {},
+        "vision": {},
+        "LGBTQ": False,
+        "other": {},
+    }
+
+
+async def legacy_create(collection, document):
+    result = await collection.insert_one(document)
+    return await collection.find_one({"_id": result.inserted_id})
+
+
+async def legacy_update(collection, object_id, document):
+    await collection.update_one({"_id": object_id}, {"$set": document})
+    return await collection.find_one({"_id": object_id})
+
+
+async def legacy_get_or_create_aggregation(collection, gid):
+    aggregation = await collection.find_one({"GID": gid})
+    if not aggregation:
+        result = await collection.insert_one(
+            AggregationCreate(GID=gid).model_dump(exclude_none=True)
+        )
+        aggregation = await collection.find_one({"_id": result.inserted_id})
+    return aggregation
+
+
+def scenarios(database):
+    async def create_user(before):
+        user = UserCreate(user_name="u", email="u@example.com", password="x")
+        if before:
+            return await legacy_create(database.users, user.model_dump())
+        return await UserService.create_user(user)
+
+    async def update_user(before):
+        user = UserCreate(user_name="u", email="u@example.com", password="y")
+        existing = await legacy_create(database.users, user.model_dump())
+        database.users.round_trips = 0
+        if before:
+            return await legacy_update(
+                database.users, existing["_id"], user.model_dump()
+            )
+        return await UserService.update_user(str(existing["_id"]), user)
+
+    async def create_profile(before):
+        profile = ProfileCreate(**profile_payload(f"{new_gid()}@example.com"))
+        if before:
+            return await legacy_create(database.profiles, profile.model_dump())
+        return await ProfileService.create_profile(profile)
+
+    async def update_profile(before):
+        payload = profile_payload(f"{new_gid()}@example.com")
+        existing = await legacy_create(database.profiles, dict(payload))
+        database.profiles.round_trips = 0
+        profile = ProfileUpdate(_id=str(existing["_id"]), **payload)
+        if before:
+            return await legacy_update(
+                database.profiles, existing["_id"], profile.model_dump()
+            )
+        return await ProfileService.update_profile(profile)
+
+    async def create_building(before):
+        building = BuildingCreate(**building_payload(new_gid()))
+        if before:
+            return await legacy_create(database.buildings, building.model_dump())
+        return await BuildingService.create_building(building)
+
+    async def update_building(before):
+        payload = building_payload(new_gid())
+        existing = await legacy_create(database.buildings, dict(payload))
+        database.buildings.round_trips = 0
+        building = BuildingUpdate(_id=str(existing["_id"]), **payload)
+        if before:
+            return await legacy_update(
+                database.buildings, existing["_id"], building.model_dump()
+            )
+        return await BuildingService.update_building(building)
+
+    async def get_or_create_aggregation(before):
+        gid = new_gid()
+        if before:
+            return await legacy_get_or_create_aggregation(database.aggregation, gid)
+        return await AggregationService.get_or_create_aggregation(gid)
+
+    return {
+        "create_user": (create_user, "users"),
+        "update_user": (update_user, "users"),
+        "create_profile": (create_profile, "profiles"),
+        "update_profile": (update_profile, "profiles"),
+        "create_building": (create_building, "buildings"),
+        "update_building": (update_building, "buildings"),
+        "get_or_create_aggregation": (get_or_create_aggregation, "aggregation"),
+    }
+
+
+async def measure(run, collection, before, samples):
+    timings = []
+    round_trips = 0
+    for _ in range(samples):
+        collection.round_trips = 0
+        start = time.perf_counter()
+        await run(before)
+        timings.append(time.perf_counter() - start)
+        round_trips = collection.round_trips
+    return statistics.median(timings) * 1000, round_trips
+
+
+async def main_async(rtt_ms, samples):
+    rtt = rtt_ms / 1000
+    database = FakeDatabase(
+        users=FakeCollection(latency=rtt),
+        profiles=FakeCollection(latency=rtt),
+        buildings=FakeCollection(latency=rtt),
+        aggregation=FakeCollection(latency=rtt),
+    )
+    db.db = database
+
+    print(f"{'operation':<28}{'before':>22}{'after':>22}")
+    for name, (run, collection_name) in scenarios(database).items():
+        collection = getattr(database, collection_name)
+        before_ms, before_trips = await measure(run, collection, True, samples)
+        after_ms, after_trips = await measure(run, collection, False, samples)
+        print(
+            f"{name:<28}{before_ms:>10.1f}ms {before_trips} trips"
+            f"{after_ms:>10.1f}ms {after_trips} trips"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rtt-ms", type=float, default=5.0)
+    parser.add_argument("--samples", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.rtt_ms, args.samples))
+
+
+if __name__ == "__main__":
+    main()
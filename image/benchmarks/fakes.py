@@ -0,0 +1,163 @@
+"""In-memory stand-ins for the Motor collections used by the services.
+
+Only the calls the benchmarked code paths make are implemented, and filters
+only support top-level equality, ``$in`` and ``$ne`` matches. ``round_trips``
+counts every awaited call so benchmarks can report database round trips next
+to wall time.
+"""
+
+import asyncio
+import copy
+import os
+import sys
+from itertools import count
+from types import SimpleNamespace
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+# Settings() requires these at import time; the fakes never connect anywhere.
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "benchmark")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from bson import ObjectId  # noqa: E402
+
+
+def _matches(document, query):
+    for key, value in query.items():
+        if isinstance(value, dict) and "$in" in value:
+            if document.get(key) not in value["$in"]:
+                return False
+        elif isinstance(value, dict) and "$ne" in value:
+            if document.get(key) == value["$ne"]:
+                return False
+        elif document.get(key) != value:
+            return False
+    return True
+
+
+def _apply(document, update):
+    document.update(copy.deepcopy(update.get("$set", {})))
+    for key, amount in update.get("$inc", {}).items():
+        document[key] = document.get(key, 0) + amount
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self._documents = documents
+
+    async def to_list(self, length=None):
+        if length is None:
+            return list(self._documents)
+        return list(self._documents[:length])
+
+
+class FakeCollection:
+    def __init__(self, documents=None, latency=0.0, name="fake"):
+        self.name = name
+        self.documents = list(documents or [])
+        self.latency = latency
+        self.round_trips = 0
+
+    async def _round_trip(self):
+        self.round_trips += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def find_one(self, query, projection=None):
+        await self._round_trip()
+        for document in self.documents:
+            if _matches(document, query):
+                return copy.deepcopy(document)
+        return None
+
+    def find(self, query=None, projection=None):
+        # Reviews are large and shared between runs, so they are not copied.
+        query = query or {}
+        self.round_trips += 1
+        return FakeCursor([d for d in self.documents if _matches(d, query)])
+
+    async def insert_one(self, document):
+        await self._round_trip()
+        document.setdefault("_id", ObjectId())
+        self.documents.append(copy.deepcopy(document))
+        return SimpleNamespace(inserted_id=document["_id"])
+
+    async def insert_many(self, documents, ordered=True):
+        await self._round_trip()
+        for document in documents:
+            document.setdefault("_id", ObjectId())
+            self.documents.append(copy.deepcopy(document))
+        return SimpleNamespace(inserted_ids=[d["_id"] for d in documents])
+
+    async def delete_many(self, query):
+        await self._round_trip()
+        kept = [d for d in self.documents if not _matches(d, query)]
+        deleted = len(self.documents) - len(kept)
+        self.documents = kept
+        return SimpleNamespace(deleted_count=deleted)
+
+    async def count_documents(self, query):
+        await self._round_trip()
+        return sum(1 for d in self.documents if _matches(d, query))
+
+    def aggregate(self, pipeline):
+        # Pipelines run server-side rollups ($merge) on the benchmarked paths;
+        # the round trip is counted but nothing is computed.
+        self.round_trips += 1
+        return FakeCursor([])
+
+    async def find_one_and_update(
+        self, query, update, upsert=False, return_document=False, **kwargs
+    ):
+        await self._round_trip()
+        for document in self.documents:
+            if _matches(document, query):
+                # ReturnDocument.BEFORE is False, AFTER is True.
+                before = copy.deepcopy(document)
+                _apply(document, update)
+                return copy.deepcopy(document) if return_document else before
+        if not upsert:
+            return None
+        document = {"_id": ObjectId(), **query}
+        document.update(copy.deepcopy(update.get("$setOnInsert", {})))
+        _apply(document, update)
+        self.documents.append(document)
+        return copy.deepcopy(document) if return_document else None
+
+    async def update_one(self, query, update, upsert=False):
+        await self._round_trip()
+        for document in self.documents:
+            if _matches(document, query):
+                _apply(document, update)
+                return SimpleNamespace(matched_count=1, modified_count=1)
+        return SimpleNamespace(matched_count=0, modified_count=0)
+
+
+    async def bulk_write(self, operations, ordered=True):
+        # Only derived bookkeeping (accessible sets, masks) is bulk-written on
+        # the benchmarked paths, so operations are counted but not applied.
+        await self._round_trip()
+        return SimpleNamespace(modified_count=0)
+
+
+class FakeDatabase:
+    def __init__(self, **collections):
+        for name, collection in collections.items():
+            collection.name = name
+        self._collections = collections
+
+    def __getattr__(self, name):
+        collections = self.__dict__.get("_collections", {})
+        if name not in collections:
+            collections[name] = FakeCollection(name=name)
+        return collections[name]
+
+
+_gid_counter = count()
+
+
+def new_gid():
+    return f"bench-gid-{next(_gid_counter)}"
@@ -1,7 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from services.aggregation_service import AggregationService
-from models.aggregation_model import AggregationResponse
+from services.aggregation_history_service import AggregationHistoryService
+from services.building_summary_service import BuildingSummaryService
+from core.single_flight import single_flight
+from models.aggregation_model import ACCESSIBILITY_CATEGORIES, AggregationResponse
 from pymongo.errors import PyMongoError
+from typing import Optional
 import logging
 from fastapi.responses import JSONResponse
 
@@ -25,7 +29,15 @@ async def get_aggregation(GID: str):
 @router.post("/update-aggregation/{GID}", response_model=AggregationResponse)
 async def update_aggregation(GID: str):
     try:
-        return await AggregationService.update_aggregation(GID)
+        # Concurrent rebuilds of one GID share a single review scan.
+        return await single_flight.do(
+            "update_aggregation",
+            GID,
+            lambda: AggregationService.update_aggregation(GID),
+            after_remote=lambda: AggregationService.get_aggregation(GID),
+        )
+    except HTTPException:
+        raise
     except PyMongoError as e:
         logger.error(f"Database error in update_aggregation: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -35,10 +47,20 @@ async def update_aggregation(GID: str):
 
 
 @router.get("/summarize-building/{GID}")
-async def summarize_building(GID: str):
+async def summarize_building(
+    GID: str,
+    budget_ms: Optional[int] = Query(
+        None,
+        ge=0,
+        description="Serve a local extractive summary if the LLM takes longer",
+    ),
+):
     try:
-        summary = await AggregationService.summarize_building(GID)
-        return JSONResponse(content={"summary": summary})
+        # Not generated yet: summarize now and store it for the next reader.
+        result = await BuildingSummaryService.summarize(
+            GID, None if budget_ms is None else budget_ms / 1000
+        )
+        return JSONResponse(content=result)
     except PyMongoError as e:
         logger.error(f"Database error in summarize_building: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -47,6 +69,36 @@ async def summarize_building(GID: str):
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 
+@router.get("/trend/{GID}")
+async def get_trend(
+    GID: str,
+    months: int = Query(12, ge=1, le=120),
+    categories: Optional[str] = Query(
+        None, description="Comma-separated categories; all categories if omitted"
+    ),
+):
+    try:
+        requested = (
+            [c.strip() for c in categories.split(",") if c.strip()]
+            if categories
+            else None
+        )
+        unknown = [c for c in requested or [] if c not in ACCESSIBILITY_CATEGORIES]
+        if unknown:
+            raise HTTPException(
+                status_code=400, detail=f"Unknown categories: {', '.join(unknown)}"
+            )
+        return await AggregationHistoryService.get_trend(GID, months, requested)
+    except HTTPException:
+        raise
+    except PyMongoError as e:
+        logger.error(f"Database error in get_trend: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        logger.error(f"Unexpected error in get_trend: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+
 @router.post("/debug-update-aggregation/{GID}")
 async def debug_update_aggregation(GID: str):
     try:
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from fastapi.responses import JSONResponse
+from services.building_autocomplete_service import BuildingAutocompleteService
 from services.building_service import BuildingService
 from models.building_model import BuildingCreate, BuildingResponse, BuildingUpdate
 from pymongo.errors import PyMongoError
 from bson.errors import InvalidId
+from typing import Any, Dict
 import json
 from bson import ObjectId
 import logging
@@ -79,6 +81,20 @@ async def get_buildings():
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 
+@router.get("/autocomplete/search")
+async def autocomplete_buildings(
+    q: str = Query(..., min_length=1, description="Start of a name or address"),
+    k: int = Query(10, ge=1, le=50),
+) -> Dict[str, Any]:
+    try:
+        results = await BuildingAutocompleteService.search(q, k)
+        return {"results": results, "metadata": {"query": q, "k": k}}
+    except PyMongoError as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+
 @router.post("/create-building", response_model=BuildingResponse)
 async def create_building(building: BuildingCreate):
     try:
@@ -93,6 +109,8 @@ async def create_building(building: BuildingCreate):
 async def update_building(building: BuildingUpdate):
     try:
         return await BuildingService.update_building(building)
+    except HTTPException:
+        raise
     except PyMongoError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
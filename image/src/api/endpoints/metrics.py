@@ -0,0 +1,51 @@
+from fastapi import APIRouter
+from core.cache import get_cache_stats
+from core.single_flight import single_flight
+from db.writes import cas_metrics
+from services.aggregation_worker import aggregation_worker
+from services.building_autocomplete_service import BuildingAutocompleteService
+from services.review_duplicate_service import ReviewDuplicateService
+from services.review_queue_service import review_queue_worker
+from services.review_search_service import ReviewSearchService
+
+router = APIRouter()
+
+
+@router.get("/cache")
+async def get_cache_metrics():
+    return get_cache_stats()
+
+
+@router.get("/aggregation-worker")
+async def get_aggregation_worker_metrics():
+    return await aggregation_worker.stats()
+
+
+@router.get("/review-queue")
+async def get_review_queue_metrics():
+    return await review_queue_worker.stats()
+
+
+@router.get("/single-flight")
+async def get_single_flight_metrics():
+    return single_flight.stats()
+
+
+@router.get("/concurrency")
+async def get_concurrency_metrics():
+    return cas_metrics()
+
+
+@router.get("/duplicates")
+async def get_duplicate_metrics():
+    return ReviewDuplicateService.metrics()
+
+
+@router.get("/search")
+async def get_search_metrics():
+    return ReviewSearchService.stats()
+
+
+@router.get("/autocomplete")
+async def get_autocomplete_metrics():
+    return BuildingAutocompleteService.stats()
@@ -1,13 +1,23 @@
 from fastapi import APIRouter, HTTPException, Query
 from services.accessibility_service import AccessibilityService
 from services.building_service import BuildingService
-from services.aggregation_service import AggregationService
+from services.accessibility_index import (
+    AccessibilityIndex,
+    encode_categories,
+    encode_features,
+)
+from services.ranking_service import RankingService
+from services.accessible_set_service import AccessibleSetService
+from services.plan_prompt_service import PlanPromptService
 from models.building_model import BuildingResponse
 from typing import Dict, List, Any, Optional, Union
 import logging
 from openai import OpenAI
 import asyncio
+import math
 from core.config import settings
+from core.cache import MISSING, intent_cache, plan_cache
+import copy
 import json
 
 logger = logging.getLogger(__name__)
@@ -18,44 +28,14 @@ async def get_openai_client():
     return OpenAI(api_key=settings.OPENAI_API_KEY)
 
 
-def calculate_accessibility_score(rating: List[int]) -> float:
-    if rating[1] == 0:  # Avoid division by zero
-        return 0
-    return (rating[0] / (rating[1] * 5)) * 100  # Convert to percentage
-
-
-def check_accessibility(aggregation: Dict[str, Any], categories: List[str]) -> bool:
-    for category in categories:
-        rating_key = f"{category}_rating"
-        if rating_key in aggregation:
-            score = calculate_accessibility_score(aggregation[rating_key])
-            logger.debug(f"Category: {category}, Score: {score}")
-            if score < 66:
-                return False
-        else:
-            logger.warning(f"Category {rating_key} not found in aggregation data")
-            return False
-    return True
-
-
 async def generate_detailed_summary(plan: Dict[str, Any]) -> str:
     client = await get_openai_client()
-    prompt = f"""
-    Create a detailed, user-friendly summary of the following plan:
-
-    User Input: {plan['user_input']}
-    Suggested Activities: {plan['suggested_activities']}
-    User Disabilities: {plan['user_disabilities']}
-    Accessible Buildings: {plan['accessible_buildings']}
-
-    Please include:
-    1. A brief introduction based on the user's input.
-    2. Details of the suggested activities and why they were chosen.
-    3. Information about the accessible buildings, including their names and how they cater to the user's needs.
-    4. Any other relevant details that would be helpful for the user.
-
-    Format the summary in a clear, easy-to-read manner, using appropriate line breaks and sections.
-    """
+    prompt, prompt_stats = PlanPromptService.detailed_summary_prompt(plan)
+    logger.info(
+        f"Detailed summary prompt: {prompt_stats['prompt_tokens']} tokens, "
+        f"{prompt_stats['tokens_saved']} saved of {prompt_stats['full_prompt_tokens']} "
+        f"({prompt_stats['buildings_sent']}/{prompt_stats['buildings_received']} buildings)"
+    )
 
     response = client.chat.completions.create(
         model="gpt-4",
@@ -171,19 +151,6 @@ def get_other():
     }
 
 
-async def filter_buildings_by_category(
-    buildings: List[Any], categories: List[str]
-) -> List[Any]:
-    filtered_buildings = []
-    for building in buildings:
-        # Assuming 'category' is the correct attribute. Adjust if needed.
-        if hasattr(building, "category") and any(
-            category.lower() in building.category.lower() for category in categories
-        ):
-            filtered_buildings.append(building)
-    return filtered_buildings
-
-
 async def create_sources_list(
     buildings: List[Any], activity_categories: List[Dict[str, str]]
 ) -> List[Dict[str, Any]]:
@@ -231,6 +198,31 @@ async def plan_weekend_activities(user_input: str) -> List[Dict[str, str]]:
     return weekend_activities
 
 
+def normalize_user_input(user_input: str) -> str:
+    return " ".join(user_input.lower().split())
+
+
+async def classify_user_input(user_input: str) -> List[Dict[str, str]]:
+    """normal_analyze_user_input, cached per normalized input."""
+    key = normalize_user_input(user_input)
+    categories = intent_cache.get(key)
+    if categories is MISSING:
+        categories = await normal_analyze_user_input(user_input)
+        if categories:
+            intent_cache.set(key, categories)
+    return copy.deepcopy(categories)
+
+
+def plan_cache_key(
+    building_categories: List[str], activity_categories: List[str], version: str
+) -> tuple:
+    return (
+        tuple(sorted(set(building_categories))),
+        tuple(sorted(set(activity_categories))),
+        version,
+    )
+
+
 async def normal_analyze_user_input(user_input: str) -> List[Dict[str, str]]:
     # Existing implementation
     if "weekend" in user_input.lower() and "plan my day" in user_input.lower():
@@ -250,7 +242,7 @@ async def comprehensive_plan(email: str, user_input: str):
         user_disabilities = user_accessibility_info["user_disabilities"]
         building_categories = user_accessibility_info["building_categories"]
 
-        suggested_activities = await normal_analyze_user_input(user_input)
+        suggested_activities = await classify_user_input(user_input)
         plan = {
             "user_input": user_input,
             "user_disabilities": user_disabilities,
@@ -258,20 +250,51 @@ async def comprehensive_plan(email: str, user_input: str):
             "suggested_activity_categories": suggested_activities,
         }
 
-        # Step 2: Get accessible buildings
         disability_categories = [
             f"{disability}_accessibility" for disability in user_disabilities.keys()
         ]
-        accessible_buildings_result = await get_accessible_buildings_from_aggregation(
-            disability_categories
-        )
-        accessible_buildings = accessible_buildings_result.get("buildings", [])
-
-        # Step 3: Filter buildings by suggested activity categories
         suggested_categories = [cat["category"] for cat in suggested_activities]
-        filtered_buildings = await filter_buildings_by_category(
-            accessible_buildings, suggested_categories
+
+        # The building selection only depends on these and the catalog, so
+        # equivalent plans share it. match_version changes only when some
+        # building starts or stops matching some needs, and the selected
+        # buildings' own aggregation versions are checked on every hit, so
+        # reviews elsewhere in the catalog leave it cached. Score changes
+        # that would let a building outside the selection outrank one in it
+        # are only picked up when the entry expires.
+        index = await AccessibilityIndex.load()
+        cache_key = plan_cache_key(
+            disability_categories, suggested_categories, index.match_version
         )
+        selection = plan_cache.get(cache_key)
+        if selection is not MISSING and any(
+            index.row_version(GID) != version
+            for GID, version in selection["versions"].items()
+        ):
+            selection = MISSING
+        if selection is MISSING:
+            # Steps 2-3: the best accessible buildings among those in the
+            # suggested activity categories, restricted before ranking so
+            # other categories cannot crowd them out of the top k.
+            accessible_buildings_result = (
+                await get_accessible_buildings_from_aggregation(
+                    disability_categories,
+                    top_k=settings.PLAN_TOP_K,
+                    activity_categories=suggested_categories,
+                )
+            )
+            buildings = accessible_buildings_result.get("buildings", [])
+            selection = {
+                "buildings": buildings,
+                "versions": {
+                    building.GID: index.row_version(building.GID)
+                    for building in buildings
+                },
+            }
+            plan_cache.set(cache_key, selection)
+        else:
+            logger.info(f"Plan cache hit for {cache_key[:2]}")
+        filtered_buildings = selection["buildings"]
 
         # Step 4: Create sources list
         sources = await create_sources_list(filtered_buildings, suggested_activities)
@@ -285,8 +308,18 @@ async def comprehensive_plan(email: str, user_input: str):
             "sources_for_llm": sources,
         }
 
-        # Generate detailed summary
-        detailed_summary = await generate_detailed_summary(response)
+        # Generate detailed summary; only an identical request reuses one.
+        summary_key = (
+            "summary",
+            cache_key,
+            tuple(sorted(selection["versions"].items())),
+            normalize_user_input(user_input),
+            json.dumps(user_disabilities, sort_keys=True, default=str),
+        )
+        detailed_summary = plan_cache.get(summary_key)
+        if detailed_summary is MISSING:
+            detailed_summary = await generate_detailed_summary(response)
+            plan_cache.set(summary_key, detailed_summary)
         response["detailed_summary"] = detailed_summary
 
         # Step 5: Generate summary and affirmation
@@ -471,61 +504,90 @@ async def plan_user_activities(email: str, user_input: str):
 
 async def get_accessible_buildings_from_aggregation(
     categories: List[str],
+    top_k: Optional[int] = None,
+    decayed: bool = False,
+    features: Optional[List[str]] = None,
+    debug: bool = False,
+    activity_categories: Optional[List[str]] = None,
 ) -> Dict[str, Any]:
+    """Buildings passing every category (and having every feature), best
+    ranked first when ``top_k`` is given. ``activity_categories`` keeps only
+    buildings whose category contains one of them, before ranking. ``debug``
+    adds every building's category scores, which scans the whole catalog."""
     try:
-        # Fetch all aggregations
-        all_aggregations = await AggregationService.get_all_aggregations()
+        index = await AccessibilityIndex.load()
 
-        if not all_aggregations:
+        if not len(index):
             logger.warning("No aggregations found in the database")
-            return {
-                "buildings": [],
-                "debug_info": {
+            result: Dict[str, Any] = {"buildings": []}
+            if debug:
+                result["debug_info"] = {
                     "total_buildings": 0,
                     "categories_searched": categories,
                     "buildings_checked": [],
-                },
-            }
+                }
+            return result
+
+        # Unknown categories or features cannot be satisfied by any building.
+        need_mask = encode_categories(categories)
+        feature_mask = encode_features(features or [])
+        if need_mask is None or feature_mask is None:
+            logger.warning(f"Unknown needs requested: {categories} {features}")
+            matched_rows = []
+        else:
+            matched_rows = index.match(need_mask, feature_mask, decayed).tolist()
+        if activity_categories is not None and matched_rows:
+            allowed = await BuildingService.get_GIDs_in_categories(
+                activity_categories
+            )
+            matched_rows = [row for row in matched_rows if index.gids[row] in allowed]
+        if top_k is not None and matched_rows:
+            # Only the best-scoring matches are fetched and returned.
+            scores = RankingService.confidence_adjusted_scores(
+                index, categories, decayed
+            )
+            matched_rows = RankingService.top_k(scores, matched_rows, top_k)
 
-        filtered_building_gids = []
-        debug_info = {
-            "total_buildings": len(all_aggregations),
-            "categories_searched": categories,
-            "buildings_checked": [],
+        result = {
+            "buildings": await BuildingService.get_buildings_by_GIDs(
+                [index.gids[row] for row in matched_rows]
+            )
         }
+        if len(result["buildings"]) < len(matched_rows):
+            logger.warning(
+                f"{len(matched_rows) - len(result['buildings'])} matched "
+                "buildings not found"
+            )
 
-        for aggregation in all_aggregations:
-            building_info = {
-                "id": str(aggregation.get("_id")),
-                "GID": aggregation.get("GID"),
-                "categories_scores": {},
-            }
-
-            is_accessible = check_accessibility(aggregation, categories)
-
+        if debug:
+            category_scores = {}
             for category in categories:
-                rating_key = f"{category}_rating"
-                if rating_key in aggregation:
-                    score = calculate_accessibility_score(aggregation[rating_key])
-                    building_info["categories_scores"][category] = score
-                else:
-                    building_info["categories_scores"][category] = "N/A"
-
-            debug_info["buildings_checked"].append(building_info)
-
-            if is_accessible:
-                filtered_building_gids.append(aggregation["GID"])
-
-        # Fetch full details for filtered buildings
-        filtered_buildings = []
-        for gid in filtered_building_gids:
-            building = await BuildingService.get_building_by_GID(gid)
-            if building:
-                filtered_buildings.append(building)
-            else:
-                logger.warning(f"Building with GID {gid} not found")
+                scores = index.category_scores(category, decayed)
+                category_scores[category] = (
+                    ["N/A"] * len(index)
+                    if scores is None
+                    else [
+                        "N/A" if math.isnan(score) else score
+                        for score in scores.tolist()
+                    ]
+                )
+            result["debug_info"] = {
+                "total_buildings": len(index),
+                "categories_searched": categories,
+                "buildings_checked": [
+                    {
+                        "id": index.ids[row],
+                        "GID": gid,
+                        "categories_scores": {
+                            category: category_scores[category][row]
+                            for category in categories
+                        },
+                    }
+                    for row, gid in enumerate(index.gids)
+                ],
+            }
 
-        return {"buildings": filtered_buildings, "debug_info": debug_info}
+        return result
     except Exception as e:
         logger.error(
             f"Error fetching accessible buildings from aggregation: {str(e)}",
@@ -539,7 +601,23 @@ async def get_accessible_buildings(
     user_disabilities: str = Query(
         ...,
         description="Comma-separated list of user disabilities (e.g., mobility,hearing,vision)",
-    )
+    ),
+    top_k: Optional[int] = Query(
+        None, ge=1, description="Only return the k best-ranked accessible buildings"
+    ),
+    debug: bool = Query(
+        False, description="Include per-building scores (scans the whole catalog)"
+    ),
+    score: str = Query(
+        "all",
+        pattern="^(all|decayed)$",
+        description="Rate with all reviews equally or favour recent ones",
+    ),
+    features: Optional[str] = Query(
+        None,
+        description="Comma-separated features buildings must have "
+        "(e.g., mobility_accessibility.slopedramps)",
+    ),
 ) -> Dict[str, Any]:
     try:
         disabilities = [d.strip() for d in user_disabilities.split(",")]
@@ -550,7 +628,33 @@ async def get_accessible_buildings(
 
         logger.debug(f"Searching for categories: {categories}")
 
-        result = await get_accessible_buildings_from_aggregation(categories)
+        # Plain lookups read the precomputed set for this needs combination;
+        # ranking, debugging, decayed scores or a set that is not built yet
+        # scan the index.
+        decayed = score == "decayed"
+        required_features = [
+            f.strip() for f in (features or "").split(",") if f.strip()
+        ]
+        if encode_features(required_features) is None:
+            raise HTTPException(
+                status_code=400, detail=f"Unknown features: {features}"
+            )
+        gids = None
+        need_mask = encode_categories(categories)
+        if (
+            top_k is None
+            and not debug
+            and not decayed
+            and not required_features
+            and need_mask is not None
+        ):
+            gids = await AccessibleSetService.get_gids(need_mask)
+        if gids is not None:
+            result = {"buildings": await BuildingService.get_buildings_by_GIDs(gids)}
+        else:
+            result = await get_accessible_buildings_from_aggregation(
+                categories, top_k, decayed, required_features, debug
+            )
 
         if result is None:
             raise HTTPException(
@@ -564,14 +668,67 @@ async def get_accessible_buildings(
             "metadata": {
                 "total_buildings_found": len(buildings),
                 "categories_searched": categories,
+                "features_required": required_features,
+                "score": score,
             },
             "debug_info": result.get("debug_info", {}),
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting accessible buildings: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/ranked-buildings")
+async def get_ranked_buildings(
+    user_disabilities: str = Query(
+        ...,
+        description="Comma-separated list of user disabilities (e.g., mobility,hearing,vision)",
+    ),
+    k: int = Query(10, ge=1, le=500),
+    score: str = Query(
+        "all",
+        pattern="^(all|decayed)$",
+        description="Rate with all reviews equally or favour recent ones",
+    ),
+) -> Dict[str, Any]:
+    try:
+        disabilities = [d.strip() for d in user_disabilities.split(",") if d.strip()]
+        categories = [f"{disability}_accessibility" for disability in disabilities]
+
+        ranking = await RankingService.rank_buildings(
+            categories, k, decayed=score == "decayed"
+        )
+
+        by_gid = {
+            building.GID: building
+            for building in await BuildingService.get_buildings_by_GIDs(
+                [ranked["GID"] for ranked in ranking]
+            )
+        }
+        buildings = []
+        for ranked in ranking:
+            building = by_gid.get(ranked["GID"])
+            if building:
+                buildings.append({**ranked, "building": building})
+            else:
+                logger.warning(f"Building with GID {ranked['GID']} not found")
+
+        return {
+            "buildings": buildings,
+            "metadata": {
+                "total_buildings_found": len(buildings),
+                "categories_searched": categories,
+                "k": k,
+                "score": score,
+            },
+        }
+    except Exception as e:
+        logger.error(f"Error ranking buildings: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/debug-openai/{user_input}")
 async def debug_openai_response(user_input: str):
     try:
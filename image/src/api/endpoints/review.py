@@ -1,7 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, status
 from services.review_service import ReviewService
+from services.review_queue_service import ReviewQueueService
+from services.review_search_service import ReviewSearchService
+from services.building_service import BuildingService
 from models.review_model import ReviewCreate, ReviewResponse
 from pymongo.errors import PyMongoError
+from typing import Any, Dict, List
 import logging
 
 logger = logging.getLogger(__name__)
@@ -34,3 +38,104 @@ async def create_review(review: ReviewCreate):
     except Exception as e:
         logger.error(f"Unexpected error in create_review: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+
+@router.put("/update-review/{review_id}", response_model=ReviewResponse)
+async def update_review(review_id: str, review: ReviewCreate):
+    try:
+        return await ReviewService.update_review(review_id, review)
+    except HTTPException:
+        raise
+    except PyMongoError as e:
+        logger.error(f"Database error in update_review: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        logger.error(f"Unexpected error in update_review: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+
+@router.delete("/delete-review/{review_id}")
+async def delete_review(review_id: str):
+    try:
+        deleted = await ReviewService.delete_review(review_id)
+    except HTTPException:
+        raise
+    except PyMongoError as e:
+        logger.error(f"Database error in delete_review: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Review not found")
+    return {"message": "Review deleted successfully"}
+
+
+@router.post("/bulk-create-reviews")
+async def bulk_create_reviews(reviews: List[Dict[str, Any]]):
+    try:
+        report = await ReviewService.bulk_create_reviews(reviews)
+        logger.info(
+            f"Bulk review ingestion: {report['inserted']}/{report['received']} rows "
+            f"at {report['rows_per_second']} rows/s"
+        )
+        return report
+    except PyMongoError as e:
+        logger.error(f"Database error in bulk_create_reviews: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        logger.error(f"Unexpected error in bulk_create_reviews: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+
+@router.post("/submit-review", status_code=status.HTTP_202_ACCEPTED)
+async def submit_review(review: ReviewCreate):
+    try:
+        review_id = await ReviewQueueService.submit(review)
+        return {
+            "review_id": review_id,
+            "status": "pending",
+            "status_url": f"/api/review/submission/{review_id}",
+        }
+    except PyMongoError as e:
+        logger.error(f"Database error in submit_review: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        logger.error(f"Unexpected error in submit_review: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+
+@router.get("/submission/{review_id}")
+async def get_submission_status(review_id: str):
+    try:
+        submission = await ReviewQueueService.get_status(review_id)
+    except HTTPException:
+        raise
+    except PyMongoError as e:
+        logger.error(f"Database error in get_submission_status: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if submission is None:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    return submission
+
+
+@router.get("/search")
+async def search_reviews(
+    q: str = Query(..., min_length=1, description="What reviewers should mention"),
+    k: int = Query(10, ge=1, le=100),
+) -> Dict[str, Any]:
+    try:
+        matches = await ReviewSearchService.search(q, k)
+        buildings = await BuildingService.get_buildings_by_GIDs(
+            [match["GID"] for match in matches]
+        )
+        by_gid = {building.GID: building for building in buildings}
+        return {
+            "results": [
+                {**match, "building": by_gid.get(match["GID"])} for match in matches
+            ],
+            "metadata": {"query": q, "k": k},
+        }
+    except PyMongoError as e:
+        logger.error(f"Database error in search_reviews: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        logger.error(f"Unexpected error in search_reviews: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
@@ -1,224 +1,183 @@
-from models.building_model import BuildingModel, BuildingCreate, BuildingResponse
-from models.review_model import ReviewModel, ReviewCreate, ReviewResponse
-import requests
+from models.aggregation_model import ACCESSIBILITY_CATEGORIES
+from models.building_model import BuildingResponse
+from models.review_model import ReviewCreate
+from services.building_autocomplete_service import BuildingAutocompleteService
+from services.building_service import BuildingService
+from services.review_duplicate_service import is_counted
+from core.cache import building_cache, cache_bus
+from db.writes import update_returning
+from pymongo import UpdateOne
+from typing import Any, Dict, List, Optional
+import logging
 
-def main(review: BuildingCreate):
-    
-    
-    review_dict = review.model_dump()
-    
-    building_name = review_dict["buildingName"]
-    base_url = "https://rksm5pqdlaltlgj5pf6du4glwa0ahmao.lambda-url.us-east-1.on.aws/api/buildings"
-    buildingName = review_dict["buildingName"]
+logger = logging.getLogger(__name__)
 
-    # Construct the full URL
-    url = f"{base_url}/{buildingName}"
-    response = requests.get(url)    
-    
-    if response == -1:
-        mobility_accessibility_count = 0
-        cognitive_accessibility_count = 0
-        hearing_accessibility_count = 0
-        vision_accessibility_count = 0
-        bathroom_accessibility_count = 0
-        lgbtq_inclusivity_count = 0
-        sensory_considerations_count = 0
-        overall_inclusivity_count = 0
-        
-        mobility_accessibility_rating = 0
-        cognitive_accessibility_rating = 0
-        hearing_accessibility_rating = 0
-        vision_accessibility_rating = 0
-        bathroom_accessibility_rating = 0
-        lgbtq_inclusivity_rating = 0
-        sensory_considerations_rating = 0
-        overall_inclusivity_rating = 0
-        
-        if review_dict["mobility_accessibility_rating"] != 0:
-            mobility_accessibility_count = 1
-            mobility_accessibility_rating = review_dict["mobility_accessibility_rating"]      
-        if review_dict["cognitive_accessibility_rating"] != 0:
-            cognitive_accessibility_count = 1
-            cognitive_accessibility_rating = review_dict["cognitive_accessibility_rating"] 
-        if review_dict["hearing_accessibility_rating"] != 0:
-            hearing_accessibility_count = 1
-            hearing_accessibility_rating = review_dict["hearing_accessibility_rating"]
-        if review_dict["vision_accessibility_rating"] != 0:
-            vision_accessibility_count = 1
-            vision_accessibility_rating = review_dict["vision_accessibility_rating"]
-        if review_dict["bathroom_accessibility_rating"] != 0:
-            bathroom_accessibility_count = 1
-            bathroom_accessibility_rating = review_dict["bathroom_accessibility_rating"]
-        if review_dict["lgbtq_inclusivity_rating"] != 0:
-            lgbtq_inclusivity_count = 1
-            lgbtq_inclusivity_rating = review_dict["lgbtq_inclusivity_rating"]         
-        if review_dict["sensory_considerations_rating"] != 0:
-            sensory_considerations_count = 1
-            sensory_considerations_rating = review_dict["sensory_considerations_rating"]        
-        if review_dict["overall_inclusivity_rating"] != 0:
-            overall_inclusivity_count = 1
-            overall_inclusivity_rating = review_dict["overall_inclusivity_rating"]
-            
-            
-        building_input_dict = {
-            "buildingName": building_name,
-            "category":  review_dict["category"],
-            "GID":  review_dict["GID"],
-            "address":  review_dict["address"],
-            "latitude": review_dict["latitude"],
-            "longitude": review_dict["longitude"],
-            
-            "mobility_accessibility_dict": {},
-            "cognitive_accessibility_dict": {},
-            "hearing_accessibility_dict": {},
-            "vision_accessibility_dict": {},
-            "bathroom_accessibility_dict": {},
-            "lgbtq_inclusivity_dict": {},
-            "sensory_considerations_dict": {},
-            "overall_inclusivity_dict": {},            
-            
-            "mobility_accessibility_text_aggregate": "string",
-            "cognitive_accessibility_text_aggregate": "string",
-            "hearing_accessibility_text_aggregate": "string",
-            "vision_accessibility_text_aggregate": "string",
-            "bathroom_accessibility_text_aggregate": "string",
-            "lgbtq_inclusivity_text_aggregate": "string",
-            "sensory_considerations_text_aggregate": "string",
-            "overall_inclusivity_text_aggregate": "string",
-            
-            "mobility_accessibility_rating": mobility_accessibility_rating,
-            "cognitive_accessibility_rating": cognitive_accessibility_rating,
-            "hearing_accessibility_rating": hearing_accessibility_rating,
-            "vision_accessibility_rating": vision_accessibility_rating,
-            "bathroom_accessibility_rating": bathroom_accessibility_rating,
-            "lgbtq_inclusivity_rating": lgbtq_inclusivity_rating,
-            "sensory_considerations_rating": sensory_considerations_rating,
-            "overall_inclusivity_rating": overall_inclusivity_rating,
-            
-            "mobility_accessibility_count": mobility_accessibility_count,
-            "cognitive_accessibility_count": cognitive_accessibility_count,
-            "hearing_accessibility_count": hearing_accessibility_count,
-            "vision_accessibility_count": vision_accessibility_count,
-            "bathroom_accessibility_count": bathroom_accessibility_count,
-            "lgbtq_inclusivity_count": lgbtq_inclusivity_count,
-            "sensory_considerations_count": sensory_considerations_count,
-            "overall_inclusivity_count":overall_inclusivity_count
-}
-                
-        createBuilding(building_input_dict)
-        
-    else:
-        building_dict = response.model_dump()
-                
-        mobility_accessibility_count = building_dict["mobility_accessibility_count"]
-        cognitive_accessibility_count = building_dict["cognitive_accessibility_count"]
-        hearing_accessibility_count = building_dict["hearing_accessibility_count"]
-        vision_accessibility_count = building_dict["vision_accessibility_count"]
-        bathroom_accessibility_count = building_dict["bathroom_accessibility_count"]
-        lgbtq_inclusivity_count = building_dict["lgbtq_inclusivity_count"]
-        sensory_considerations_count = building_dict["sensory_considerations_count"]
-        overall_inclusivity_count = building_dict["overall_inclusivity_count"]
-        
-        mobility_accessibility_rating = building_dict["mobility_accessibility_rating"]
-        cognitive_accessibility_rating = building_dict["cognitive_accessibility_rating"]
-        hearing_accessibility_rating = building_dict["hearing_accessibility_rating"]
-        vision_accessibility_rating = building_dict["vision_accessibility_rating"]
-        bathroom_accessibility_rating = building_dict["bathroom_accessibility_rating"]
-        lgbtq_inclusivity_rating = building_dict["lgbtq_inclusivity_rating"]
-        sensory_considerations_rating = building_dict["sensory_considerations_rating"]
-        overall_inclusivity_rating = building_dict["overall_inclusivity_rating"]
-        
-        
-        if review_dict["mobility_accessibility_rating"] != 0:
-            mobility_accessibility_count += 1
-        if review_dict["cognitive_accessibility_rating"] != 0:
-            cognitive_accessibility_count += 1
-        if review_dict["hearing_accessibility_rating"] != 0:
-            hearing_accessibility_count += 1
-        if review_dict["vision_accessibility_rating"] != 0:
-            vision_accessibility_count += 1
-        if review_dict["bathroom_accessibility_rating"] != 0:
-            bathroom_accessibility_count += 1
-        if review_dict["lgbtq_inclusivity_rating"] != 0:
-            lgbtq_inclusivity_count += 1
-        if review_dict["sensory_considerations_rating"] != 0:
-            sensory_considerations_count += 1
-        if review_dict["overall_inclusivity_rating"] != 0:
-            overall_inclusivity_count += 1
-        
-        if  mobility_accessibility_count != 0:
-            mobility_accessibility_rating = (review_dict["mobility_accessibility_rating"] + mobility_accessibility_rating * (mobility_accessibility_count-1)) / mobility_accessibility_count
-        if  cognitive_accessibility_count != 0:
-            cognitive_accessibility_rating += (review_dict["cognitive_accessibility_rating"] + cognitive_accessibility_rating * (cognitive_accessibility_count-1)) / cognitive_accessibility_count
-        if  hearing_accessibility_count != 0:
-            hearing_accessibility_rating = (review_dict["hearing_accessibility_rating"] + hearing_accessibility_rating * (hearing_accessibility_count-1)) / hearing_accessibility_count
-        if  vision_accessibility_count != 0:
-            vision_accessibility_rating = (review_dict["vision_accessibility_rating"] + vision_accessibility_rating * (vision_accessibility_count-1)) / vision_accessibility_count
-        if  bathroom_accessibility_count != 0:
-            bathroom_accessibility_rating = (review_dict["bathroom_accessibility_rating"] + bathroom_accessibility_rating * (bathroom_accessibility_count-1)) / bathroom_accessibility_count
-        if  lgbtq_inclusivity_count != 0:
-            lgbtq_inclusivity_rating = (review_dict["lgbtq_inclusivity_rating"] + lgbtq_inclusivity_rating * (lgbtq_inclusivity_count-1)) / lgbtq_inclusivity_count
-        if  sensory_considerations_count != 0:
-            sensory_considerations_rating = (review_dict["sensory_considerations_rating"] + sensory_considerations_rating * (sensory_considerations_count-1)) / sensory_considerations_count
-        if  overall_inclusivity_count != 0:
-            overall_inclusivity_rating = (review_dict["overall_inclusivity_rating"] + overall_inclusivity_rating * (overall_inclusivity_count-1)) / overall_inclusivity_count
-        
-        building_input_dict = {
-            "buildingName": building_name,
-            "category":  review_dict["category"],
-            "GID":  review_dict["GID"],
-            "address":  review_dict["address"],
-            "latitude": review_dict["latitude"],
-            "longitude": review_dict["longitude"],
-            
-            "mobility_accessibility_dict": {},
-            "cognitive_accessibility_dict": {},
-            "hearing_accessibility_dict": {},
-            "vision_accessibility_dict": {},
-            "bathroom_accessibility_dict": {},
-            "lgbtq_inclusivity_dict": {},
-            "sensory_considerations_dict": {},
-            "overall_inclusivity_dict": {},            
-            
-            "mobility_accessibility_text_aggregate": "string",
-            "cognitive_accessibility_text_aggregate": "string",
-            "hearing_accessibility_text_aggregate": "string",
-            "vision_accessibility_text_aggregate": "string",
-            "bathroom_accessibility_text_aggregate": "string",
-            "lgbtq_inclusivity_text_aggregate": "string",
-            "sensory_considerations_text_aggregate": "string",
-            "overall_inclusivity_text_aggregate": "string",
-            
-            "mobility_accessibility_rating": mobility_accessibility_rating,
-            "cognitive_accessibility_rating": cognitive_accessibility_rating,
-            "hearing_accessibility_rating": hearing_accessibility_rating,
-            "vision_accessibility_rating": vision_accessibility_rating,
-            "bathroom_accessibility_rating": bathroom_accessibility_rating,
-            "lgbtq_inclusivity_rating": lgbtq_inclusivity_rating,
-            "sensory_considerations_rating": sensory_considerations_rating,
-            "overall_inclusivity_rating": overall_inclusivity_rating,
-            
-            "mobility_accessibility_count": mobility_accessibility_count,
-            "cognitive_accessibility_count": cognitive_accessibility_count,
-            "hearing_accessibility_count": hearing_accessibility_count,
-            "vision_accessibility_count": vision_accessibility_count,
-            "bathroom_accessibility_count": bathroom_accessibility_count,
-            "lgbtq_inclusivity_count": lgbtq_inclusivity_count,
-            "sensory_considerations_count": sensory_considerations_count,
-            "overall_inclusivity_count":overall_inclusivity_count
-}
+IDENTITY_FIELDS = ("buildingName", "category", "address", "latitude", "longitude")
 
-        updateBuilding(building_input_dict)
-        
 
+class ReviewBuildingBridge:
+    """Folds a new review into its building's per-category rating and count.
 
-def updateBuilding(building_input_dict):           
-    url = "https://rksm5pqdlaltlgj5pf6du4glwa0ahmao.lambda-url.us-east-1.on.aws/api/buildings/update-building"
-    requests.post(url, json=building_input_dict)    
+    The running average used to be computed client-side between an HTTP read
+    and an HTTP write of the building, which cost two extra Lambda calls per
+    review and lost concurrent updates. The whole change is now one
+    pipeline update, so MongoDB applies it atomically on the document.
+    ``*_rating_sum`` is kept next to the rounded ``*_rating`` so averages do
+    not drift as counts grow.
+    """
 
-def createBuilding(building_input_dict):
-    url = "https://rksm5pqdlaltlgj5pf6du4glwa0ahmao.lambda-url.us-east-1.on.aws/api/buildings/create-building"
-    requests.post(url, json=building_input_dict)    
+    @staticmethod
+    def _rated_categories(review: ReviewCreate) -> Dict[str, int]:
+        ratings = {}
+        for category in ACCESSIBILITY_CATEGORIES:
+            rating = getattr(review, f"{category}_rating")
+            if rating:
+                ratings[category] = rating
+        return ratings
 
-    
-    
+    @staticmethod
+    def build_pipeline(review: ReviewCreate, sign: int = 1) -> List[Dict[str, Any]]:
+        ratings = ReviewBuildingBridge._rated_categories(review)
+
+        # Identity fields only fill in documents created by this upsert.
+        accumulate: Dict[str, Any] = {
+            field: {"$ifNull": [f"${field}", {"$literal": getattr(review, field)}]}
+            for field in IDENTITY_FIELDS
+        }
+        # Bumped like any other write so version-checked updates see it.
+        accumulate["version"] = {"$add": [{"$ifNull": ["$version", 0]}, 1]}
+        for category in ACCESSIBILITY_CATEGORIES:
+            rating_field = f"{category}_rating"
+            count_field = f"{category}_count"
+            sum_field = f"{category}_rating_sum"
+            accumulate[f"{category}_dict"] = {
+                "$ifNull": [f"${category}_dict", {"$literal": {}}]
+            }
+            accumulate[f"{category}_text_aggregate"] = {
+                "$ifNull": [f"${category}_text_aggregate", ""]
+            }
+            if category not in ratings:
+                accumulate[rating_field] = {"$ifNull": [f"${rating_field}", 0]}
+                accumulate[count_field] = {"$ifNull": [f"${count_field}", 0]}
+                continue
+            # Buildings written before sums were stored rebuild them from the
+            # stored average.
+            accumulate[sum_field] = {
+                "$add": [
+                    {
+                        "$ifNull": [
+                            f"${sum_field}",
+                            {
+                                "$multiply": [
+                                    {"$ifNull": [f"${rating_field}", 0]},
+                                    {"$ifNull": [f"${count_field}", 0]},
+                                ]
+                            },
+                        ]
+                    },
+                    ratings[category] * sign,
+                ]
+            }
+            accumulate[count_field] = {
+                "$add": [{"$ifNull": [f"${count_field}", 0]}, sign]
+            }
+
+        # Removing the last rating leaves a count of 0 and an average of 0.
+        averages = {
+            f"{category}_rating": {
+                "$cond": [
+                    {"$gt": [f"${category}_count", 0]},
+                    {
+                        "$toInt": {
+                            "$round": [
+                                {
+                                    "$divide": [
+                                        f"${category}_rating_sum",
+                                        f"${category}_count",
+                                    ]
+                                },
+                                0,
+                            ]
+                        }
+                    },
+                    0,
+                ]
+            }
+            for category in ratings
+        }
+
+        pipeline = [{"$set": accumulate}]
+        if averages:
+            pipeline.append({"$set": averages})
+        return pipeline
+
+    @staticmethod
+    async def apply_review(
+        review: ReviewCreate, sign: int = 1
+    ) -> Optional[BuildingResponse]:
+        """Adds a review's ratings to its building, or removes them with
+        ``sign=-1`` when the review is edited or deleted."""
+        if not review.GID:
+            logger.warning("Review has no GID; building ratings not updated")
+            return None
+        if not is_counted(review):
+            return None
+        # A building can only be created from reviews that fully describe it.
+        upsert = sign > 0 and all(
+            getattr(review, field) is not None for field in IDENTITY_FIELDS
+        )
+        try:
+            collection = BuildingService.get_collection()
+            building = await update_returning(
+                collection,
+                {"GID": review.GID},
+                ReviewBuildingBridge.build_pipeline(review, sign),
+                upsert=upsert,
+            )
+            if building is None:
+                logger.warning(f"Building {review.GID} not found for review")
+                return None
+            await cache_bus.publish(building_cache, review.GID)
+            if upsert:
+                # The review may have created the building.
+                BuildingAutocompleteService.index_building(building)
+            return BuildingResponse.model_validate(building)
+        except Exception as e:
+            logger.error(f"Error applying review to building {review.GID}: {str(e)}")
+            raise
+
+    @staticmethod
+    async def apply_reviews(reviews: List[ReviewCreate]) -> int:
+        """``apply_review`` for many reviews in one ordered bulk_write, so
+        reviews of the same building fold in one after another. Returns how
+        many buildings were updated or created."""
+        reviews = [review for review in reviews if review.GID and is_counted(review)]
+        if not reviews:
+            return 0
+        operations = [
+            UpdateOne(
+                {"GID": review.GID},
+                ReviewBuildingBridge.build_pipeline(review),
+                upsert=all(
+                    getattr(review, field) is not None for field in IDENTITY_FIELDS
+                ),
+            )
+            for review in reviews
+        ]
+        try:
+            collection = BuildingService.get_collection()
+            result = await collection.bulk_write(operations, ordered=True)
+            await cache_bus.publish_many(
+                building_cache, sorted({review.GID for review in reviews})
+            )
+            if result.upserted_ids:
+                # Reviews created these buildings.
+                created = await collection.find(
+                    {"_id": {"$in": list(result.upserted_ids.values())}}
+                ).to_list(None)
+                for building in created:
+                    BuildingAutocompleteService.index_building(building)
+            return len({review.GID for review in reviews})
+        except Exception as e:
+            logger.error(f"Error applying reviews to buildings: {str(e)}")
+            raise
@@ -0,0 +1,285 @@
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from core.config import settings
+from db.mongodb import db
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+COUNTER_ID = "cache_invalidations"
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+profile_needs_cache = TTLCache(
+    "profile_needs",
+    maxsize=settings.PROFILE_NEEDS_CACHE_SIZE,
+    ttl=settings.PROFILE_NEEDS_CACHE_TTL_SECONDS,
+)
+
+building_cache = TTLCache(
+    "buildings",
+    maxsize=settings.BUILDING_CACHE_SIZE,
+    ttl=settings.BUILDING_CACHE_TTL_SECONDS,
+)
+
+aggregation_cache = TTLCache(
+    "aggregations",
+    maxsize=settings.AGGREGATION_CACHE_SIZE,
+    ttl=settings.AGGREGATION_CACHE_TTL_SECONDS,
+)
+
+# Holds the single in-memory catalog matrix built by AccessibilityIndex. GIDs
+# published here mark that building's row for re-reading, not the whole matrix.
+accessibility_index_cache = TTLCache(
+    "accessibility_index",
+    maxsize=1,
+    ttl=settings.ACCESSIBILITY_INDEX_TTL_SECONDS,
+)
+
+# Classified activity categories per normalized user input.
+intent_cache = TTLCache(
+    "intents",
+    maxsize=settings.INTENT_CACHE_SIZE,
+    ttl=settings.INTENT_CACHE_TTL_SECONDS,
+)
+
+# Plan building selections, keyed on needs, activities and the index's
+# match_version, with the selected buildings' aggregation versions.
+plan_cache = TTLCache(
+    "plans",
+    maxsize=settings.PLAN_CACHE_SIZE,
+    ttl=settings.PLAN_CACHE_TTL_SECONDS,
+)
+
+# MinHash LSH indexes of review signatures, one per GID.
+duplicate_index_cache = TTLCache(
+    "duplicate_indexes",
+    maxsize=settings.DUPLICATE_INDEX_CACHE_SIZE,
+    ttl=settings.DUPLICATE_INDEX_CACHE_TTL_SECONDS,
+)
+
+CACHES = [
+    profile_needs_cache,
+    building_cache,
+    aggregation_cache,
+    accessibility_index_cache,
+    intent_cache,
+    plan_cache,
+    duplicate_index_cache,
+]
+
+
+class CacheInvalidationBus:
+    """Propagates invalidations to other processes through MongoDB.
+
+    Every invalidation is appended to the ``cache_invalidations`` collection
+    under a sequence number taken from a ``$inc`` counter in ``counters``,
+    and each process replays entries past the last number it has seen, at
+    most once per ``CACHE_SYNC_INTERVAL_SECONDS``. Numbers are assigned by
+    the server, so they order invalidations across processes, unlike
+    ObjectIds made from each client's clock. A number can still show up
+    after a higher one when its publisher is slow to insert, so syncing
+    only moves past gaps once they are ``CACHE_SYNC_GAP_SECONDS`` old;
+    entries beyond a gap are replayed again meanwhile, which is harmless.
+    Entries expire after ``CACHE_INVALIDATION_RETENTION_SECONDS``. Without a
+    shared backend invalidations stay local and the TTL bounds
+    cross-process staleness.
+    """
+
+    def __init__(self):
+        self._caches = {cache.name: cache for cache in CACHES}
+        self._listeners: Dict[str, List[Callable[[Hashable], None]]] = {}
+        # Set on the first sync, so only later invalidations are replayed.
+        self._last_seq: Optional[int] = None
+        self._gap_since: Optional[float] = None
+        self._last_sync = 0.0
+        self.published = 0
+        self.replayed = 0
+
+    @staticmethod
+    def enabled() -> bool:
+        return settings.CACHE_SHARED_BACKEND == "mongo" and db.db is not None
+
+    def subscribe(
+        self, cache: TTLCache, listener: Callable[[Hashable], None]
+    ) -> None:
+        """Calls listener with every replayed invalidation of cache, for
+        in-process structures derived from the same documents."""
+        self._listeners.setdefault(cache.name, []).append(listener)
+
+    @staticmethod
+    async def _allocate(count: int) -> int:
+        """Reserves ``count`` sequence numbers and returns the first."""
+        counter = await db.db.counters.find_one_and_update(
+            {"_id": COUNTER_ID},
+            {"$inc": {"seq": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return counter["seq"] - count + 1
+
+    async def publish(self, cache: TTLCache, key: Hashable) -> None:
+        await self.publish_many(cache, [key])
+
+    async def publish_many(self, cache: TTLCache, keys: List[Hashable]) -> None:
+        for key in keys:
+            cache.invalidate(key)
+        if not keys or not self.enabled():
+            return
+        try:
+            first = await self._allocate(len(keys))
+            created_at = datetime.utcnow()
+            await db.db.cache_invalidations.insert_many(
+                [
+                    {
+                        "seq": first + i,
+                        "cache": cache.name,
+                        "key": key,
+                        "createdAt": created_at,
+                    }
+                    for i, key in enumerate(keys)
+                ]
+            )
+            self.published += len(keys)
+        except Exception as e:
+            # The local entries are already gone; peers fall back to the TTL.
+            logger.error(f"Error publishing cache invalidations: {str(e)}")
+
+    async def _start(self) -> None:
+        collection = db.db.cache_invalidations
+        await collection.create_index("seq")
+        await collection.create_index(
+            "createdAt",
+            expireAfterSeconds=settings.CACHE_INVALIDATION_RETENTION_SECONDS,
+        )
+        counter = await db.db.counters.find_one({"_id": COUNTER_ID})
+        self._last_seq = counter["seq"] if counter else 0
+
+    async def sync(self) -> None:
+        if not self.enabled():
+            return
+        now = time.monotonic()
+        if now - self._last_sync < settings.CACHE_SYNC_INTERVAL_SECONDS:
+            return
+        self._last_sync = now
+        try:
+            if self._last_seq is None:
+                await self._start()
+                return
+            entries = (
+                await db.db.cache_invalidations.find(
+                    {"seq": {"$gt": self._last_seq}}
+                )
+                .sort("seq", 1)
+                .to_list(1000)
+            )
+        except Exception as e:
+            logger.error(f"Error syncing cache invalidations: {str(e)}")
+            return
+        contiguous = self._last_seq
+        for entry in entries:
+            cache = self._caches.get(entry.get("cache"))
+            if cache is not None:
+                cache.invalidate(entry.get("key"))
+                self.replayed += 1
+            for listener in self._listeners.get(entry.get("cache"), []):
+                listener(entry.get("key"))
+            if entry["seq"] == contiguous + 1:
+                contiguous += 1
+        if entries and contiguous < entries[-1]["seq"]:
+            if self._gap_since is None:
+                self._gap_since = now
+            elif now - self._gap_since >= settings.CACHE_SYNC_GAP_SECONDS:
+                logger.warning(
+                    f"Cache invalidations missing after seq {contiguous}; "
+                    f"moving on to {entries[-1]['seq']}"
+                )
+                contiguous = entries[-1]["seq"]
+                self._gap_since = None
+        else:
+            self._gap_since = None
+        self._last_seq = contiguous
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": settings.CACHE_SHARED_BACKEND or "local",
+            "published": self.published,
+            "replayed": self.replayed,
+        }
+
+
+cache_bus = CacheInvalidationBus()
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = {cache.name: cache.stats() for cache in CACHES}
+    stats["invalidation_bus"] = cache_bus.stats()
+    return stats
@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings
+from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -7,6 +8,96 @@ class Settings(BaseSettings):
     DATABASE_NAME: str
     OPENAI_API_KEY: str
 
+    PROFILE_NEEDS_CACHE_SIZE: int = 10000
+    PROFILE_NEEDS_CACHE_TTL_SECONDS: float = 300
+    BUILDING_CACHE_SIZE: int = 50000
+    BUILDING_CACHE_TTL_SECONDS: float = 600
+    AGGREGATION_CACHE_SIZE: int = 10000
+    AGGREGATION_CACHE_TTL_SECONDS: float = 120
+    ACCESSIBILITY_INDEX_TTL_SECONDS: float = 60
+    # Pseudo-reviews at the catalog mean blended into every building's score.
+    RANKING_PRIOR_WEIGHT: float = 5
+    RANKING_PRIOR_MEAN: float = 3
+    # A rating counts half as much in decayed scores after this many days.
+    RATING_HALF_LIFE_DAYS: float = 365
+    PLAN_TOP_K: int = 50
+    # Buildings and characters of review notes per building sent to the LLM.
+    PLAN_PROMPT_MAX_BUILDINGS: int = 10
+    PLAN_PROMPT_TEXT_CHARS: int = 300
+    INTENT_CACHE_SIZE: int = 10000
+    INTENT_CACHE_TTL_SECONDS: float = 3600
+    # Entries also stop matching as soon as the catalog version changes.
+    PLAN_CACHE_SIZE: int = 1000
+    PLAN_CACHE_TTL_SECONDS: float = 600
+    REVIEW_INGEST_BATCH_SIZE: int = 1000
+    REVIEW_TEXT_BUCKET_SIZE: int = 200
+    REVIEW_TEXT_SAMPLE_SIZE: int = 20
+    # Reviews of the same building whose texts' estimated Jaccard similarity
+    # reaches this are flagged as duplicates and, if skipping is on, left out
+    # of aggregations, building ratings and summaries.
+    DUPLICATE_SIMILARITY_THRESHOLD: float = 0.8
+    SKIP_DUPLICATE_REVIEWS: bool = True
+    DUPLICATE_INDEX_CACHE_SIZE: int = 1000
+    DUPLICATE_INDEX_CACHE_TTL_SECONDS: float = 600
+    # Full aggregation rebuilds that lose a compare-and-swap recompute up to
+    # this many times, with jittered exponential backoff.
+    AGGREGATION_CAS_RETRIES: int = 5
+    AGGREGATION_CAS_BACKOFF_SECONDS: float = 0.05
+    SUMMARY_MODEL: str = "gpt-3.5-turbo"
+    # Review texts per summarization call are packed up to this estimate.
+    SUMMARY_CHUNK_TOKENS: int = 2000
+    SUMMARY_MAX_RETRIES: int = 5
+    # Review search hashes terms into this many dimensions and picks up
+    # other processes' writes this often.
+    SEARCH_HASH_BUCKETS: int = 1 << 20
+    SEARCH_SYNC_INTERVAL_SECONDS: float = 5
+    SEARCH_SYNC_OVERLAP_SECONDS: float = 60
+    # Building autocomplete is rebuilt from scratch this often, bounding how
+    # stale it gets without a shared cache backend.
+    AUTOCOMPLETE_INDEX_TTL_SECONDS: float = 3600
+    # Local TextRank summaries used when the LLM fails or is over budget.
+    EXTRACTIVE_SUMMARY_SENTENCES: int = 2
+    EXTRACTIVE_MAX_INPUT_SENTENCES: int = 300
+    SUMMARY_RETRY_BASE_SECONDS: float = 2.0
+    # USD per 1K tokens for SUMMARY_MODEL, used to report batch spend.
+    SUMMARY_PROMPT_COST_PER_1K: float = 0.0005
+    SUMMARY_COMPLETION_COST_PER_1K: float = 0.0015
+    SUMMARY_BATCH_CONCURRENCY: int = 4
+    SUMMARY_BATCH_PAGE_SIZE: int = 100
+    # "outbox" or "change_stream" hands new reviews to the aggregation worker,
+    # which must then run. Unset, the default, adds them to their
+    # aggregations as they are written.
+    AGGREGATION_WORKER_MODE: Optional[str] = None
+    # Run the worker inside the API process (off on Lambda, where
+    # jobs.aggregation_worker runs it as a standalone process instead).
+    AGGREGATION_WORKER_ENABLED: bool = False
+    AGGREGATION_WORKER_BATCH_SIZE: int = 500
+    AGGREGATION_WORKER_COALESCE_SECONDS: float = 2.0
+    # Processed outbox events are removed by a TTL index after this long.
+    AGGREGATION_OUTBOX_RETENTION_SECONDS: int = 7 * 24 * 3600
+    # Drain review_queue (write-behind submissions) inside the API process.
+    REVIEW_QUEUE_WORKER_ENABLED: bool = False
+    REVIEW_QUEUE_BATCH_SIZE: int = 500
+    REVIEW_QUEUE_POLL_SECONDS: float = 0.5
+    REVIEW_QUEUE_CLAIM_TIMEOUT_SECONDS: float = 300
+    # Drains that may try a queued review's building update before the entry
+    # is marked failed.
+    REVIEW_QUEUE_BRIDGE_ATTEMPTS: int = 5
+    # Set to "mongo" to share invalidations between processes through the
+    # cache_invalidations collection; otherwise caches are process-local.
+    CACHE_SHARED_BACKEND: Optional[str] = None
+    CACHE_SYNC_INTERVAL_SECONDS: float = 1.0
+    # A sequence number still missing after this long was allocated by a
+    # publisher that never inserted it, and syncing moves past it.
+    CACHE_SYNC_GAP_SECONDS: float = 10.0
+    # Invalidations are deleted by a TTL index after this long.
+    CACHE_INVALIDATION_RETENTION_SECONDS: int = 3600
+    # Set to "mongo" to coalesce expensive per-GID calls across processes
+    # with leases in single_flight_leases; otherwise only within a process.
+    SINGLE_FLIGHT_BACKEND: Optional[str] = None
+    SINGLE_FLIGHT_LEASE_SECONDS: float = 120
+    SINGLE_FLIGHT_POLL_SECONDS: float = 0.25
+
     class Config:
         env_file = ".env"
 
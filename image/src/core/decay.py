@@ -0,0 +1,34 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from core.config import settings
+from datetime import datetime, timezone
+from typing import Optional
+
+# Weights grow by 2x every half-life after this fixed epoch instead of shrinking
+# with age, so a stored (weighted sum, weight) pair never has to be rewritten as
+# time passes: the weighted mean is the same under any common scale factor.
+# Changing the epoch or RATING_HALF_LIFE_DAYS requires rebuilding aggregations.
+DECAY_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+SECONDS_PER_DAY = 86400
+
+
+def decay_weight(when: datetime) -> float:
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    half_lives = (when - DECAY_EPOCH).total_seconds() / (
+        settings.RATING_HALF_LIFE_DAYS * SECONDS_PER_DAY
+    )
+    return 2.0**half_lives
+
+
+def review_time(review_id: Optional[str]) -> datetime:
+    """When a review was written, from its ObjectId; now if it has none."""
+    try:
+        return ObjectId(review_id).generation_time
+    except (InvalidId, TypeError):
+        return datetime.now(timezone.utc)
+
+
+def effective_weight(weight, now: Optional[datetime] = None):
+    """Scales a stored weight to today's terms, i.e. a decayed review count."""
+    return weight / decay_weight(now or datetime.now(timezone.utc))
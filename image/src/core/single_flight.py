@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from core.config import settings
+from db.mongodb import db
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls into one in-flight computation.
+
+    Calls are keyed on ``(operation, key)``. Within a process, callers that
+    arrive while a computation is running await the same future and get its
+    result (or exception). With ``SINGLE_FLIGHT_BACKEND="mongo"`` the running
+    process also holds a lease in ``single_flight_leases``; other processes
+    wait for the lease to be released and then call ``after_remote``, which
+    should read what the lease holder produced.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Tuple[str, Any], asyncio.Future] = {}
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"calls": 0, "executions": 0, "deduplicated": 0, "remote": 0}
+        )
+
+    @staticmethod
+    def shared() -> bool:
+        return settings.SINGLE_FLIGHT_BACKEND == "mongo" and db.db is not None
+
+    async def do(
+        self,
+        operation: str,
+        key: Any,
+        fn: Callable[[], Awaitable[Any]],
+        after_remote: Optional[Callable[[], Awaitable[Any]]] = None,
+    ) -> Any:
+        stats = self._stats[operation]
+        stats["calls"] += 1
+        flight_key = (operation, key)
+        future = self._inflight.get(flight_key)
+        if future is not None:
+            stats["deduplicated"] += 1
+            # Shielded so one caller disconnecting does not cancel the others.
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[flight_key] = future
+        try:
+            if self.shared():
+                result = await self._run_with_lease(
+                    operation, key, fn, after_remote or fn
+                )
+            else:
+                stats["executions"] += 1
+                result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a flight without followers does not warn.
+            future.exception()
+            raise
+        finally:
+            del self._inflight[flight_key]
+
+    async def _run_with_lease(
+        self,
+        operation: str,
+        key: Any,
+        fn: Callable[[], Awaitable[Any]],
+        after_remote: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        collection = db.db.single_flight_leases
+        lease_id = f"{operation}:{key}"
+        owner = uuid.uuid4().hex
+        lease_seconds = settings.SINGLE_FLIGHT_LEASE_SECONDS
+        stats = self._stats[operation]
+
+        waited = False
+        while True:
+            now = datetime.utcnow()
+            try:
+                # Matches only a missing or expired lease; a live one makes
+                # the upsert collide on _id.
+                result = await collection.update_one(
+                    {"_id": lease_id, "expiresAt": {"$lt": now}},
+                    {
+                        "$set": {
+                            "owner": owner,
+                            "expiresAt": now + timedelta(seconds=lease_seconds),
+                        }
+                    },
+                    upsert=True,
+                )
+                break
+            except DuplicateKeyError:
+                waited = True
+                await asyncio.sleep(settings.SINGLE_FLIGHT_POLL_SECONDS)
+
+        # A released lease is deleted, so taking over an expired one (its
+        # holder died) updates in place and the work still has to be done.
+        if waited and result.upserted_id is not None:
+            # Another process finished the work while we waited.
+            await collection.delete_one({"_id": lease_id, "owner": owner})
+            stats["remote"] += 1
+            return await after_remote()
+
+        try:
+            stats["executions"] += 1
+            return await fn()
+        finally:
+            try:
+                await collection.delete_one({"_id": lease_id, "owner": owner})
+            except Exception as e:
+                # The lease expires on its own after SINGLE_FLIGHT_LEASE_SECONDS.
+                logger.error(f"Error releasing single-flight lease: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": settings.SINGLE_FLIGHT_BACKEND or "local",
+            "in_flight": len(self._inflight),
+            "operations": {name: dict(stats) for name, stats in self._stats.items()},
+        }
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,39 @@
+import math
+import re
+from typing import Iterable, List
+
+# OpenAI's tokenizers average about four characters of English per token;
+# words and punctuation give a floor for short, symbol-heavy strings.
+CHARS_PER_TOKEN = 4
+_WORD_OR_SYMBOL = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate, close enough for budgeting prompts."""
+    if not text:
+        return 0
+    return max(
+        math.ceil(len(text) / CHARS_PER_TOKEN), len(_WORD_OR_SYMBOL.findall(text))
+    )
+
+
+def pack_by_tokens(texts: Iterable[str], budget: int) -> List[List[str]]:
+    """Greedily packs texts, in order, into groups of at most ``budget`` tokens.
+
+    A text larger than the budget gets a group of its own. Packing is
+    deterministic, so appending texts never changes the groups before the
+    last one.
+    """
+    groups: List[List[str]] = []
+    current: List[str] = []
+    used = 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if current and used + tokens > budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append(text)
+        used += tokens
+    if current:
+        groups.append(current)
+    return groups
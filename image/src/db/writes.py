@@ -0,0 +1,90 @@
+from pymongo import ReturnDocument
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+# Per-collection compare-and-swap outcomes, served by /api/metrics/concurrency.
+# A swap on a document that does not exist is counted as not_found, not as a
+# conflict. delta_conflicts counts deltas that lost to a rebuild.
+cas_stats: Dict[str, Dict[str, int]] = defaultdict(
+    lambda: {
+        "attempts": 0,
+        "conflicts": 0,
+        "not_found": 0,
+        "exhausted": 0,
+        "delta_conflicts": 0,
+    }
+)
+
+
+async def insert_returning(collection, document: Dict[str, Any]) -> Dict[str, Any]:
+    """Inserts ``document`` and returns it as stored, without reading it back."""
+    result = await collection.insert_one(document)
+    document["_id"] = result.inserted_id
+    return document
+
+
+async def update_returning(
+    collection,
+    query: Dict[str, Any],
+    update: Any,
+    upsert: bool = False,
+    return_document: ReturnDocument = ReturnDocument.AFTER,
+) -> Optional[Dict[str, Any]]:
+    """Applies ``update`` and returns the updated document in one round trip.
+
+    ``ReturnDocument.BEFORE`` returns the document as it was instead. Returns
+    None when nothing matched and ``upsert`` is off.
+    """
+    return await collection.find_one_and_update(
+        query, update, upsert=upsert, return_document=return_document
+    )
+
+
+def versioned(
+    query: Dict[str, Any], version: int, field: str = "version"
+) -> Dict[str, Any]:
+    """Adds the expected ``version`` of ``field`` to ``query``.
+
+    Documents written before versions existed have none and count as 0.
+    """
+    return {**query, field: version if version else {"$in": [0, None]}}
+
+
+async def compare_and_swap(
+    collection,
+    query: Dict[str, Any],
+    version: int,
+    update: Dict[str, Any],
+    return_document: ReturnDocument = ReturnDocument.AFTER,
+) -> Optional[Dict[str, Any]]:
+    """Applies ``update`` only if the document is still at ``version``.
+
+    The version is bumped in the same write. Returns the updated document (or
+    the swapped-out one with ``ReturnDocument.BEFORE``), or None when the
+    document changed (or no longer matches) since it was read.
+    """
+    update = {**update, "$inc": {**update.get("$inc", {}), "version": 1}}
+    stats = cas_stats[collection.name]
+    stats["attempts"] += 1
+    document = await update_returning(
+        collection, versioned(query, version), update, return_document=return_document
+    )
+    if document is None:
+        # Only failed swaps cost the extra read telling the two apart.
+        if await collection.find_one(query, {"_id": 1}):
+            stats["conflicts"] += 1
+        else:
+            stats["not_found"] += 1
+    return document
+
+
+def cas_metrics() -> Dict[str, Any]:
+    metrics = {}
+    for name, stats in cas_stats.items():
+        # Swaps on missing documents say nothing about contention.
+        found = stats["attempts"] - stats["not_found"]
+        metrics[name] = {
+            **stats,
+            "conflict_rate": stats["conflicts"] / found if found else 0.0,
+        }
+    return metrics
@@ -0,0 +1,25 @@
+"""Runs the aggregation worker as a standalone process.
+
+Usage (from image/src):
+    python -m jobs.aggregation_worker
+"""
+
+import asyncio
+import logging
+
+from db.mongodb import connect_to_mongo, close_mongo_connection
+from services.aggregation_worker import aggregation_worker
+
+logging.basicConfig(level=logging.INFO)
+
+
+async def run():
+    await connect_to_mongo()
+    try:
+        await aggregation_worker.run()
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
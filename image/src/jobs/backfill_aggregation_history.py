@@ -0,0 +1,43 @@
+"""Backfills the monthly aggregation_history buckets from the reviews collection.
+
+Run once to enable trend queries for reviews written before the buckets were
+maintained; review deltas and aggregation rebuilds keep them current after
+that. The rollup runs server-side, so the job never loads reviews itself.
+
+Usage (from image/src):
+    python -m jobs.backfill_aggregation_history [--gid GID ...]
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+from db.mongodb import connect_to_mongo, close_mongo_connection
+from services.aggregation_history_service import AggregationHistoryService
+
+logging.basicConfig(level=logging.INFO)
+
+
+async def run(gids):
+    await connect_to_mongo()
+    try:
+        return await AggregationHistoryService.rebuild(gids or None)
+    finally:
+        await close_mongo_connection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill aggregation history")
+    parser.add_argument("--gid", action="append", dest="gids", default=[])
+    args = parser.parse_args()
+    start = time.perf_counter()
+    buckets = asyncio.run(run(args.gids))
+    print(
+        f"Wrote {buckets} monthly history buckets in "
+        f"{time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Bulk-imports reviews from a JSON array or JSON Lines file.
+
+Usage (from image/src):
+    python -m jobs.ingest_reviews reviews.jsonl [--batch-size 1000]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+
+from db.mongodb import connect_to_mongo, close_mongo_connection
+from services.review_service import ReviewService
+
+logger = logging.getLogger(__name__)
+
+
+def load_rows(path: str):
+    with open(path) as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+async def run(path: str, batch_size: int):
+    await connect_to_mongo()
+    try:
+        rows = load_rows(path)
+        return await ReviewService.bulk_create_reviews(rows, batch_size)
+    finally:
+        await close_mongo_connection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-import reviews")
+    parser.add_argument("path")
+    parser.add_argument("--batch-size", type=int, default=None)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.path, args.batch_size))
+    print(
+        f"Inserted {report['inserted']}/{report['received']} reviews in "
+        f"{report['elapsed_seconds']}s ({report['rows_per_second']} rows/s)"
+    )
+    for error in report["errors"]:
+        print(f"  row {error['row']}: {error['error']}")
+
+
+if __name__ == "__main__":
+    main()
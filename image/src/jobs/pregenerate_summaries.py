@@ -0,0 +1,179 @@
+"""Regenerates building summaries whose review texts changed since the last run.
+
+Meant to run nightly. Aggregations are walked in GID order, one page at a
+time, and progress is checkpointed in the job_runs collection after every
+page, so an interrupted run resumes where it stopped. A run with failures
+does not advance the watermark, so failed buildings are retried next time.
+
+Usage (from image/src):
+    python -m jobs.pregenerate_summaries [--concurrency 4] [--page-size 100]
+    python -m jobs.pregenerate_summaries --full   # ignore the watermark
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+from core.config import settings
+from db.mongodb import connect_to_mongo, close_mongo_connection, db
+from services.aggregation_service import AggregationService
+from services.building_summary_service import BuildingSummaryService
+from services.review_summary_service import ReviewSummaryService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+JOB_ID = "pregenerate_summaries"
+
+
+def is_current(aggregation, stored) -> bool:
+    return stored is not None and stored.get("texts_updated_at") == aggregation.get(
+        "texts_updated_at"
+    )
+
+
+async def start_or_resume(runs, full: bool):
+    state = await runs.find_one({"_id": JOB_ID}) or {}
+    run = state.get("run")
+    if run:
+        logger.info(
+            f"Resuming run started {run['started_at']} after {run['cursor']!r}"
+        )
+        return run
+    run = {
+        "started_at": datetime.utcnow(),
+        "since": None if full else state.get("watermark"),
+        "cursor": "",
+        "failed": 0,
+    }
+    await runs.update_one({"_id": JOB_ID}, {"$set": {"run": run}}, upsert=True)
+    return run
+
+
+async def generate(GID: str, semaphore: asyncio.Semaphore) -> bool:
+    async with semaphore:
+        try:
+            result = await BuildingSummaryService.generate(GID)
+        except Exception as e:
+            logger.error(f"Error generating summary for {GID}: {str(e)}")
+            return False
+    if result["failures"]:
+        logger.warning(f"Summary for {GID} failed for {result['failures']}")
+        return False
+    return True
+
+
+async def run(concurrency: int, page_size: int, full: bool):
+    await connect_to_mongo()
+    try:
+        runs = db.db.job_runs
+        aggregations = AggregationService.get_collection()
+        job_run = await start_or_resume(runs, full)
+        semaphore = asyncio.Semaphore(concurrency)
+        report = {"scanned": 0, "generated": 0, "skipped": 0, "failed": 0}
+        start = time.perf_counter()
+
+        while True:
+            query = {"GID": {"$gt": job_run["cursor"]}}
+            if job_run["since"] is not None:
+                query["texts_updated_at"] = {"$gt": job_run["since"]}
+            page = (
+                await aggregations.find(query, {"GID": 1, "texts_updated_at": 1})
+                .sort("GID", 1)
+                .to_list(page_size)
+            )
+            if not page:
+                break
+
+            stored = await BuildingSummaryService.get_summaries(
+                [aggregation["GID"] for aggregation in page]
+            )
+            due = [
+                aggregation["GID"]
+                for aggregation in page
+                if not is_current(aggregation, stored.get(aggregation["GID"]))
+            ]
+            results = await asyncio.gather(
+                *(generate(GID, semaphore) for GID in due)
+            )
+            failed = results.count(False)
+
+            report["scanned"] += len(page)
+            report["generated"] += len(due) - failed
+            report["skipped"] += len(page) - len(due)
+            report["failed"] += failed
+            job_run["cursor"] = page[-1]["GID"]
+            job_run["failed"] += failed
+            await runs.update_one(
+                {"_id": JOB_ID},
+                {
+                    "$set": {"run.cursor": job_run["cursor"]},
+                    "$inc": {"run.failed": failed},
+                },
+            )
+            logger.info(
+                f"Through {job_run['cursor']}: {report['generated']} generated, "
+                f"{report['skipped']} current, {report['failed']} failed"
+            )
+
+        completion = {
+            "$unset": {"run": ""},
+            "$set": {"lastRunAt": datetime.utcnow()},
+        }
+        if not job_run["failed"]:
+            completion["$set"]["watermark"] = job_run["started_at"]
+        await runs.update_one({"_id": JOB_ID}, completion)
+
+        elapsed = time.perf_counter() - start
+        usage = dict(ReviewSummaryService.usage)
+        report.update(
+            {
+                "elapsed_seconds": round(elapsed, 1),
+                "buildings_per_minute": (
+                    round(report["generated"] / elapsed * 60, 1) if elapsed else None
+                ),
+                "llm": usage,
+                "estimated_cost_usd": round(
+                    usage["prompt_tokens"] / 1000 * settings.SUMMARY_PROMPT_COST_PER_1K
+                    + usage["completion_tokens"]
+                    / 1000
+                    * settings.SUMMARY_COMPLETION_COST_PER_1K,
+                    4,
+                ),
+            }
+        )
+        return report
+    finally:
+        await close_mongo_connection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate building summaries")
+    parser.add_argument(
+        "--concurrency", type=int, default=settings.SUMMARY_BATCH_CONCURRENCY
+    )
+    parser.add_argument(
+        "--page-size", type=int, default=settings.SUMMARY_BATCH_PAGE_SIZE
+    )
+    parser.add_argument("--full", action="store_true")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.concurrency, args.page_size, args.full))
+    llm = report["llm"]
+    print(
+        f"Generated {report['generated']} summaries ({report['skipped']} current, "
+        f"{report['failed']} failed) of {report['scanned']} in "
+        f"{report['elapsed_seconds']}s ({report['buildings_per_minute']}/min)"
+    )
+    print(
+        f"LLM: {llm['completions']} completions, {llm['cache_hits']} cached, "
+        f"{llm['rate_limited']} rate limited, "
+        f"{llm['prompt_tokens'] + llm['completion_tokens']} tokens, "
+        f"~${report['estimated_cost_usd']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Rebuilds the accessible_building_sets view from every aggregation.
+
+Run once to enable the view and again if it ever drifts; aggregation writes
+keep it up to date in between.
+
+Usage (from image/src):
+    python -m jobs.rebuild_accessible_sets
+"""
+
+import asyncio
+import logging
+import time
+
+from db.mongodb import connect_to_mongo, close_mongo_connection
+from services.accessible_set_service import AccessibleSetService
+
+logging.basicConfig(level=logging.INFO)
+
+
+async def run():
+    await connect_to_mongo()
+    try:
+        return await AccessibleSetService.rebuild()
+    finally:
+        await close_mongo_connection()
+
+
+def main():
+    start = time.perf_counter()
+    buildings = asyncio.run(run())
+    print(
+        f"Indexed {buildings} buildings into accessible sets in "
+        f"{time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
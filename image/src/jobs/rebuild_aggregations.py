@@ -0,0 +1,45 @@
+"""Rebuilds every aggregation from its reviews.
+
+Run once after deploying bucketed review texts: each rebuild moves the
+aggregation's texts into review_text_buckets, trims *_texts to the recent
+sample and fills in *_text_count.
+
+Usage (from image/src):
+    python -m jobs.rebuild_aggregations [--gid GID ...]
+"""
+
+import argparse
+import asyncio
+import logging
+
+from db.mongodb import connect_to_mongo, close_mongo_connection
+from services.aggregation_service import AggregationService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def run(gids):
+    await connect_to_mongo()
+    try:
+        if not gids:
+            gids = await AggregationService.get_collection().distinct("GID")
+        for GID in gids:
+            try:
+                await AggregationService.update_aggregation(GID)
+            except Exception as e:
+                logger.error(f"Error rebuilding aggregation {GID}: {str(e)}")
+        logger.info(f"Rebuilt {len(gids)} aggregations")
+    finally:
+        await close_mongo_connection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild aggregations")
+    parser.add_argument("--gid", action="append", dest="gids", default=[])
+    args = parser.parse_args()
+    asyncio.run(run(args.gids))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Signs and flags reviews that have no stored MinHash signature yet.
+
+Reviews are walked in _id (write) order so the earliest copy of a text stays
+the original, and the position is checkpointed in job_runs after every page,
+so each run only looks at reviews written since the last one. Aggregations
+of buildings whose duplicate flags changed are rebuilt at the end.
+
+Usage (from image/src):
+    python -m jobs.rebuild_duplicate_index [--page-size 1000]
+    python -m jobs.rebuild_duplicate_index --full   # re-sign every review
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+from db.mongodb import connect_to_mongo, close_mongo_connection, db
+from pymongo import UpdateOne
+from services.aggregation_service import AggregationService
+from services.review_duplicate_service import (
+    ReviewDuplicateService,
+    duplicate_of_update,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+JOB_ID = "rebuild_duplicate_index"
+
+
+async def run(page_size: int, full: bool):
+    await connect_to_mongo()
+    try:
+        runs = db.db.job_runs
+        reviews = AggregationService.get_reviews_collection()
+        signatures = ReviewDuplicateService.get_collection()
+        if full:
+            await signatures.delete_many({})
+            await runs.update_one(
+                {"_id": JOB_ID}, {"$unset": {"cursor": ""}}, upsert=True
+            )
+        state = await runs.find_one({"_id": JOB_ID}) or {}
+        cursor = state.get("cursor")
+        report = {"scanned": 0, "signed": 0, "duplicates": 0, "reflagged": 0}
+        changed_gids = set()
+
+        while True:
+            query = {"GID": {"$type": "string"}}
+            if cursor is not None:
+                query["_id"] = {"$gt": cursor}
+            page = await reviews.find(query).sort("_id", 1).to_list(page_size)
+            if not page:
+                break
+            signed = {
+                entry["_id"]
+                for entry in await signatures.find(
+                    {"_id": {"$in": [review["_id"] for review in page]}}, {"_id": 1}
+                ).to_list(None)
+            }
+
+            recorded = []
+            flag_updates = []
+            pending = {}
+            for review in page:
+                if review["_id"] in signed:
+                    continue
+                previous = review.get("duplicate_of")
+                recorded.append(
+                    (review, await ReviewDuplicateService.flag(review, pending))
+                )
+                current = review.get("duplicate_of")
+                if current:
+                    report["duplicates"] += 1
+                if current != previous:
+                    changed_gids.add(review["GID"])
+                    flag_updates.append(
+                        UpdateOne({"_id": review["_id"]}, duplicate_of_update(review))
+                    )
+            if flag_updates:
+                await reviews.bulk_write(flag_updates, ordered=False)
+            await ReviewDuplicateService.record(recorded)
+
+            report["scanned"] += len(page)
+            report["signed"] += len(recorded)
+            report["reflagged"] += len(flag_updates)
+            cursor = page[-1]["_id"]
+            await runs.update_one(
+                {"_id": JOB_ID}, {"$set": {"cursor": cursor}}, upsert=True
+            )
+            logger.info(
+                f"Through {cursor}: {report['signed']} signed, "
+                f"{report['duplicates']} duplicates"
+            )
+
+        for GID in sorted(changed_gids):
+            try:
+                await AggregationService.update_aggregation(GID)
+            except Exception as e:
+                logger.error(f"Error rebuilding aggregation {GID}: {str(e)}")
+        report["aggregations_rebuilt"] = len(changed_gids)
+        return report
+    finally:
+        await close_mongo_connection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the duplicate index")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--full", action="store_true")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    report = asyncio.run(run(args.page_size, args.full))
+    print(
+        f"Signed {report['signed']} of {report['scanned']} reviews "
+        f"({report['duplicates']} duplicates, {report['reflagged']} flags changed, "
+        f"{report['aggregations_rebuilt']} aggregations rebuilt) in "
+        f"{time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""Drains write-behind review submissions as a standalone process.
+
+Usage (from image/src):
+    python -m jobs.review_queue_worker
+"""
+
+import asyncio
+import logging
+
+from db.mongodb import connect_to_mongo, close_mongo_connection
+from services.review_queue_service import review_queue_worker
+
+logging.basicConfig(level=logging.INFO)
+
+
+async def run():
+    await connect_to_mongo()
+    try:
+        await review_queue_worker.run()
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -4,9 +4,11 @@ from core.config import settings
 from api.endpoints import user
 from db.mongodb import connect_to_mongo, close_mongo_connection
 from middleware.auth import AuthMiddleware
+from services.aggregation_worker import aggregation_worker
+from services.review_queue_service import review_queue_worker
 from mangum import Mangum
 import logging
-from api.endpoints import user, building, review, profile, plan, aggregation
+from api.endpoints import user, building, review, profile, plan, aggregation, metrics
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -28,6 +30,14 @@ app.add_middleware(AuthMiddleware)
 app.add_event_handler("startup", connect_to_mongo)
 app.add_event_handler("shutdown", close_mongo_connection)
 
+if settings.AGGREGATION_WORKER_ENABLED:
+    app.add_event_handler("startup", aggregation_worker.start)
+    app.add_event_handler("shutdown", aggregation_worker.stop)
+
+if settings.REVIEW_QUEUE_WORKER_ENABLED:
+    app.add_event_handler("startup", review_queue_worker.start)
+    app.add_event_handler("shutdown", review_queue_worker.stop)
+
 app.include_router(user.router, prefix="/api/users", tags=["users"])
 app.include_router(profile.router, prefix="/api/profile", tags=["profile"])
 app.include_router(building.router, prefix="/api/buildings", tags=["buildings"])
@@ -36,6 +46,7 @@ app.include_router(plan.router, prefix="/api/plan", tags=["plan"])
 app.include_router(
     aggregation.router, prefix="/api/aggregations", tags=["aggregations"]
 )
+app.include_router(metrics.router, prefix="/api/metrics", tags=["metrics"])
 
 
 handler = Mangum(app)
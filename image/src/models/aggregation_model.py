@@ -1,9 +1,25 @@
 from pydantic import BaseModel, Field, field_serializer, field_validator
 from typing import Dict, Union, Tuple, List, Optional
 from bson import ObjectId
+from datetime import datetime
+
+ACCESSIBILITY_CATEGORIES = [
+    "mobility_accessibility",
+    "cognitive_accessibility",
+    "hearing_accessibility",
+    "vision_accessibility",
+    "bathroom_accessibility",
+    "lgbtq_inclusivity",
+    "sensory_considerations",
+    "overall_inclusivity",
+]
 
 
 class AggregationModel(BaseModel):
+    # *_texts only hold the most recent review texts; the full history lives in
+    # the review_text_buckets collection and *_text_count counts all of it.
+    # *_decayed_rating_sum / *_decayed_weight are the ratings weighted by
+    # core.decay.decay_weight of each review's time.
     id: Optional[str] = Field(default=None, alias="_id")
     GID: str
     mobility_accessibility_dict: Dict[str, Tuple[int, int]] = Field(
@@ -16,6 +32,9 @@ class AggregationModel(BaseModel):
     )
     mobility_accessibility_rating: Tuple[int, int] = Field(default=(0, 0))
     mobility_accessibility_texts: List[str] = Field(default_factory=list)
+    mobility_accessibility_text_count: int = 0
+    mobility_accessibility_decayed_rating_sum: float = 0.0
+    mobility_accessibility_decayed_weight: float = 0.0
 
     cognitive_accessibility_dict: Dict[str, Tuple[int, int]] = Field(
         default_factory=lambda: {
@@ -27,6 +46,9 @@ class AggregationModel(BaseModel):
     )
     cognitive_accessibility_rating: Tuple[int, int] = Field(default=(0, 0))
     cognitive_accessibility_texts: List[str] = Field(default_factory=list)
+    cognitive_accessibility_text_count: int = 0
+    cognitive_accessibility_decayed_rating_sum: float = 0.0
+    cognitive_accessibility_decayed_weight: float = 0.0
 
     hearing_accessibility_dict: Dict[str, Tuple[int, int]] = Field(
         default_factory=lambda: {
@@ -38,6 +60,9 @@ class AggregationModel(BaseModel):
     )
     hearing_accessibility_rating: Tuple[int, int] = Field(default=(0, 0))
     hearing_accessibility_texts: List[str] = Field(default_factory=list)
+    hearing_accessibility_text_count: int = 0
+    hearing_accessibility_decayed_rating_sum: float = 0.0
+    hearing_accessibility_decayed_weight: float = 0.0
 
     vision_accessibility_dict: Dict[str, Tuple[int, int]] = Field(
         default_factory=lambda: {
@@ -49,6 +74,9 @@ class AggregationModel(BaseModel):
     )
     vision_accessibility_rating: Tuple[int, int] = Field(default=(0, 0))
     vision_accessibility_texts: List[str] = Field(default_factory=list)
+    vision_accessibility_text_count: int = 0
+    vision_accessibility_decayed_rating_sum: float = 0.0
+    vision_accessibility_decayed_weight: float = 0.0
 
     bathroom_accessibility_dict: Dict[str, Tuple[int, int]] = Field(
         default_factory=lambda: {
@@ -60,6 +88,9 @@ class AggregationModel(BaseModel):
     )
     bathroom_accessibility_rating: Tuple[int, int] = Field(default=(0, 0))
     bathroom_accessibility_texts: List[str] = Field(default_factory=list)
+    bathroom_accessibility_text_count: int = 0
+    bathroom_accessibility_decayed_rating_sum: float = 0.0
+    bathroom_accessibility_decayed_weight: float = 0.0
 
     lgbtq_inclusivity_dict: Dict[str, Tuple[int, int]] = Field(
         default_factory=lambda: {
@@ -70,6 +101,9 @@ class AggregationModel(BaseModel):
     )
     lgbtq_inclusivity_rating: Tuple[int, int] = Field(default=(0, 0))
     lgbtq_inclusivity_texts: List[str] = Field(default_factory=list)
+    lgbtq_inclusivity_text_count: int = 0
+    lgbtq_inclusivity_decayed_rating_sum: float = 0.0
+    lgbtq_inclusivity_decayed_weight: float = 0.0
 
     sensory_considerations_dict: Dict[str, Tuple[int, int]] = Field(
         default_factory=lambda: {
@@ -80,6 +114,9 @@ class AggregationModel(BaseModel):
     )
     sensory_considerations_rating: Tuple[int, int] = Field(default=(0, 0))
     sensory_considerations_texts: List[str] = Field(default_factory=list)
+    sensory_considerations_text_count: int = 0
+    sensory_considerations_decayed_rating_sum: float = 0.0
+    sensory_considerations_decayed_weight: float = 0.0
 
     overall_inclusivity_dict: Dict[str, Tuple[int, int]] = Field(
         default_factory=lambda: {
@@ -90,6 +127,19 @@ class AggregationModel(BaseModel):
     )
     overall_inclusivity_rating: Tuple[int, int] = Field(default=(0, 0))
     overall_inclusivity_texts: List[str] = Field(default_factory=list)
+    overall_inclusivity_text_count: int = 0
+    overall_inclusivity_decayed_rating_sum: float = 0.0
+    overall_inclusivity_decayed_weight: float = 0.0
+
+    # Last time any *_texts changed; batch summary generation keys off it.
+    texts_updated_at: Optional[datetime] = None
+    # Live generation of this GID's review_text_buckets.
+    text_generation: Optional[str] = None
+    # Bumped by every write; full rebuilds compare-and-swap on it.
+    version: int = 0
+    # Bumped only by full rebuilds. Review deltas are applied only while it is
+    # where it was before their reviews were written.
+    rebuild_version: int = 0
 
     @field_serializer("id")
     def serialize_id(self, id: Optional[str], _info):
@@ -124,34 +174,60 @@ class AggregationResponse(BaseModel):
     mobility_accessibility_dict: Dict[str, Union[Tuple[int, int], List[int]]]
     mobility_accessibility_rating: Union[Tuple[int, int], List[int]]
     mobility_accessibility_texts: List[str]
+    mobility_accessibility_text_count: int = 0
+    mobility_accessibility_decayed_rating_sum: float = 0.0
+    mobility_accessibility_decayed_weight: float = 0.0
 
     cognitive_accessibility_dict: Dict[str, Union[Tuple[int, int], List[int]]]
     cognitive_accessibility_rating: Union[Tuple[int, int], List[int]]
     cognitive_accessibility_texts: List[str]
+    cognitive_accessibility_text_count: int = 0
+    cognitive_accessibility_decayed_rating_sum: float = 0.0
+    cognitive_accessibility_decayed_weight: float = 0.0
 
     hearing_accessibility_dict: Dict[str, Union[Tuple[int, int], List[int]]]
     hearing_accessibility_rating: Union[Tuple[int, int], List[int]]
     hearing_accessibility_texts: List[str]
+    hearing_accessibility_text_count: int = 0
+    hearing_accessibility_decayed_rating_sum: float = 0.0
+    hearing_accessibility_decayed_weight: float = 0.0
 
     vision_accessibility_dict: Dict[str, Union[Tuple[int, int], List[int]]]
     vision_accessibility_rating: Union[Tuple[int, int], List[int]]
     vision_accessibility_texts: List[str]
+    vision_accessibility_text_count: int = 0
+    vision_accessibility_decayed_rating_sum: float = 0.0
+    vision_accessibility_decayed_weight: float = 0.0
 
     bathroom_accessibility_dict: Dict[str, Union[Tuple[int, int], List[int]]]
     bathroom_accessibility_rating: Union[Tuple[int, int], List[int]]
     bathroom_accessibility_texts: List[str]
+    bathroom_accessibility_text_count: int = 0
+    bathroom_accessibility_decayed_rating_sum: float = 0.0
+    bathroom_accessibility_decayed_weight: float = 0.0
 
     lgbtq_inclusivity_dict: Dict[str, Union[Tuple[int, int], List[int]]]
     lgbtq_inclusivity_rating: Union[Tuple[int, int], List[int]]
     lgbtq_inclusivity_texts: List[str]
+    lgbtq_inclusivity_text_count: int = 0
+    lgbtq_inclusivity_decayed_rating_sum: float = 0.0
+    lgbtq_inclusivity_decayed_weight: float = 0.0
 
     sensory_considerations_dict: Dict[str, Union[Tuple[int, int], List[int]]]
     sensory_considerations_rating: Union[Tuple[int, int], List[int]]
     sensory_considerations_texts: List[str]
+    sensory_considerations_text_count: int = 0
+    sensory_considerations_decayed_rating_sum: float = 0.0
+    sensory_considerations_decayed_weight: float = 0.0
 
     overall_inclusivity_dict: Dict[str, Union[Tuple[int, int], List[int]]]
     overall_inclusivity_rating: Union[Tuple[int, int], List[int]]
     overall_inclusivity_texts: List[str]
+    overall_inclusivity_text_count: int = 0
+    overall_inclusivity_decayed_rating_sum: float = 0.0
+    overall_inclusivity_decayed_weight: float = 0.0
+    text_generation: Optional[str] = None
+    version: int = 0
 
     @field_serializer("id")
     def serialize_id(self, id: Union[str, ObjectId]):
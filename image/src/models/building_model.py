@@ -58,6 +58,8 @@ class BuildingModel(BaseModel):
     overall_inclusivity_text_aggregate: str
     overall_inclusivity_count: int
 
+    version: int = 0
+
     @field_serializer("id")
     def serialize_id(self, id: Optional[str], _info):
         return str(id) if id else None
@@ -179,6 +181,10 @@ class BuildingUpdate(BaseModel):
     overall_inclusivity_text_aggregate: str
     overall_inclusivity_count: int
 
+    # When given, the update only applies if the stored building is still at
+    # this version; otherwise it fails with 409.
+    version: Optional[int] = None
+
 
 class BuildingResponse(BaseModel):
     id: str = Field(..., alias="_id")
@@ -229,6 +235,8 @@ class BuildingResponse(BaseModel):
     overall_inclusivity_text_aggregate: str
     overall_inclusivity_count: int
 
+    version: int = 0
+
     @model_validator(mode="before")
     @classmethod
     def convert_objectid(cls, values):
@@ -47,6 +47,11 @@ class ReviewModel(BaseModel):
 
     # Add any additional fields that might be in your database
     comment: Optional[str] = None
+    # Set by the server to the review this one nearly duplicates.
+    duplicate_of: Optional[str] = None
+    # Set by the server while the aggregation worker has yet to add the
+    # review: the aggregation's rebuild_version read before it was written.
+    pending_aggregation: Optional[int] = None
 
     @field_serializer("id")
     def serialize_id(self, id: Optional[str], _info):
@@ -73,6 +78,8 @@ class ReviewModel(BaseModel):
 
 class ReviewCreate(ReviewModel):
     id: Optional[str] = Field(default=None, exclude=True)
+    duplicate_of: Optional[str] = Field(default=None, exclude=True)
+    pending_aggregation: Optional[int] = Field(default=None, exclude=True)
 
 
 class ReviewResponse(ReviewModel):
@@ -0,0 +1,333 @@
+from core.cache import MISSING, accessibility_index_cache, cache_bus
+from db.mongodb import db
+from fastapi import HTTPException
+from models.aggregation_model import ACCESSIBILITY_CATEGORIES, AggregationCreate
+from typing import Any, Dict, Iterable, List, Optional, Set
+import numpy as np
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A category is accessible when its average rating is at least 66% of 5 stars,
+# a feature is available when at least half of the reports say it exists.
+ACCESSIBILITY_THRESHOLD = 66
+FEATURE_THRESHOLD = 0.5
+
+CATEGORY_BITS = {
+    category: 1 << position
+    for position, category in enumerate(ACCESSIBILITY_CATEGORIES)
+}
+
+_defaults = AggregationCreate(GID="")
+FEATURES = [
+    (category, feature)
+    for category in ACCESSIBILITY_CATEGORIES
+    for feature in getattr(_defaults, f"{category}_dict")
+]
+FEATURE_BITS = {key: 1 << position for position, key in enumerate(FEATURES)}
+
+INDEX_CACHE_KEY = "catalog"
+
+
+def encode_categories(categories: Iterable[str]) -> Optional[int]:
+    """Encodes building categories as a bitmask, or None if any is unknown."""
+    mask = 0
+    for category in categories:
+        bit = CATEGORY_BITS.get(category)
+        if bit is None:
+            return None
+        mask |= bit
+    return mask
+
+
+def encode_features(features: Iterable[str]) -> Optional[int]:
+    """Encodes ``"<category>.<feature>"`` keys (e.g.
+    ``"mobility_accessibility.slopedramps"``) as a bitmask, or None if any is
+    unknown."""
+    mask = 0
+    for key in features:
+        bit = FEATURE_BITS.get(tuple(key.split(".", 1)))
+        if bit is None:
+            return None
+        mask |= bit
+    return mask
+
+
+def decode_categories(mask: int) -> List[str]:
+    return [category for category, bit in CATEGORY_BITS.items() if mask & bit]
+
+
+class AccessibilityIndex:
+    """Column-oriented view of every aggregation's ratings and feature tallies.
+
+    Each building is a row; ``category_masks`` and ``feature_masks`` pack the
+    categories that pass the accessibility threshold and the features that are
+    reported as available into fixed-width integers, so matching a user's
+    needs against the whole catalog is one vectorized comparison.
+
+    ``version`` is a digest of the indexed data, changed by every update.
+    ``match_version`` only changes when some building's masks do, or a
+    building is added, i.e. when the set of buildings some needs match may
+    have changed. ``row_versions`` hold each building's aggregation
+    ``version``, so results derived from a few buildings can be checked
+    against just those.
+
+    ``decayed_scores`` and ``decayed_category_masks`` are the same views over
+    the time-decayed ratings, for callers that favour recent reviews.
+
+    Aggregation writes replace single rows with ``update``: the writing
+    process and, through replayed invalidations of the GIDs, every other
+    process mark them stale, and ``load`` re-reads just those before
+    returning the index.
+    """
+
+    stale: Set[str] = set()
+
+    def __init__(self, aggregations: List[Dict[str, Any]]):
+        self.ids: List[str] = []
+        self.gids: List[str] = []
+        self.gid_rows: Dict[str, int] = {}
+        self.row_versions: List[int] = []
+        categories = len(ACCESSIBILITY_CATEGORIES)
+        self.rating_sums = np.zeros((0, categories))
+        self.rating_counts = np.zeros((0, categories))
+        self.decayed_sums = np.zeros((0, categories))
+        self.decayed_weights = np.zeros((0, categories))
+        # Aggregations written before a category existed do not match it.
+        self.present = np.zeros((0, categories), dtype=bool)
+        self.feature_true = np.zeros((0, len(FEATURES)))
+        self.feature_total = np.zeros((0, len(FEATURES)))
+        self.scores = np.zeros((0, categories))
+        self.decayed_scores = np.zeros((0, categories))
+        self.category_masks = np.zeros(0, dtype=np.uint64)
+        self.decayed_category_masks = np.zeros(0, dtype=np.uint64)
+        self.feature_masks = np.zeros(0, dtype=np.uint64)
+
+        self._grow(len(aggregations))
+        for row, aggregation in enumerate(aggregations):
+            self._fill(row, aggregation)
+        self._derive(slice(None))
+
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update("\0".join(self.gids).encode("utf-8"))
+        for array in self._data_arrays():
+            digest.update(array.tobytes())
+        self.version = digest.hexdigest()
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update("\0".join(self.gids).encode("utf-8"))
+        for array in self._mask_arrays():
+            digest.update(array.tobytes())
+        self.match_version = digest.hexdigest()
+
+    def __len__(self) -> int:
+        return len(self.gids)
+
+    def _data_arrays(self) -> List[np.ndarray]:
+        return [
+            self.rating_sums,
+            self.rating_counts,
+            self.decayed_sums,
+            self.decayed_weights,
+            self.present,
+            self.feature_true,
+            self.feature_total,
+        ]
+
+    def _mask_arrays(self) -> List[np.ndarray]:
+        return [self.category_masks, self.decayed_category_masks, self.feature_masks]
+
+    def _grow(self, count: int) -> None:
+        """Appends ``count`` empty rows."""
+        if not count:
+            return
+        self.ids.extend([""] * count)
+        self.gids.extend([""] * count)
+        self.row_versions.extend([0] * count)
+        for name in (
+            "rating_sums",
+            "rating_counts",
+            "decayed_sums",
+            "decayed_weights",
+            "present",
+            "feature_true",
+            "feature_total",
+            "scores",
+            "decayed_scores",
+            "category_masks",
+            "decayed_category_masks",
+            "feature_masks",
+        ):
+            array = getattr(self, name)
+            empty = np.zeros((count,) + array.shape[1:], dtype=array.dtype)
+            setattr(self, name, np.concatenate([array, empty]))
+
+    def _fill(self, row: int, aggregation: Dict[str, Any]) -> None:
+        """Copies one aggregation's ratings and tallies into ``row``."""
+        self.ids[row] = str(aggregation.get("_id"))
+        self.gids[row] = aggregation["GID"]
+        self.gid_rows[aggregation["GID"]] = row
+        self.row_versions[row] = aggregation.get("version") or 0
+        for column, category in enumerate(ACCESSIBILITY_CATEGORIES):
+            rating = aggregation.get(f"{category}_rating")
+            self.present[row, column] = rating is not None
+            rating = rating or (0, 0)
+            self.rating_sums[row, column] = rating[0]
+            self.rating_counts[row, column] = rating[1]
+            self.decayed_sums[row, column] = aggregation.get(
+                f"{category}_decayed_rating_sum", 0.0
+            )
+            self.decayed_weights[row, column] = aggregation.get(
+                f"{category}_decayed_weight", 0.0
+            )
+        for column, (category, feature) in enumerate(FEATURES):
+            tally = (aggregation.get(f"{category}_dict") or {}).get(feature)
+            tally = tally or (0, 0)
+            self.feature_true[row, column] = tally[0]
+            self.feature_total[row, column] = tally[1]
+
+    def _derive(self, rows) -> None:
+        """Recomputes the scores and masks of ``rows`` from their data."""
+        rating_sums = self.rating_sums[rows]
+        rating_counts = self.rating_counts[rows]
+        decayed_sums = self.decayed_sums[rows]
+        decayed_weights = self.decayed_weights[rows]
+        present = self.present[rows]
+        scores = np.divide(
+            rating_sums * 100,
+            rating_counts * 5,
+            out=np.zeros_like(rating_sums),
+            where=rating_counts > 0,
+        )
+        # Counts gate the decayed scores too: weights of removed reviews can
+        # leave rounding residue instead of an exact zero.
+        decayed_scores = np.divide(
+            decayed_sums * 100,
+            decayed_weights * 5,
+            out=np.zeros_like(decayed_sums),
+            where=(rating_counts > 0) & (decayed_weights > 0),
+        )
+        self.scores[rows] = scores
+        self.decayed_scores[rows] = decayed_scores
+        category_weights = np.array(
+            [CATEGORY_BITS[category] for category in ACCESSIBILITY_CATEGORIES],
+            dtype=np.uint32,
+        )
+        passing = present & (scores >= ACCESSIBILITY_THRESHOLD)
+        self.category_masks[rows] = (passing * category_weights).sum(axis=1)
+        passing = present & (decayed_scores >= ACCESSIBILITY_THRESHOLD)
+        self.decayed_category_masks[rows] = (passing * category_weights).sum(axis=1)
+
+        feature_weights = np.array(
+            [FEATURE_BITS[key] for key in FEATURES], dtype=np.uint64
+        )
+        feature_true = self.feature_true[rows]
+        feature_total = self.feature_total[rows]
+        available = (feature_total > 0) & (
+            feature_true >= feature_total * FEATURE_THRESHOLD
+        )
+        self.feature_masks[rows] = (available * feature_weights).sum(axis=1)
+
+    def update(self, aggregations: List[Dict[str, Any]]) -> None:
+        """Replaces the rows of ``aggregations``, adding rows for new GIDs."""
+        if not aggregations:
+            return
+        added = [a["GID"] for a in aggregations if a["GID"] not in self.gid_rows]
+        first_added = len(self.gids)
+        self._grow(len(added))
+        for offset, GID in enumerate(added):
+            self.gid_rows[GID] = first_added + offset
+        rows = np.array([self.gid_rows[a["GID"]] for a in aggregations])
+        masks_before = [array[rows].copy() for array in self._mask_arrays()]
+        for row, aggregation in zip(rows.tolist(), aggregations):
+            self._fill(row, aggregation)
+        self._derive(rows)
+
+        gids = "\0".join(self.gids[row] for row in rows.tolist()).encode("utf-8")
+        digest = hashlib.blake2b(self.version.encode("utf-8"), digest_size=16)
+        digest.update(gids)
+        for array in self._data_arrays():
+            digest.update(array[rows].tobytes())
+        self.version = digest.hexdigest()
+        masks = [array[rows] for array in self._mask_arrays()]
+        if added or any(
+            not np.array_equal(before, after)
+            for before, after in zip(masks_before, masks)
+        ):
+            digest = hashlib.blake2b(
+                self.match_version.encode("utf-8"), digest_size=16
+            )
+            digest.update(gids)
+            for array in masks:
+                digest.update(array.tobytes())
+            self.match_version = digest.hexdigest()
+
+    def row_version(self, GID: str) -> Optional[int]:
+        row = self.gid_rows.get(GID)
+        return None if row is None else self.row_versions[row]
+
+    def match(
+        self, category_mask: int, feature_mask: int = 0, decayed: bool = False
+    ) -> np.ndarray:
+        """Returns the row numbers of buildings satisfying both masks."""
+        category_masks = self.decayed_category_masks if decayed else self.category_masks
+        matched = (category_masks & np.uint32(category_mask)) == category_mask
+        if feature_mask:
+            matched &= (
+                self.feature_masks & np.uint64(feature_mask)
+            ) == np.uint64(feature_mask)
+        return np.flatnonzero(matched)
+
+    def category_scores(
+        self, category: str, decayed: bool = False
+    ) -> Optional[np.ndarray]:
+        if category not in CATEGORY_BITS:
+            return None
+        column = ACCESSIBILITY_CATEGORIES.index(category)
+        scores = self.decayed_scores if decayed else self.scores
+        return np.where(self.present[:, column], scores[:, column], np.nan)
+
+    @staticmethod
+    def get_collection():
+        if db.db is None:
+            logger.error("Database not initialized")
+            raise HTTPException(status_code=500, detail="Database not initialized")
+        return db.db.aggregation
+
+    @staticmethod
+    async def _read(query: Dict[str, Any]) -> List[Dict[str, Any]]:
+        # Review texts are the bulk of every aggregation and are not needed
+        # for matching, so they are left out of the scan.
+        projection = {f"{category}_texts": 0 for category in ACCESSIBILITY_CATEGORIES}
+        collection = AccessibilityIndex.get_collection()
+        return await collection.find(query, projection).to_list(None)
+
+    @staticmethod
+    async def load() -> "AccessibilityIndex":
+        await cache_bus.sync()
+        index = accessibility_index_cache.get(INDEX_CACHE_KEY)
+        if index is MISSING:
+            # GIDs written during the scan stay stale and are re-read next time.
+            AccessibilityIndex.stale = set()
+            index = AccessibilityIndex(await AccessibilityIndex._read({}))
+            accessibility_index_cache.set(INDEX_CACHE_KEY, index)
+            logger.info(f"Built accessibility index for {len(index)} buildings")
+        elif AccessibilityIndex.stale:
+            gids, AccessibilityIndex.stale = sorted(AccessibilityIndex.stale), set()
+            index.update(await AccessibilityIndex._read({"GID": {"$in": gids}}))
+        return index
+
+    @staticmethod
+    def mark_stale(GID: str) -> None:
+        AccessibilityIndex.stale.add(GID)
+
+    @staticmethod
+    async def refresh(gids: Iterable[str]) -> None:
+        """Marks the rows of aggregations just written to be re-read, here
+        and in every other process."""
+        gids = sorted(set(gids))
+        AccessibilityIndex.stale.update(gids)
+        await cache_bus.publish_many(accessibility_index_cache, gids)
+
+
+cache_bus.subscribe(accessibility_index_cache, AccessibilityIndex.mark_stale)
@@ -1,13 +1,41 @@
 from services.profile_service import ProfileService
+from core.cache import MISSING, cache_bus, profile_needs_cache
 from typing import Dict, List, Any
+import copy
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 class AccessibilityService:
+    @staticmethod
+    async def get_cached_accessibility_profile(email: str) -> Dict[str, Any]:
+        # Needs and building categories are derived together and cached per
+        # email; ProfileService invalidates the entry whenever it writes.
+        await cache_bus.sync()
+        cached = profile_needs_cache.get(email)
+        if cached is MISSING:
+            user_disabilities = await AccessibilityService._load_accessibility_needs(
+                email
+            )
+            cached = {
+                "user_disabilities": user_disabilities,
+                "building_categories": (
+                    AccessibilityService.map_disabilities_to_building_categories(
+                        user_disabilities
+                    )
+                ),
+            }
+            profile_needs_cache.set(email, cached)
+        return copy.deepcopy(cached)
+
     @staticmethod
     async def get_user_accessibility_needs(email: str) -> Dict[str, List[str]]:
+        cached = await AccessibilityService.get_cached_accessibility_profile(email)
+        return cached["user_disabilities"]
+
+    @staticmethod
+    async def _load_accessibility_needs(email: str) -> Dict[str, List[str]]:
         try:
             profile = await ProfileService.get_profile_by_email(email)
             if not profile:
@@ -68,23 +96,12 @@ class AccessibilityService:
     @staticmethod
     async def get_user_accessibility_categories(email: str) -> Dict[str, Any]:
         try:
-            user_disabilities = await AccessibilityService.get_user_accessibility_needs(
-                email
-            )
-            if not user_disabilities:
+            cached = await AccessibilityService.get_cached_accessibility_profile(email)
+            if not cached["user_disabilities"]:
                 logger.info(f"No accessibility needs found for user: {email}")
                 return {"message": "NA"}
 
-            building_categories = (
-                AccessibilityService.map_disabilities_to_building_categories(
-                    user_disabilities
-                )
-            )
-
-            return {
-                "user_disabilities": user_disabilities,
-                "building_categories": building_categories,
-            }
+            return cached
         except Exception as e:
             logger.error(
                 f"Error processing accessibility categories for {email}: {str(e)}"
@@ -0,0 +1,168 @@
+from core.config import settings
+from db.mongodb import db
+from fastapi import HTTPException
+from services.accessibility_index import CATEGORY_BITS, AccessibilityIndex
+from models.aggregation_model import ACCESSIBILITY_CATEGORIES
+from pymongo import UpdateOne
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+ALL_CATEGORIES_MASK = (1 << len(CATEGORY_BITS)) - 1
+
+
+def submasks(mask: int) -> Iterator[int]:
+    """Yields every non-empty subset of ``mask``."""
+    subset = mask
+    while subset:
+        yield subset
+        subset = (subset - 1) & mask
+
+
+class AccessibleSetService:
+    """Materialized accessible-building lists for every combination of needs.
+
+    ``accessible_building_sets`` holds one document per non-empty category
+    mask (see ``encode_categories``) with the sorted GIDs of every building
+    passing the accessibility threshold in all of those categories. Each
+    aggregation records its own passing mask in ``accessible_mask``, so an
+    aggregation write only touches the sets for categories whose threshold it
+    crossed. ``jobs.rebuild_accessible_sets`` builds the view from scratch;
+    until it has run, ``get_gids`` returns None and callers scan instead.
+    """
+
+    @staticmethod
+    def get_collection():
+        if db.db is None:
+            logger.error("Database not initialized")
+            raise HTTPException(status_code=500, detail="Database not initialized")
+        return db.db.accessible_building_sets
+
+    @staticmethod
+    async def get_gids(mask: int) -> Optional[List[str]]:
+        if not mask:
+            return None
+        entry = await AccessibleSetService.get_collection().find_one({"_id": mask})
+        return entry["gids"] if entry else None
+
+    @staticmethod
+    def _rating_projection():
+        projection = {"GID": 1, "accessible_mask": 1}
+        for category in ACCESSIBILITY_CATEGORIES:
+            projection[f"{category}_rating"] = 1
+        return projection
+
+    @staticmethod
+    async def refresh(gids: Iterable[str]) -> int:
+        """Moves the given GIDs between sets after their ratings changed.
+
+        Each move is claimed with a compare-and-swap of ``accessible_mask``
+        against the mask it was computed from, so of two concurrent refreshes
+        only one moves a GID out of a given mask; the other re-reads its
+        ratings and moves it on from where the first left it. Returns how
+        many GIDs crossed a threshold.
+        """
+        gids = list(gids)
+        moved = 0
+        for _ in range(settings.AGGREGATION_CAS_RETRIES + 1):
+            if not gids:
+                break
+            claimed, gids = await AccessibleSetService._refresh_once(gids)
+            moved += claimed
+        if gids:
+            logger.warning(f"Accessible sets not refreshed for {gids}; kept changing")
+        return moved
+
+    @staticmethod
+    async def _refresh_once(gids: List[str]) -> Tuple[int, List[str]]:
+        """Returns how many GIDs were moved and the GIDs whose mask changed
+        since it was read."""
+        collection = AccessibilityIndex.get_collection()
+        aggregations = await (
+            collection.find(
+                {"GID": {"$in": gids}}, AccessibleSetService._rating_projection()
+            ).to_list(None)
+        )
+        if not aggregations:
+            return 0, []
+        # The index applies the threshold, so both paths agree on it.
+        masks = AccessibilityIndex(aggregations).category_masks.tolist()
+
+        set_operations = []
+        moved = 0
+        conflicts = []
+        for aggregation, new_mask in zip(aggregations, masks):
+            old_mask = aggregation.get("accessible_mask", 0)
+            if new_mask == old_mask:
+                continue
+            GID = aggregation["GID"]
+            # Only matches while the mask is still the one read above;
+            # aggregations never refreshed have none.
+            claim = await collection.update_one(
+                {"GID": GID, "accessible_mask": aggregation.get("accessible_mask")},
+                {"$set": {"accessible_mask": new_mask}},
+            )
+            if not claim.matched_count:
+                conflicts.append(GID)
+                continue
+            moved += 1
+            for subset in submasks(old_mask):
+                if subset & new_mask != subset:
+                    set_operations.append(
+                        UpdateOne({"_id": subset}, {"$pull": {"gids": GID}})
+                    )
+            for subset in submasks(new_mask):
+                if subset & old_mask != subset:
+                    set_operations.append(
+                        UpdateOne(
+                            {"_id": subset, "gids": {"$ne": GID}},
+                            {"$push": {"gids": {"$each": [GID], "$sort": 1}}},
+                        )
+                    )
+
+        # Sets are never upserted here: before the first rebuild they do not
+        # exist and readers fall back to scanning.
+        if set_operations:
+            await AccessibleSetService.get_collection().bulk_write(
+                set_operations, ordered=False
+            )
+        return moved, conflicts
+
+    @staticmethod
+    async def rebuild() -> int:
+        """Rebuilds every set from the current aggregations."""
+        collection = AccessibilityIndex.get_collection()
+        index = AccessibilityIndex(
+            await collection.find(
+                {}, AccessibleSetService._rating_projection()
+            ).to_list(None)
+        )
+        masks = index.category_masks.tolist()
+        members = {mask: [] for mask in range(1, ALL_CATEGORIES_MASK + 1)}
+        for GID, mask in sorted(zip(index.gids, masks)):
+            for subset in submasks(mask):
+                members[subset].append(GID)
+
+        built_at = datetime.utcnow()
+        await AccessibleSetService.get_collection().bulk_write(
+            [
+                UpdateOne(
+                    {"_id": mask},
+                    {"$set": {"gids": gids, "builtAt": built_at}},
+                    upsert=True,
+                )
+                for mask, gids in members.items()
+            ],
+            ordered=False,
+        )
+        if len(index):
+            await collection.bulk_write(
+                [
+                    UpdateOne({"GID": GID}, {"$set": {"accessible_mask": mask}})
+                    for GID, mask in zip(index.gids, masks)
+                ],
+                ordered=False,
+            )
+        return len(index)
@@ -0,0 +1,174 @@
+from models.aggregation_model import ACCESSIBILITY_CATEGORIES, AggregationCreate
+from models.review_model import ReviewModel
+from core.config import settings
+from core.decay import decay_weight, review_time
+from services.review_duplicate_service import is_counted
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+_defaults = AggregationCreate(GID="")
+CATEGORY_FEATURES = {
+    category: set(getattr(_defaults, f"{category}_dict"))
+    for category in ACCESSIBILITY_CATEGORIES
+}
+
+
+class AggregationDelta:
+    """Additive change to one GID's aggregation document.
+
+    Reviews are folded into ``$inc`` amounts on the ``(true, total)`` feature
+    tallies, ``(sum, count)`` ratings and time-decayed rating sums and weights
+    plus the texts to append, using the
+    same rules as ``AggregationService.update_aggregation`` so applying the
+    delta matches a full rebuild. Texts go to the review text buckets in full
+    and to the aggregation's bounded recent sample.
+
+    Folding with ``sign=-1`` reverses a review that is already counted, so an
+    edit is the old review removed plus the new one added.
+    """
+
+    def __init__(self, GID: str):
+        self.GID = GID
+        self.increments: Dict[str, float] = defaultdict(int)
+        self.texts: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self.removed_texts: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        # Increments for the monthly aggregation_history buckets, by month.
+        self.history: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: defaultdict(int)
+        )
+        self.reviews = 0
+
+    def remove_review(self, review: ReviewModel) -> None:
+        self.add_review(review, sign=-1)
+
+    def _fold_text(self, category: str, entry: Dict[str, Any], sign: int) -> None:
+        # An unchanged text on edit cancels out instead of being pulled and
+        # pushed again.
+        opposite = self.removed_texts if sign > 0 else self.texts
+        if entry in opposite.get(category, ()):
+            opposite[category].remove(entry)
+            if not opposite[category]:
+                del opposite[category]
+        elif sign > 0:
+            self.texts[category].append(entry)
+        else:
+            self.removed_texts[category].append(entry)
+
+    def add_review(self, review: ReviewModel, sign: int = 1) -> None:
+        # Flagged duplicates were never counted, so removing one is a no-op too.
+        if not is_counted(review):
+            return
+        self.reviews += sign
+        # An edited review keeps its ID, so its removal cancels exactly.
+        written_at = review_time(review.id)
+        weight = decay_weight(written_at)
+        history = self.history[written_at.strftime("%Y-%m")]
+        history["reviews"] += sign
+        for category in ACCESSIBILITY_CATEGORIES:
+            review_dict = getattr(review, f"{category}_dict")
+            if review_dict:
+                features = CATEGORY_FEATURES[category]
+                for key, value in review_dict.items():
+                    if key not in features:
+                        continue
+                    value = str(value).lower()
+                    if value in ("true", "false"):
+                        if value == "true":
+                            self.increments[f"{category}_dict.{key}.0"] += sign
+                        self.increments[f"{category}_dict.{key}.1"] += sign
+
+            rating = getattr(review, f"{category}_rating")
+            if rating is not None and rating != 0:
+                self.increments[f"{category}_rating.0"] += rating * sign
+                self.increments[f"{category}_rating.1"] += sign
+                self.increments[f"{category}_decayed_rating_sum"] += (
+                    rating * weight * sign
+                )
+                self.increments[f"{category}_decayed_weight"] += weight * sign
+                history[f"{category}_rating_sum"] += rating * sign
+                history[f"{category}_rating_count"] += sign
+
+            text = getattr(review, f"{category}_text")
+            if text and text.strip():
+                self._fold_text(
+                    category, {"review_id": review.id, "text": text.strip()}, sign
+                )
+
+    def is_empty(self) -> bool:
+        return (
+            not any(self.increments.values())
+            and not self.texts
+            and not self.removed_texts
+        )
+
+    def to_update(self) -> Dict[str, Any]:
+        update: Dict[str, Any] = {}
+        increments = {path: n for path, n in self.increments.items() if n}
+        text_counts: Dict[str, int] = defaultdict(int)
+        for category, entries in self.texts.items():
+            text_counts[category] += len(entries)
+        for category, entries in self.removed_texts.items():
+            text_counts[category] -= len(entries)
+        for category, count in text_counts.items():
+            if count:
+                increments[f"{category}_text_count"] = count
+        if increments:
+            update["$inc"] = increments
+        if self.texts:
+            update["$push"] = {
+                f"{category}_texts": {
+                    "$each": [entry["text"] for entry in entries],
+                    "$slice": -settings.REVIEW_TEXT_SAMPLE_SIZE,
+                }
+                for category, entries in self.texts.items()
+            }
+        if self.texts or self.removed_texts:
+            update["$set"] = {"texts_updated_at": datetime.utcnow()}
+        if update:
+            # Makes concurrent version-checked rebuilds retry.
+            update.setdefault("$inc", {})["version"] = 1
+        return update
+
+    def to_pull(self) -> Dict[str, Any]:
+        """Removes reversed texts from the recent sample.
+
+        Applied as its own update before ``to_update``, since one update
+        cannot both ``$pull`` from and ``$push`` to the same array. The sample
+        holds bare strings, so every copy of a removed text is pulled.
+        """
+        if not self.removed_texts:
+            return {}
+        return {
+            "$pull": {
+                f"{category}_texts": {"$in": [entry["text"] for entry in entries]}
+                for category, entries in self.removed_texts.items()
+            }
+        }
+
+
+def fold_reviews(
+    reviews: Iterable[ReviewModel],
+    sign: int = 1,
+    deltas: Optional[Dict[str, AggregationDelta]] = None,
+) -> Dict[str, AggregationDelta]:
+    """Folds reviews into one delta per GID; reviews without a GID are skipped.
+
+    Pass ``deltas`` to fold into existing deltas, e.g. removals then additions.
+    """
+    deltas = {} if deltas is None else deltas
+    for review in reviews:
+        if not review.GID:
+            continue
+        delta = deltas.get(review.GID)
+        if delta is None:
+            delta = deltas[review.GID] = AggregationDelta(review.GID)
+        delta.add_review(review, sign)
+    return deltas
+
+
+def default_aggregation_document(GID: str) -> Dict[str, Any]:
+    """Fields for ``$setOnInsert`` so positional ``$inc`` paths hit arrays."""
+    document = AggregationCreate(GID=GID).model_dump(exclude_none=True)
+    document.pop("GID", None)
+    return document
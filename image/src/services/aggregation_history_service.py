@@ -0,0 +1,230 @@
+from db.mongodb import db
+from fastapi import HTTPException
+from models.aggregation_model import ACCESSIBILITY_CATEGORIES
+from services.aggregation_delta import AggregationDelta
+from core.config import settings
+from pymongo import UpdateOne
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+MONTH_FORMAT = "%Y-%m"
+
+
+def bucket_id(GID: str, month: str) -> str:
+    return f"{GID}:{month}"
+
+
+def month_number(month: str) -> int:
+    year, number = map(int, month.split("-"))
+    return year * 12 + number - 1
+
+
+def shift_month(month: str, months: int) -> str:
+    number = month_number(month) + months
+    return f"{number // 12:04d}-{number % 12 + 1:02d}"
+
+
+def _review_month() -> Dict[str, Any]:
+    """Expression for the month a review was written in, from its _id."""
+    return {"$dateToString": {"format": MONTH_FORMAT, "date": {"$toDate": "$_id"}}}
+
+
+class AggregationHistoryService:
+    """Monthly rating rollups per GID, for trend queries.
+
+    ``aggregation_history`` holds one document per GID and month a review was
+    written in (from the review's ObjectId), with the review count and the
+    ``*_rating_sum`` / ``*_rating_count`` of the ratings given that month.
+    Review deltas ``$inc`` them as reviews are added, edited or deleted. The
+    ``_id`` is ``"<GID>:<YYYY-MM>"``, so a GID's buckets for a range of months
+    are one range scan of the ``_id`` index and concurrent upserts of the same
+    month cannot create two buckets.
+    """
+
+    @staticmethod
+    def get_collection():
+        if db.db is None:
+            logger.error("Database not initialized")
+            raise HTTPException(status_code=500, detail="Database not initialized")
+        return db.db.aggregation_history
+
+    @staticmethod
+    def delta_operations(delta: AggregationDelta) -> List[UpdateOne]:
+        operations = []
+        for month, increments in delta.history.items():
+            increments = {field: n for field, n in increments.items() if n}
+            if not increments:
+                continue
+            operations.append(
+                UpdateOne(
+                    {"_id": bucket_id(delta.GID, month)},
+                    {
+                        "$setOnInsert": {"GID": delta.GID, "month": month},
+                        "$inc": increments,
+                    },
+                    upsert=True,
+                )
+            )
+        return operations
+
+    @staticmethod
+    async def apply_deltas(deltas: Iterable[AggregationDelta]):
+        operations = []
+        for delta in deltas:
+            operations.extend(AggregationHistoryService.delta_operations(delta))
+        if not operations:
+            return None
+        try:
+            collection = AggregationHistoryService.get_collection()
+            return await collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"Error updating aggregation history: {str(e)}")
+            raise
+
+    @staticmethod
+    def _rollup_pipeline(match: Dict[str, Any]) -> List[Dict[str, Any]]:
+        month = _review_month()
+        group: Dict[str, Any] = {
+            "_id": {"$concat": ["$GID", ":", month]},
+            "GID": {"$first": "$GID"},
+            "month": {"$first": month},
+            "reviews": {"$sum": 1},
+        }
+        # Same rule as the deltas: missing and zero ratings are not counted.
+        for category in ACCESSIBILITY_CATEGORIES:
+            rated = {"$gt": [f"${category}_rating", 0]}
+            group[f"{category}_rating_sum"] = {
+                "$sum": {"$cond": [rated, f"${category}_rating", 0]}
+            }
+            group[f"{category}_rating_count"] = {"$sum": {"$cond": [rated, 1, 0]}}
+        return [
+            {"$match": match},
+            {"$group": group},
+            {
+                "$merge": {
+                    "into": "aggregation_history",
+                    "whenMatched": "replace",
+                    "whenNotMatched": "insert",
+                }
+            },
+        ]
+
+    @staticmethod
+    async def rebuild(GIDs: Optional[List[str]] = None) -> int:
+        """Recomputes the buckets of the given GIDs, or of every GID, from
+        the reviews collection in one server-side aggregation."""
+        history = AggregationHistoryService.get_collection()
+        reviews = db.db.reviews
+        if GIDs is None:
+            match: Dict[str, Any] = {"GID": {"$type": "string"}}
+        else:
+            match = {"GID": {"$in": GIDs}}
+        review_match = dict(match)
+        if settings.SKIP_DUPLICATE_REVIEWS:
+            review_match["duplicate_of"] = None
+        try:
+            # Replaces every month that has reviews in place, so readers never
+            # see a GID without its history.
+            await reviews.aggregate(
+                AggregationHistoryService._rollup_pipeline(review_match)
+            ).to_list(None)
+            # Months whose reviews were all deleted are not produced by the
+            # rollup and are dropped. The current month is left to the deltas,
+            # which may be creating its bucket right now.
+            produced = await reviews.aggregate(
+                [
+                    {"$match": review_match},
+                    {"$group": {"_id": {"$concat": ["$GID", ":", _review_month()]}}},
+                ]
+            ).to_list(None)
+            await history.delete_many(
+                {
+                    **match,
+                    "_id": {"$nin": [bucket["_id"] for bucket in produced]},
+                    "month": {"$lt": datetime.utcnow().strftime(MONTH_FORMAT)},
+                }
+            )
+            return await history.count_documents(match)
+        except Exception as e:
+            logger.error(f"Error rebuilding aggregation history: {str(e)}")
+            raise
+
+    @staticmethod
+    async def get_trend(
+        GID: str, months: int, categories: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Per-month averages of the last ``months`` months and, per category,
+        the least-squares change in average rating per month."""
+        categories = categories or ACCESSIBILITY_CATEGORIES
+        last = datetime.utcnow().strftime(MONTH_FORMAT)
+        first = shift_month(last, 1 - months)
+        collection = AggregationHistoryService.get_collection()
+        buckets = (
+            await collection.find(
+                {
+                    "_id": {
+                        "$gte": bucket_id(GID, first),
+                        "$lte": bucket_id(GID, last),
+                    },
+                    "GID": GID,
+                }
+            )
+            .sort("_id", 1)
+            .to_list(None)
+        )
+
+        points = []
+        for bucket in buckets:
+            ratings = {}
+            for category in categories:
+                count = bucket.get(f"{category}_rating_count", 0)
+                if count > 0:
+                    ratings[category] = {
+                        "average": round(
+                            bucket.get(f"{category}_rating_sum", 0) / count, 2
+                        ),
+                        "count": count,
+                    }
+            points.append(
+                {
+                    "month": bucket["month"],
+                    "reviews": bucket.get("reviews", 0),
+                    "ratings": ratings,
+                }
+            )
+
+        slopes = {}
+        for category in categories:
+            series = [
+                (month_number(point["month"]), point["ratings"][category])
+                for point in points
+                if category in point["ratings"]
+            ]
+            slopes[category] = _weighted_slope(series)
+
+        return {
+            "GID": GID,
+            "from": first,
+            "to": last,
+            "months": points,
+            "change_per_month": slopes,
+        }
+
+
+def _weighted_slope(series) -> Optional[float]:
+    # Months are weighted by how many ratings they hold, so one review in a
+    # quiet month does not swing the trend.
+    if len({x for x, _ in series}) < 2:
+        return None
+    total = sum(rating["count"] for _, rating in series)
+    mean_x = sum(x * rating["count"] for x, rating in series) / total
+    mean_y = sum(rating["average"] * rating["count"] for _, rating in series) / total
+    covariance = sum(
+        rating["count"] * (x - mean_x) * (rating["average"] - mean_y)
+        for x, rating in series
+    )
+    variance = sum(rating["count"] * (x - mean_x) ** 2 for x, rating in series)
+    return round(covariance / variance, 4)
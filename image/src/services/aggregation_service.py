@@ -2,15 +2,30 @@ from bson import ObjectId
 from db.mongodb import db
 from fastapi import HTTPException
 from models.aggregation_model import (
+    ACCESSIBILITY_CATEGORIES,
     AggregationModel,
-    AggregationCreate,
     AggregationResponse,
 )
 from models.review_model import ReviewModel
+from services.accessibility_index import AccessibilityIndex
+from services.accessible_set_service import AccessibleSetService
+from services.aggregation_delta import AggregationDelta, default_aggregation_document
+from services.aggregation_history_service import AggregationHistoryService
+from services.extractive_summary import extractive_summary
+from services.review_search_service import ReviewSearchService
+from services.review_text_service import ReviewTextService
+from services.review_summary_service import ReviewSummaryService
+from db.writes import cas_stats, compare_and_swap, update_returning, versioned
+from pymongo import UpdateOne
+import asyncio
 import logging
-from typing import Dict, List, Tuple
+import random
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from datetime import datetime
 from openai import OpenAI
 from core.config import settings
+from core.cache import MISSING, aggregation_cache, cache_bus
+from core.decay import decay_weight, review_time
 
 logger = logging.getLogger(__name__)
 
@@ -37,24 +52,25 @@ class AggregationService:
     @staticmethod
     async def get_or_create_aggregation(GID: str):
         collection = AggregationService.get_collection()
-        aggregation = await collection.find_one({"GID": GID})
-        if not aggregation:
-            new_aggregation = AggregationCreate(GID=GID)
-            result = await collection.insert_one(
-                new_aggregation.model_dump(exclude_none=True)
-            )
-            aggregation = await collection.find_one({"_id": result.inserted_id})
+        aggregation = await update_returning(
+            collection,
+            {"GID": GID},
+            {"$setOnInsert": default_aggregation_document(GID)},
+            upsert=True,
+        )
         return AggregationModel.model_validate(aggregation)
 
     @staticmethod
-    async def update_aggregation(GID: str):
+    async def _recompute_aggregation(GID: str):
         reviews_collection = AggregationService.get_reviews_collection()
-        aggregation_collection = AggregationService.get_collection()
 
         aggregation = await AggregationService.get_or_create_aggregation(GID)
 
         # Get all reviews for this GID
-        reviews = await reviews_collection.find({"GID": GID}).to_list(length=None)
+        query = {"GID": GID}
+        if settings.SKIP_DUPLICATE_REVIEWS:
+            query["duplicate_of"] = None
+        reviews = await reviews_collection.find(query).to_list(length=None)
 
         accessibility_categories = [
             "mobility_accessibility",
@@ -79,10 +95,18 @@ class AggregationService:
             setattr(aggregation, dict_field, category_dict)
             setattr(aggregation, rating_field, (0, 0))  # Reset rating
             setattr(aggregation, text_field, [])  # Reset texts
+            setattr(aggregation, f"{category}_decayed_rating_sum", 0.0)
+            setattr(aggregation, f"{category}_decayed_weight", 0.0)
+
+        # Every text goes to the buckets; the aggregation keeps a recent sample
+        text_entries: Dict[str, List[Dict[str, Any]]] = {
+            category: [] for category in accessibility_categories
+        }
 
         # Process all reviews
         for review in reviews:
             review_model = ReviewModel.model_validate(review)
+            weight = decay_weight(review_time(review_model.id))
 
             for category in accessibility_categories:
                 dict_field = f"{category}_dict"
@@ -113,6 +137,18 @@ class AggregationService:
                     if rating is not None and rating != 0:
                         category_rating_sum += rating
                         category_rating_count += 1
+                        decayed_field = f"{category}_decayed_rating_sum"
+                        weight_field = f"{category}_decayed_weight"
+                        setattr(
+                            aggregation,
+                            decayed_field,
+                            getattr(aggregation, decayed_field) + rating * weight,
+                        )
+                        setattr(
+                            aggregation,
+                            weight_field,
+                            getattr(aggregation, weight_field) + weight,
+                        )
 
                 if hasattr(
                     review_model, text_field.rstrip("s")
@@ -120,6 +156,9 @@ class AggregationService:
                     text = getattr(review_model, text_field.rstrip("s"))
                     if text and text.strip():  # Only add non-empty texts
                         category_texts.append(text.strip())
+                        text_entries[category].append(
+                            {"review_id": review_model.id, "text": text.strip()}
+                        )
 
                 setattr(aggregation, dict_field, category_dict)
                 setattr(
@@ -129,42 +168,238 @@ class AggregationService:
                 )
                 setattr(aggregation, text_field, category_texts)
 
-        # Update the aggregation in the database
-        await aggregation_collection.update_one(
-            {"GID": GID}, {"$set": aggregation.model_dump(exclude_none=True)}
-        )
+        sample_size = settings.REVIEW_TEXT_SAMPLE_SIZE
+        for category in accessibility_categories:
+            texts = getattr(aggregation, f"{category}_texts")
+            setattr(aggregation, f"{category}_text_count", len(texts))
+            setattr(aggregation, f"{category}_texts", texts[-sample_size:])
+        return aggregation, text_entries
+
+    @staticmethod
+    async def update_aggregation(GID: str):
+        """Rebuilds an aggregation from all of its reviews.
+
+        The result is written with a compare-and-swap on the document's
+        version, so a delta or another rebuild landing in between makes this
+        one recompute instead of being overwritten. After
+        ``AGGREGATION_CAS_RETRIES`` conflicts it gives up with a 409. Its
+        review texts are written as a new bucket generation that the same
+        swap makes live, so readers see either the old or the new texts.
+
+        The swap also bumps ``rebuild_version``, so deltas for reviews this
+        rebuild may already have counted are not applied on top of it.
+        """
+        aggregation_collection = AggregationService.get_collection()
+        retries = settings.AGGREGATION_CAS_RETRIES
+        for attempt in range(retries + 1):
+            aggregation, text_entries = (
+                await AggregationService._recompute_aggregation(GID)
+            )
+            aggregation.text_generation = await ReviewTextService.write_generation(
+                GID, text_entries
+            )
+            aggregation.texts_updated_at = datetime.utcnow()
+
+            # Update the aggregation in the database
+            updated = await compare_and_swap(
+                aggregation_collection,
+                {"GID": GID},
+                aggregation.version,
+                {
+                    "$set": aggregation.model_dump(
+                        exclude_none=True, exclude={"version", "rebuild_version"}
+                    ),
+                    "$inc": {"rebuild_version": 1},
+                },
+            )
+            if updated is not None:
+                aggregation.version = updated["version"]
+                aggregation.rebuild_version = updated["rebuild_version"]
+                break
+            await ReviewTextService.drop_generation(GID, aggregation.text_generation)
+            if attempt < retries:
+                await asyncio.sleep(
+                    random.uniform(
+                        0, settings.AGGREGATION_CAS_BACKOFF_SECONDS * 2**attempt
+                    )
+                )
+        else:
+            cas_stats[aggregation_collection.name]["exhausted"] += 1
+            raise HTTPException(
+                status_code=409,
+                detail=f"Aggregation for GID {GID} kept changing; retry later",
+            )
+
+        await ReviewTextService.drop_other_generations(GID, aggregation.text_generation)
+        await AggregationHistoryService.rebuild([GID])
+        ReviewSearchService.mark_stale([GID])
+        await AccessibleSetService.refresh([GID])
+        await cache_bus.publish(aggregation_cache, GID)
+        await AccessibilityIndex.refresh([GID])
 
         return aggregation
 
+    @staticmethod
+    async def rebuild_versions(gids: Iterable[Optional[str]]) -> Dict[str, int]:
+        """Reads the ``rebuild_version`` of each GID's aggregation, 0 for GIDs
+        that have none yet. Review writers read it before writing and pass it
+        to ``apply_deltas``."""
+        gids = sorted({GID for GID in gids if GID})
+        if not gids:
+            return {}
+        aggregations = (
+            await AggregationService.get_collection()
+            .find({"GID": {"$in": gids}}, {"GID": 1, "rebuild_version": 1})
+            .to_list(None)
+        )
+        versions = dict.fromkeys(gids, 0)
+        for aggregation in aggregations:
+            versions[aggregation["GID"]] = aggregation.get("rebuild_version") or 0
+        return versions
+
+    @staticmethod
+    async def apply_deltas(
+        deltas: Iterable[AggregationDelta], versions: Dict[str, int]
+    ):
+        """Applies review deltas for many GIDs in a single bulk_write, plus one
+        bulk_write adding and removing their texts in the review text buckets
+        and one for their monthly history buckets.
+
+        ``versions`` are the ``rebuild_versions`` read before the reviews were
+        written. A GID rebuilt since then may already count them, so its
+        delta is not applied and it is rebuilt again instead.
+        """
+        deltas = list(deltas)
+        operations = []
+        text_operations = []
+        applied = []
+        conflicted = []
+        for delta in deltas:
+            update = delta.to_update()
+            if not update:
+                continue
+            if delta.GID not in versions:
+                conflicted.append(delta.GID)
+                continue
+            pull = delta.to_pull()
+            applied.append(delta)
+            query = versioned(
+                {"GID": delta.GID}, versions[delta.GID], "rebuild_version"
+            )
+            # Ordered so the defaults exist before the positional $inc paths.
+            operations.append(
+                UpdateOne(
+                    {"GID": delta.GID},
+                    {"$setOnInsert": default_aggregation_document(delta.GID)},
+                    upsert=True,
+                )
+            )
+            if pull:
+                operations.append(UpdateOne(query, pull))
+            operations.append(UpdateOne(query, update))
+        if not operations and not conflicted:
+            return None
+
+        collection = AggregationService.get_collection()
+        result = None
+        if operations:
+            result = await collection.bulk_write(operations, ordered=True)
+            if result.matched_count + result.upserted_count < len(operations):
+                current = await AggregationService.rebuild_versions(
+                    delta.GID for delta in applied
+                )
+                lost = {
+                    delta.GID
+                    for delta in applied
+                    if current[delta.GID] != versions[delta.GID]
+                }
+                conflicted.extend(sorted(lost))
+                applied = [delta for delta in applied if delta.GID not in lost]
+        # Read after the aggregations are updated, so the texts land in the
+        # generation that stays live: a rebuild swapping in a new one after
+        # this point fails its compare-and-swap on the version just bumped.
+        with_texts = [delta for delta in applied if delta.texts or delta.removed_texts]
+        generations = await ReviewTextService.current_generations(
+            [delta.GID for delta in with_texts]
+        )
+        for delta in with_texts:
+            generation = generations.get(delta.GID)
+            for category, entries in delta.removed_texts.items():
+                text_operations.extend(
+                    ReviewTextService.remove_operations(
+                        delta.GID, category, entries, generation
+                    )
+                )
+            for category, entries in delta.texts.items():
+                text_operations.extend(
+                    ReviewTextService.append_operations(
+                        delta.GID, category, entries, generation
+                    )
+                )
+        await ReviewTextService.apply_operations(text_operations)
+        await AggregationHistoryService.apply_deltas(applied)
+        ReviewSearchService.mark_stale(delta.GID for delta in with_texts)
+        gids = [delta.GID for delta in applied]
+        await AccessibleSetService.refresh(gids)
+        await cache_bus.publish_many(aggregation_cache, gids)
+        await AccessibilityIndex.refresh(gids)
+
+        if conflicted:
+            cas_stats[collection.name]["delta_conflicts"] += len(conflicted)
+            logger.info(
+                f"Rebuilding {len(conflicted)} aggregations rebuilt while their "
+                "review deltas were in flight"
+            )
+        for GID in conflicted:
+            await AggregationService.update_aggregation(GID)
+        return result
+
     @staticmethod
     async def get_aggregation(GID: str):
+        await cache_bus.sync()
+        cached = aggregation_cache.get(GID)
+        if cached is not MISSING:
+            # Callers may modify what they get; the cached copy is shared.
+            return cached.model_copy(deep=True)
         collection = AggregationService.get_collection()
         aggregation = await collection.find_one({"GID": GID})
         if not aggregation:
             raise HTTPException(
                 status_code=404, detail=f"Aggregation not found for GID: {GID}"
             )
-        return AggregationResponse.model_validate(aggregation)
+        response = AggregationResponse.model_validate(aggregation)
+        aggregation_cache.set(GID, response.model_copy(deep=True))
+        return response
 
     @staticmethod
     async def debug_update_aggregation(GID: str):
         aggregation = await AggregationService.update_aggregation(GID)
-        raw_data = aggregation.model_dump()
+        raw_data = aggregation.model_dump(mode="json")
         logger.debug(f"Raw aggregation data for GID {GID}: {raw_data}")
         return raw_data
 
     @staticmethod
-    async def get_all_aggregations():
+    async def get_all_aggregations(include_texts: bool = False):
         try:
             collection = AggregationService.get_collection()
-            aggregations = await collection.find({}).to_list(None)
+            projection = (
+                None
+                if include_texts
+                else {f"{category}_texts": 0 for category in ACCESSIBILITY_CATEGORIES}
+            )
+            aggregations = await collection.find({}, projection).to_list(None)
             return aggregations
         except Exception as e:
             logger.error(f"Error fetching all aggregations: {str(e)}", exc_info=True)
             raise
 
     @staticmethod
-    async def summarize_building(GID: str) -> Dict[str, str]:
+    async def summarize_building(
+        GID: str, failures: Optional[List[str]] = None, extractive_only: bool = False
+    ) -> Dict[str, str]:
+        """Summarizes every category; categories whose LLM call failed fall
+        back to a local extractive summary and are appended to ``failures``
+        when given. ``extractive_only`` skips the LLM entirely."""
         aggregation = await AggregationService.get_aggregation(GID)
         summary = {}
 
@@ -205,7 +440,7 @@ class AggregationService:
                 return f"{avg_rating:.1f}/5"
             return "No ratings available"
 
-        client = await get_openai_client()
+        client = None if extractive_only else await get_openai_client()
 
         for category in categories:
             dict_field = f"{category}_dict"
@@ -232,29 +467,25 @@ class AggregationService:
 
             # Process text reviews
             if hasattr(aggregation, text_field):
-                texts = getattr(aggregation, text_field)
+                # The aggregation only carries a recent sample; older
+                # aggregations without buckets fall back to that sample.
+                texts = await ReviewTextService.get_texts(
+                    GID, category, generation=aggregation.text_generation
+                ) or getattr(aggregation, text_field)
                 if texts:
-                    full_text = "\n".join(texts)
-                    prompt = f". Disregard all numeric fields, don't apply any formatting. Only provide a summary of the reviews that aims to provide readers a quick understanding of that accessibility field for the building. Summarize the following accessibility reviews for {category.replace('_', ' ')} in 1-2 sentences, highlighting key points and areas for improvement:\n\n{full_text}"
-
-                    try:
-                        response = client.chat.completions.create(
-                            model="gpt-3.5-turbo",
-                            messages=[
-                                {
-                                    "role": "system",
-                                    "content": "You are a helpful assistant summarizing accessibility reviews.",
-                                },
-                                {"role": "user", "content": prompt},
-                            ],
-                        )
-                        summary_text = response.choices[0].message.content
-                        category_summary.append(
-                            f"\nUser feedback summary: {summary_text}"
-                        )
-                    except Exception as e:
-                        logger.error(f"Error in OpenAI summarization: {str(e)}")
-                        category_summary.append("\nError in summarizing user comments.")
+                    if extractive_only:
+                        summary_text = extractive_summary(texts)
+                    else:
+                        try:
+                            summary_text = await ReviewSummaryService.summarize(
+                                client, GID, category, texts
+                            )
+                        except Exception as e:
+                            logger.error(f"Error in OpenAI summarization: {str(e)}")
+                            if failures is not None:
+                                failures.append(category)
+                            summary_text = extractive_summary(texts)
+                    category_summary.append(f"\nUser feedback summary: {summary_text}")
                 else:
                     category_summary.append(
                         "\nNo user comments available for this category."
@@ -0,0 +1,358 @@
+from db.mongodb import db
+from fastapi import HTTPException
+from models.review_model import ReviewModel
+from services.aggregation_delta import fold_reviews
+from services.aggregation_service import AggregationService
+from core.config import settings
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+CHANGE_STREAM_JOB_ID = "aggregation_worker_change_stream"
+WORKER_MODES = ("outbox", "change_stream")
+CHANGE_STREAM_HISTORY_LOST = 286
+
+
+class AggregationWorker:
+    """Adds reviews to their aggregations in the background.
+
+    With a worker mode set, ``create_review`` stores the review with a
+    ``pending_aggregation`` marker, the aggregation's rebuild version read
+    before the insert, and leaves the aggregation to the worker. The worker
+    claims each review by removing the marker, so only one worker ever
+    applies it, and applies the claimed reviews as one delta per GID. A
+    review it cannot claim was claimed by a run that may have stopped before
+    applying it, or was edited or deleted meanwhile, so its GID is rebuilt
+    instead. Bulk ingest and the review queue apply their own deltas and
+    never set the marker.
+
+    In ``outbox`` mode ``create_review`` also appends a ``{GID, review_id}``
+    event to the ``aggregation_outbox`` collection, which works on any
+    deployment including a local single-node replica set; processed events
+    expire after ``AGGREGATION_OUTBOX_RETENTION_SECONDS``. In
+    ``change_stream`` mode the worker watches inserts of marked reviews
+    directly and resumes from the token stored in ``job_runs``, which only
+    advances past events that were applied. When there is no stored token,
+    or the oplog no longer holds it, the worker sweeps every review still
+    marked.
+
+    Either way events are buffered for ``AGGREGATION_WORKER_COALESCE_SECONDS``
+    and every GID seen in the window is updated once.
+    """
+
+    def __init__(self):
+        self.events_received = 0
+        self.events_coalesced = 0
+        self.aggregations_updated = 0
+        self.reviews_applied = 0
+        self.rebuilds = 0
+        self.errors = 0
+        self.last_lag_seconds: Optional[float] = None
+        self.last_run_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self._saved_token: Any = None
+
+    @staticmethod
+    def get_outbox_collection():
+        if db.db is None:
+            logger.error("Database not initialized")
+            raise HTTPException(status_code=500, detail="Database not initialized")
+        return db.db.aggregation_outbox
+
+    @staticmethod
+    async def ensure_indexes() -> None:
+        await db.db.reviews.create_index("pending_aggregation", sparse=True)
+        if settings.AGGREGATION_WORKER_MODE != "outbox":
+            return
+        collection = AggregationWorker.get_outbox_collection()
+        await collection.create_index([("processedAt", 1), ("_id", 1)])
+        # TTL indexes skip documents whose field is not a date, so pending
+        # events (processedAt None) never expire.
+        await collection.create_index(
+            "processedAt",
+            expireAfterSeconds=settings.AGGREGATION_OUTBOX_RETENTION_SECONDS,
+        )
+
+    @staticmethod
+    def defers(GID: Optional[str]) -> bool:
+        """Whether a new review for ``GID`` is left to the worker."""
+        return bool(GID) and settings.AGGREGATION_WORKER_MODE in WORKER_MODES
+
+    @staticmethod
+    async def enqueue(GID: Optional[str], review_id: Any) -> None:
+        if not GID or settings.AGGREGATION_WORKER_MODE != "outbox":
+            return
+        await AggregationWorker.get_outbox_collection().insert_one(
+            {
+                "GID": GID,
+                "review_id": review_id,
+                "createdAt": datetime.utcnow(),
+                "processedAt": None,
+            }
+        )
+
+    async def _rebuild(self, gids: Iterable[str]) -> Set[str]:
+        rebuilt = set()
+        for GID in gids:
+            try:
+                await AggregationService.update_aggregation(GID)
+                rebuilt.add(GID)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Error rebuilding aggregation {GID}: {str(e)}")
+        self.rebuilds += len(rebuilt)
+        return rebuilt
+
+    async def apply_reviews(self, events: List[Tuple[str, Any]]) -> Set[str]:
+        """Claims and applies the reviews behind ``(GID, review_id)`` events.
+
+        Returns the GIDs whose events are done; the others failed to rebuild
+        and are retried.
+        """
+        collection = AggregationService.get_reviews_collection()
+        reviews = []
+        versions: Dict[str, int] = {}
+        unclaimed = set()
+        for GID, review_id in events:
+            # One at a time: only the write that removes the marker tells this
+            # worker the review is its to apply.
+            document = await collection.find_one_and_update(
+                {"_id": review_id, "pending_aggregation": {"$exists": True}},
+                {"$unset": {"pending_aggregation": ""}},
+                return_document=ReturnDocument.BEFORE,
+            )
+            if document is None:
+                unclaimed.add(GID)
+                continue
+            version = document.pop("pending_aggregation")
+            review = ReviewModel.model_validate(document)
+            # A rebuild between two of a GID's reviews may count the first.
+            versions[review.GID] = min(versions.get(review.GID, version), version)
+            reviews.append(review)
+        deltas = fold_reviews(reviews)
+        await AggregationService.apply_deltas(
+            [delta for GID, delta in deltas.items() if GID not in unclaimed],
+            versions,
+        )
+        self.reviews_applied += len(reviews)
+        rebuilt = await self._rebuild(sorted(unclaimed))
+        done = {GID for GID, _ in events} - (unclaimed - rebuilt)
+        self.aggregations_updated += len(done)
+        self.last_run_at = datetime.utcnow()
+        return done
+
+    async def process_outbox_once(self) -> int:
+        """Drains one batch of pending outbox events; returns events handled."""
+        collection = AggregationWorker.get_outbox_collection()
+        events = (
+            await collection.find({"processedAt": None})
+            .sort("_id", 1)
+            .to_list(settings.AGGREGATION_WORKER_BATCH_SIZE)
+        )
+        if not events:
+            self.last_lag_seconds = 0.0
+            return 0
+
+        self.events_received += len(events)
+        self.last_lag_seconds = (
+            datetime.utcnow() - events[0]["createdAt"]
+        ).total_seconds()
+        self.events_coalesced += len(events) - len({e["GID"] for e in events})
+
+        done = await self.apply_reviews(
+            [(event["GID"], event["review_id"]) for event in events]
+        )
+        # Events of GIDs that failed to rebuild stay pending and are retried
+        # on the next pass.
+        processed = [event["_id"] for event in events if event["GID"] in done]
+        if processed:
+            await collection.update_many(
+                {"_id": {"$in": processed}},
+                {"$set": {"processedAt": datetime.utcnow()}},
+            )
+        return len(events)
+
+    async def run_outbox(self) -> None:
+        await AggregationWorker.ensure_indexes()
+        while True:
+            try:
+                handled = await self.process_outbox_once()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Aggregation worker error: {str(e)}", exc_info=True)
+                handled = 0
+            if handled < settings.AGGREGATION_WORKER_BATCH_SIZE:
+                await asyncio.sleep(settings.AGGREGATION_WORKER_COALESCE_SECONDS)
+
+    async def _flush_due(
+        self, pending: Dict[str, Tuple[float, Any, List[Any]]]
+    ) -> bool:
+        cutoff = time.monotonic() - settings.AGGREGATION_WORKER_COALESCE_SECONDS
+        due = [GID for GID, (seen, _, _) in pending.items() if seen <= cutoff]
+        if not due:
+            return False
+        self.last_lag_seconds = time.monotonic() - min(
+            pending[GID][0] for GID in due
+        )
+        try:
+            done = await self.apply_reviews(
+                [(GID, review_id) for GID in due for review_id in pending[GID][2]]
+            )
+        except Exception as e:
+            # Their reviews may be claimed already; the retry rebuilds them.
+            self.errors += 1
+            logger.error(f"Aggregation worker error: {str(e)}", exc_info=True)
+            done = set()
+        for GID in due:
+            if GID in done:
+                del pending[GID]
+            else:
+                # Retried next window; it keeps its place, so the stored
+                # token does not move past its events.
+                seen, token, review_ids = pending[GID]
+                pending[GID] = (time.monotonic(), token, review_ids)
+        return True
+
+    async def _save_resume_token(self, token: Any) -> None:
+        if token is None or token == self._saved_token:
+            return
+        await db.db.job_runs.update_one(
+            {"_id": CHANGE_STREAM_JOB_ID},
+            {"$set": {"resumeToken": token, "savedAt": datetime.utcnow()}},
+            upsert=True,
+        )
+        self._saved_token = token
+
+    async def sweep_pending(self) -> int:
+        """Applies every review still marked ``pending_aggregation``, for
+        when the events that would have carried them are gone."""
+        reviews = (
+            await AggregationService.get_reviews_collection()
+            .find({"pending_aggregation": {"$exists": True}}, {"GID": 1})
+            .to_list(None)
+        )
+        batch_size = settings.AGGREGATION_WORKER_BATCH_SIZE
+        for start in range(0, len(reviews), batch_size):
+            await self.apply_reviews(
+                [
+                    (review.get("GID"), review["_id"])
+                    for review in reviews[start : start + batch_size]
+                ]
+            )
+        return len(reviews)
+
+    async def run_change_stream(self) -> None:
+        await AggregationWorker.ensure_indexes()
+        state = await db.db.job_runs.find_one({"_id": CHANGE_STREAM_JOB_ID}) or {}
+        self._saved_token = state.get("resumeToken")
+        try:
+            await self._watch(self._saved_token)
+        except OperationFailure as e:
+            if e.code != CHANGE_STREAM_HISTORY_LOST or self._saved_token is None:
+                raise
+            logger.warning(
+                "Aggregation worker resume token is no longer in the oplog; "
+                "sweeping pending reviews"
+            )
+            await self._watch(None)
+
+    async def _watch(self, resume_token: Any) -> None:
+        # GID -> (when its first pending event arrived, the token just before
+        # that event, its pending review IDs). Insertion order is event
+        # order, so the first entry is the oldest and its token is as far as
+        # the stream can safely resume.
+        pending: Dict[str, Tuple[float, Any, List[Any]]] = {}
+        pipeline = [
+            {
+                "$match": {
+                    "operationType": "insert",
+                    "fullDocument.pending_aggregation": {"$exists": True},
+                }
+            }
+        ]
+        async with db.db.reviews.watch(pipeline, resume_after=resume_token) as stream:
+            if resume_token is None:
+                # Opened first, so reviews written during the sweep arrive as
+                # events; those it already applied are rebuilt once.
+                swept = await self.sweep_pending()
+                logger.info(f"Swept {swept} pending reviews into aggregations")
+            token = stream.resume_token or resume_token
+            while stream.alive:
+                change = await stream.try_next()
+                if change is not None:
+                    self.events_received += 1
+                    document = change["fullDocument"]
+                    GID = document.get("GID")
+                    if GID:
+                        if GID in pending:
+                            self.events_coalesced += 1
+                        pending.setdefault(GID, (time.monotonic(), token, []))
+                        pending[GID][2].append(document["_id"])
+                    token = stream.resume_token
+                # Flushed on the deadline even while events keep arriving,
+                # not only once the stream goes idle.
+                if await self._flush_due(pending):
+                    await self._save_resume_token(
+                        next(iter(pending.values()))[1] if pending else token
+                    )
+                elif change is None:
+                    await asyncio.sleep(0.1)
+
+    async def run(self) -> None:
+        logger.info(
+            f"Aggregation worker started in {settings.AGGREGATION_WORKER_MODE} mode"
+        )
+        if settings.AGGREGATION_WORKER_MODE == "change_stream":
+            await self.run_change_stream()
+        else:
+            await self.run_outbox()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {
+            "mode": settings.AGGREGATION_WORKER_MODE,
+            "running": self._task is not None and not self._task.done(),
+            "events_received": self.events_received,
+            "events_coalesced": self.events_coalesced,
+            "aggregations_updated": self.aggregations_updated,
+            "reviews_applied": self.reviews_applied,
+            "rebuilds": self.rebuilds,
+            "errors": self.errors,
+            "last_lag_seconds": self.last_lag_seconds,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+        }
+        if settings.AGGREGATION_WORKER_MODE == "outbox":
+            collection = AggregationWorker.get_outbox_collection()
+            stats["queue_depth"] = await collection.count_documents(
+                {"processedAt": None}
+            )
+            oldest = await collection.find_one(
+                {"processedAt": None}, sort=[("_id", 1)]
+            )
+            stats["oldest_pending_age_seconds"] = (
+                (datetime.utcnow() - oldest["createdAt"]).total_seconds()
+                if oldest
+                else 0.0
+            )
+        return stats
+
+
+aggregation_worker = AggregationWorker()
@@ -0,0 +1,407 @@
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from core.cache import building_cache, cache_bus
+from core.config import settings
+from db.mongodb import db
+from fastapi import HTTPException
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import logging
+import re
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_END = "\uffff"
+# Entries pack (row << 9 | offset); words starting further in are not indexed.
+_OFFSET_BITS = 9
+_OFFSET_MASK = (1 << _OFFSET_BITS) - 1
+# Queries shorter than this are only matched exactly; from the second length
+# on, two edits are tolerated instead of one.
+FUZZY_MIN_LENGTH = 4
+FUZZY_LONG_LENGTH = 8
+TIERS = ("name", "name", "address")
+PROJECTION = {
+    "GID": 1,
+    "buildingName": 1,
+    "address": 1,
+    "category": 1,
+    "latitude": 1,
+    "longitude": 1,
+}
+
+
+def normalize(text: str) -> str:
+    """Lowercase ASCII words separated by single spaces, accents dropped."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    ascii_text = decomposed.encode("ascii", "ignore").decode("ascii").lower()
+    return _NON_ALNUM.sub(" ", ascii_text).strip()
+
+
+def _word_starts(text: str) -> List[int]:
+    starts = [0] if text else []
+    starts.extend(i + 1 for i, char in enumerate(text) if char == " ")
+    return [start for start in starts if start <= _OFFSET_MASK]
+
+
+def _next_row(rows: List[List[int]], path: str, char: str, query: str) -> List[int]:
+    # One more row of the optimal string alignment (restricted Damerau-
+    # Levenshtein) distance between query and the path extended by char.
+    previous = rows[-1]
+    before = rows[-2] if path else previous
+    last = path[-1] if path else ""
+    left = previous[0] + 1
+    row = [left]
+    for j, expected in enumerate(query, 1):
+        cost = previous[j - 1] + (expected != char)
+        if previous[j] < cost:
+            cost = previous[j] + 1
+        if left < cost:
+            cost = left + 1
+        if last == expected and j > 1 and query[j - 2] == char:
+            cost = min(cost, before[j - 2] + 1)
+        row.append(cost)
+        left = cost
+    return row
+
+
+class BuildingAutocompleteIndex:
+    """In-memory prefix index over building names and addresses.
+
+    Every word of a normalized name or address starts an entry whose key is
+    the rest of the text from that word on, so "main lib" finds "Main
+    Library" and "lib" finds it too. Entries are kept in three sorted
+    ``array("Q")`` tables (whole names, later name words, address words) and
+    searched with bisect; a query is answered from the tables in that order,
+    alphabetically within each, and only falls back to typo-tolerant matching
+    when fewer than ``k`` buildings match exactly.
+    """
+
+    def __init__(self):
+        self.gids: List[str] = []
+        self.gid_rows: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.addresses: List[str] = []
+        self.display: List[Optional[Dict[str, Any]]] = []
+        self.tables = [array("Q"), array("Q"), array("Q")]
+        self.keys: List[Callable[[int], str]] = [
+            self._name_suffix,
+            self._name_suffix,
+            self._address_suffix,
+        ]
+
+    def __len__(self) -> int:
+        return len(self.gid_rows)
+
+    def _name_suffix(self, entry: int) -> str:
+        return self.names[entry >> _OFFSET_BITS][entry & _OFFSET_MASK :]
+
+    def _address_suffix(self, entry: int) -> str:
+        return self.addresses[entry >> _OFFSET_BITS][entry & _OFFSET_MASK :]
+
+    def _entries(self, row: int) -> List[List[int]]:
+        base = row << _OFFSET_BITS
+        name_starts = _word_starts(self.names[row])
+        return [
+            [base | start for start in name_starts[:1]],
+            [base | start for start in name_starts[1:]],
+            [base | start for start in _word_starts(self.addresses[row])],
+        ]
+
+    def _set_row(self, building: Dict[str, Any]) -> Tuple[int, bool]:
+        """Stores a building's texts; returns its row and whether the
+        normalized texts changed (or the row is new)."""
+        name = normalize(building.get("buildingName", ""))
+        address = normalize(building.get("address", ""))
+        display = {field: building.get(field) for field in PROJECTION}
+        row = self.gid_rows.get(building["GID"])
+        if row is None:
+            row = self.gid_rows[building["GID"]] = len(self.gids)
+            self.gids.append(building["GID"])
+            self.names.append(name)
+            self.addresses.append(address)
+            self.display.append(display)
+            return row, True
+        self.display[row] = display
+        if self.names[row] == name and self.addresses[row] == address:
+            return row, False
+        self._unlink(row)
+        self.names[row] = name
+        self.addresses[row] = address
+        return row, True
+
+    def _unlink(self, row: int) -> None:
+        for table, key, entries in zip(self.tables, self.keys, self._entries(row)):
+            for entry in entries:
+                suffix = key(entry)
+                lo = bisect_left(table, suffix, key=key)
+                hi = bisect_right(table, suffix, lo=lo, key=key)
+                del table[table.index(entry, lo, hi)]
+
+    @classmethod
+    def build(cls, buildings: Iterable[Dict[str, Any]]) -> "BuildingAutocompleteIndex":
+        index = cls()
+        for building in buildings:
+            if building.get("GID"):
+                index._set_row(building)
+        pending: List[List[int]] = [[], [], []]
+        for row in range(len(index.gids)):
+            for entries, new in zip(pending, index._entries(row)):
+                entries.extend(new)
+        for i, entries in enumerate(pending):
+            entries.sort(key=index.keys[i])
+            index.tables[i] = array("Q", entries)
+        return index
+
+    def replace(self, building: Dict[str, Any]) -> None:
+        """Adds or re-indexes one building document."""
+        row, changed = self._set_row(building)
+        if not changed:
+            return
+        for table, key, entries in zip(self.tables, self.keys, self._entries(row)):
+            for entry in entries:
+                insort(table, entry, key=key)
+
+    def remove(self, GID: str) -> None:
+        row = self.gid_rows.pop(GID, None)
+        if row is None:
+            return
+        self._unlink(row)
+        # The row stays allocated, with nothing pointing at it.
+        self.names[row] = self.addresses[row] = ""
+        self.display[row] = None
+
+    def _fuzzy_ranges(
+        self, tier: int, query: str, max_distance: int
+    ) -> List[Tuple[int, int, str]]:
+        """``(distance, lo, prefix)`` for every key prefix within
+        ``max_distance`` edits of query; the table range starting at ``lo``
+        holds the keys with that prefix.
+
+        Only keys sharing the query's first letter are considered, as
+        autocomplete typos rarely fall there. They are walked as an implicit
+        trie: rows of the distance matrix are shared with the previous key's
+        common prefix, and a subtree is skipped with one bisect once no
+        extension of it can match.
+        """
+        table, key = self.tables[tier], self.keys[tier]
+        i = bisect_left(table, query[0], key=key)
+        end = bisect_left(table, query[0] + _END, lo=i, key=key)
+        ranges = []
+        rows = [list(range(len(query) + 1))]
+        rows.append(_next_row(rows, "", query[0], query))
+        path = query[0]
+        while i < end:
+            text = key(table[i])
+            common = 1
+            limit = min(len(path), len(text))
+            while common < limit and path[common] == text[common]:
+                common += 1
+            del rows[common + 1 :]
+            path = text[:common]
+            # Past every copy of this key unless a prefix of it is pruned.
+            skip_to = None
+            while len(path) < len(text):
+                rows.append(_next_row(rows, path, text[len(path)], query))
+                path += text[len(path)]
+                row = rows[-1]
+                if row[-1] <= max_distance:
+                    ranges.append((row[-1], i, path))
+                if min(row) > max_distance:
+                    skip_to = bisect_left(table, path + _END, i, end, key=key)
+                    break
+            if skip_to is None:
+                skip_to = bisect_right(table, text, i, end, key=key)
+            i = skip_to
+        return ranges
+
+    def search(self, query: str, k: int) -> List[Dict[str, Any]]:
+        """Up to ``k`` buildings whose name or address has a word run
+        starting with query, best matches first."""
+        query = normalize(query)
+        if not query:
+            return []
+        found: Dict[int, Tuple[str, int]] = {}
+
+        def collect(tier: int, lo: int, hi: int, distance: int) -> None:
+            table = self.tables[tier]
+            for position in range(lo, hi):
+                row = table[position] >> _OFFSET_BITS
+                if row not in found:
+                    found[row] = (TIERS[tier], distance)
+                    if len(found) >= k:
+                        return
+
+        for tier, (table, key) in enumerate(zip(self.tables, self.keys)):
+            lo = bisect_left(table, query, key=key)
+            hi = bisect_left(table, query + _END, lo=lo, key=key)
+            collect(tier, lo, hi, 0)
+            if len(found) >= k:
+                break
+
+        if len(query) >= FUZZY_MIN_LENGTH:
+            # One edit first; the costlier two-edit walk only if still short.
+            limit = 2 if len(query) >= FUZZY_LONG_LENGTH else 1
+            for max_distance in range(1, limit + 1):
+                # Closer matches were all found by the previous pass, so
+                # ranges can be consumed tier by tier.
+                for tier, (table, key) in enumerate(zip(self.tables, self.keys)):
+                    if len(found) >= k:
+                        break
+                    ranges = self._fuzzy_ranges(tier, query, max_distance)
+                    for distance, lo, prefix in sorted(ranges):
+                        hi = bisect_left(table, prefix + _END, lo=lo, key=key)
+                        collect(tier, lo, hi, distance)
+                        if len(found) >= k:
+                            break
+
+        return [
+            {**self.display[row], "match": match, "distance": distance}
+            for row, (match, distance) in found.items()
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buildings": len(self.gid_rows),
+            "entries": sum(len(table) for table in self.tables),
+            "array_bytes": sum(
+                table.itemsize * len(table) for table in self.tables
+            ),
+        }
+
+
+class BuildingAutocompleteService:
+    """Keeps the process's ``BuildingAutocompleteIndex`` current and queries it.
+
+    The index is built from ``buildings`` on first use and rebuilt after
+    ``AUTOCOMPLETE_INDEX_TTL_SECONDS``. Building writes in this process are
+    applied to it directly; writes in other processes arrive as replayed
+    ``buildings`` cache invalidations, which mark their GIDs stale to be
+    re-read before the next query is answered.
+    """
+
+    index: Optional[BuildingAutocompleteIndex] = None
+    built_at = 0.0
+    stale: Set[str] = set()
+    queries = 0
+    query_seconds = 0.0
+    _lock: Optional[asyncio.Lock] = None
+
+    @staticmethod
+    def get_collection():
+        if db.db is None:
+            logger.error("Database not initialized")
+            raise HTTPException(status_code=500, detail="Database not initialized")
+        return db.db.buildings
+
+    @staticmethod
+    def index_building(building: Dict[str, Any]) -> None:
+        """Applies a building document just written by this process."""
+        index = BuildingAutocompleteService.index
+        if index is None or not building.get("GID"):
+            return
+        try:
+            index.replace(building)
+        except Exception as e:
+            # The write itself succeeded; a rebuild will pick the building up.
+            logger.error(f"Error indexing building {building['GID']}: {str(e)}")
+            BuildingAutocompleteService.stale.add(building["GID"])
+
+    @staticmethod
+    def unindex_building(GID: str) -> None:
+        """Drops a GID this process just renamed or deleted."""
+        index = BuildingAutocompleteService.index
+        if index is not None:
+            index.remove(GID)
+            BuildingAutocompleteService.stale.discard(GID)
+
+    @staticmethod
+    def mark_stale(GID: str) -> None:
+        if BuildingAutocompleteService.index is not None:
+            BuildingAutocompleteService.stale.add(GID)
+
+    @staticmethod
+    async def _build() -> BuildingAutocompleteIndex:
+        start = time.perf_counter()
+        buildings = (
+            await BuildingAutocompleteService.get_collection()
+            .find({}, PROJECTION)
+            .to_list(None)
+        )
+        index = BuildingAutocompleteIndex.build(buildings)
+        BuildingAutocompleteService.built_at = time.monotonic()
+        logger.info(
+            f"Built building autocomplete index of {len(index)} buildings in "
+            f"{time.perf_counter() - start:.1f}s"
+        )
+        return index
+
+    @staticmethod
+    async def _sync() -> None:
+        cls = BuildingAutocompleteService
+        await cache_bus.sync()
+        if not cls.stale:
+            return
+        gids, cls.stale = sorted(cls.stale), set()
+        buildings = (
+            await cls.get_collection()
+            .find({"GID": {"$in": gids}}, PROJECTION)
+            .to_list(None)
+        )
+        for building in buildings:
+            cls.index.replace(building)
+        for GID in set(gids) - {building["GID"] for building in buildings}:
+            cls.index.remove(GID)
+
+    @staticmethod
+    async def load() -> BuildingAutocompleteIndex:
+        cls = BuildingAutocompleteService
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+        async with cls._lock:
+            expired = (
+                time.monotonic() - cls.built_at
+                >= settings.AUTOCOMPLETE_INDEX_TTL_SECONDS
+            )
+            if cls.index is None or expired:
+                cls.stale = set()
+                cls.index = await cls._build()
+            else:
+                await cls._sync()
+            return cls.index
+
+    @staticmethod
+    async def search(query: str, k: int) -> List[Dict[str, Any]]:
+        try:
+            index = await BuildingAutocompleteService.load()
+            start = time.perf_counter()
+            results = index.search(query, k)
+            BuildingAutocompleteService.query_seconds += time.perf_counter() - start
+            BuildingAutocompleteService.queries += 1
+            return results
+        except Exception as e:
+            logger.error(f"Error autocompleting buildings: {str(e)}")
+            raise
+
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        cls = BuildingAutocompleteService
+        stats: Dict[str, Any] = cls.index.stats() if cls.index else {"buildings": 0}
+        stats.update(
+            {
+                "loaded": cls.index is not None,
+                "stale_gids": len(cls.stale),
+                "queries": cls.queries,
+                "average_query_ms": (
+                    round(cls.query_seconds / cls.queries * 1000, 3)
+                    if cls.queries
+                    else None
+                ),
+            }
+        )
+        return stats
+
+
+cache_bus.subscribe(building_cache, BuildingAutocompleteService.mark_stale)
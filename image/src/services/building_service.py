@@ -7,7 +7,13 @@ from models.building_model import (
     BuildingResponse,
     BuildingUpdate,
 )
+from core.cache import MISSING, building_cache, cache_bus
+from services.building_autocomplete_service import BuildingAutocompleteService
+from db.writes import compare_and_swap, insert_returning, update_returning
+from pymongo import ReturnDocument
+from typing import List, Set
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
@@ -39,18 +45,71 @@ class BuildingService:
     async def get_building_by_GID(GID: str):
         try:
             # #logger.debug(f"Fetching building by GID: {GID}")
+            await cache_bus.sync()
+            cached = building_cache.get(GID)
+            if cached is not MISSING:
+                # Callers may modify what they get; the cached copy is shared.
+                return cached.model_copy(deep=True)
             collection = BuildingService.get_collection()
             building = await collection.find_one({"GID": GID})
             if building:
                 # #logger.debug(f"Building found: {building}")
                 building["_id"] = str(building["_id"])  # Convert ObjectId to string
-                return BuildingResponse.model_validate(building)
+                response = BuildingResponse.model_validate(building)
+                building_cache.set(GID, response.model_copy(deep=True))
+                return response
             # #logger.debug("Building not found")
             return None
         except Exception as e:
             logger.error(f"Error fetching building by GID: {str(e)}")
             raise
 
+    @staticmethod
+    async def get_buildings_by_GIDs(GIDs: List[str]) -> List[BuildingResponse]:
+        """Returns the buildings found for GIDs, in the given order, fetching
+        every cache miss with a single query."""
+        try:
+            await cache_bus.sync()
+            found = {}
+            missing = []
+            for GID in GIDs:
+                cached = building_cache.get(GID)
+                if cached is MISSING:
+                    missing.append(GID)
+                else:
+                    found[GID] = cached.model_copy(deep=True)
+            if missing:
+                collection = BuildingService.get_collection()
+                buildings = await collection.find({"GID": {"$in": missing}}).to_list(
+                    None
+                )
+                for building in buildings:
+                    building["_id"] = str(building["_id"])
+                    response = BuildingResponse.model_validate(building)
+                    building_cache.set(building["GID"], response.model_copy(deep=True))
+                    found[building["GID"]] = response
+            return [found[GID] for GID in GIDs if GID in found]
+        except Exception as e:
+            logger.error(f"Error fetching buildings by GIDs: {str(e)}")
+            raise
+
+    @staticmethod
+    async def get_GIDs_in_categories(categories: List[str]) -> Set[str]:
+        """GIDs of buildings whose category contains any of categories,
+        ignoring case."""
+        if not categories:
+            return set()
+        try:
+            collection = BuildingService.get_collection()
+            pattern = "|".join(re.escape(category) for category in categories)
+            buildings = await collection.find(
+                {"category": {"$regex": pattern, "$options": "i"}}, {"GID": 1}
+            ).to_list(None)
+            return {building["GID"] for building in buildings}
+        except Exception as e:
+            logger.error(f"Error fetching building GIDs by category: {str(e)}")
+            raise
+
     @staticmethod
     async def get_buildings():
         GID = "66e60e28dafccfa65d64ac7e"
@@ -84,8 +143,10 @@ class BuildingService:
             # #logger.debug(f"Creating building: {building}")
             collection = BuildingService.get_collection()
             building_dict = building.model_dump()
-            result = await collection.insert_one(building_dict)
-            created_building = await collection.find_one({"_id": result.inserted_id})
+            building_dict["version"] = 0
+            created_building = await insert_returning(collection, building_dict)
+            await cache_bus.publish(building_cache, building_dict["GID"])
+            BuildingAutocompleteService.index_building(created_building)
             # #logger.debug(f"Created building: {created_building}")
             return BuildingResponse.model_validate(created_building)
         except Exception as e:
@@ -98,15 +159,46 @@ class BuildingService:
             # #logger.debug(f"Update building: {building}")
             collection = BuildingService.get_collection()
             building_dict = building.model_dump()
-            update_result = await collection.update_one(
-                {"_id": ObjectId(building_dict["id"])}, {"$set": building_dict}
-            )
-            if update_result.modified_count == 0:
+            expected_version = building_dict.pop("version")
+            query = {"_id": ObjectId(building_dict["id"])}
+            # The previous GID comes back in the same round trip: a building
+            # whose GID changed is cached and indexed under both.
+            if expected_version is None:
+                previous = await update_returning(
+                    collection,
+                    query,
+                    {"$set": building_dict, "$inc": {"version": 1}},
+                    return_document=ReturnDocument.BEFORE,
+                )
+            else:
+                previous = await compare_and_swap(
+                    collection,
+                    query,
+                    expected_version,
+                    {"$set": building_dict},
+                    return_document=ReturnDocument.BEFORE,
+                )
+            if previous is None:
+                if expected_version is not None and await collection.find_one(
+                    query, {"_id": 1}
+                ):
+                    raise HTTPException(
+                        status_code=409,
+                        detail="Building was modified by another request; "
+                        "reload it and retry.",
+                    )
                 logger.error("No building was updated.")
                 raise HTTPException(status_code=404, detail="Building not found.")
-            updated_building = await collection.find_one(
-                {"_id": ObjectId(building_dict["id"])}
-            )
+            updated_building = {
+                **previous,
+                **building_dict,
+                "version": (previous.get("version") or 0) + 1,
+            }
+            gids = {building_dict["GID"], previous.get("GID")} - {None}
+            await cache_bus.publish_many(building_cache, sorted(gids))
+            for GID in gids - {building_dict["GID"]}:
+                BuildingAutocompleteService.unindex_building(GID)
+            BuildingAutocompleteService.index_building(updated_building)
             # #logger.debug(f"Update building: {updated_building}")
             return BuildingResponse.model_validate(updated_building)
         except Exception as e:
@@ -0,0 +1,141 @@
+from db.mongodb import db
+from fastapi import HTTPException
+from models.aggregation_model import ACCESSIBILITY_CATEGORIES
+from services.aggregation_service import AggregationService
+from core.single_flight import single_flight
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BuildingSummaryService:
+    """Stored building summaries in ``building_summaries``.
+
+    Summaries are pre-generated by ``jobs.pregenerate_summaries`` so serving
+    one is a single read. Each records the aggregation's ``texts_updated_at``
+    it was generated from, which tells the job whether it is stale.
+    """
+
+    # LLM generations still running after their request was answered.
+    _upgrades: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def get_collection():
+        if db.db is None:
+            logger.error("Database not initialized")
+            raise HTTPException(status_code=500, detail="Database not initialized")
+        return db.db.building_summaries
+
+    @staticmethod
+    async def get_summary(GID: str) -> Optional[Dict[str, Any]]:
+        return await BuildingSummaryService.get_collection().find_one({"GID": GID})
+
+    @staticmethod
+    async def get_summaries(gids: List[str]) -> Dict[str, Dict[str, Any]]:
+        summaries = await (
+            BuildingSummaryService.get_collection()
+            .find({"GID": {"$in": gids}}, {"summary": 0})
+            .to_list(None)
+        )
+        return {summary["GID"]: summary for summary in summaries}
+
+    @staticmethod
+    async def generate(GID: str) -> Dict[str, Any]:
+        """Summarizes a building and stores the result unless a category failed.
+
+        Returns ``{"summary", "failures"}``.
+        """
+        source = await AggregationService.get_collection().find_one(
+            {"GID": GID}, {"texts_updated_at": 1}
+        )
+        if not source:
+            raise HTTPException(
+                status_code=404, detail=f"Aggregation not found for GID: {GID}"
+            )
+        failures: List[str] = []
+        summary = await AggregationService.summarize_building(GID, failures)
+        if not failures:
+            # Recorded as read before summarizing, so texts written meanwhile
+            # still mark the stored summary as stale.
+            await BuildingSummaryService.get_collection().update_one(
+                {"GID": GID},
+                {
+                    "$set": {
+                        "summary": summary,
+                        "texts_updated_at": source.get("texts_updated_at"),
+                        "generatedAt": datetime.utcnow(),
+                    }
+                },
+                upsert=True,
+            )
+        return {"summary": summary, "failures": failures}
+
+    @staticmethod
+    def _finish_upgrade(task: asyncio.Task) -> None:
+        BuildingSummaryService._upgrades.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Background summary generation failed: {task.exception()}")
+
+    @staticmethod
+    def _detach(task: asyncio.Task) -> None:
+        BuildingSummaryService._upgrades.add(task)
+        task.add_done_callback(BuildingSummaryService._finish_upgrade)
+
+    @staticmethod
+    async def summarize(
+        GID: str, budget_seconds: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Returns the stored summary, or generates one.
+
+        With ``budget_seconds`` the LLM summary is only waited for that long;
+        past it the local extractive summary is returned and generation
+        carries on in the background, storing the LLM summary for the next
+        request. ``source`` says which one was served and
+        ``extractive_categories`` which categories used the local summary.
+        """
+        stored = await BuildingSummaryService.get_summary(GID)
+        if stored:
+            return {
+                "summary": stored["summary"],
+                "source": "stored",
+                "extractive_categories": [],
+            }
+
+        start = time.perf_counter()
+        # Concurrent requests for one GID share a single generation.
+        generation = asyncio.ensure_future(
+            single_flight.do(
+                "summarize_building",
+                GID,
+                lambda: BuildingSummaryService.generate(GID),
+            )
+        )
+        if budget_seconds is not None:
+            try:
+                extractive = await AggregationService.summarize_building(
+                    GID, extractive_only=True
+                )
+            except Exception:
+                BuildingSummaryService._detach(generation)
+                raise
+            remaining = budget_seconds - (time.perf_counter() - start)
+            try:
+                await asyncio.wait_for(asyncio.shield(generation), max(remaining, 0))
+            except asyncio.TimeoutError:
+                BuildingSummaryService._detach(generation)
+                return {
+                    "summary": extractive,
+                    "source": "extractive",
+                    "extractive_categories": list(ACCESSIBILITY_CATEGORIES),
+                }
+
+        generated = await generation
+        return {
+            "summary": generated["summary"],
+            "source": "llm",
+            "extractive_categories": generated["failures"],
+        }
@@ -0,0 +1,85 @@
+from core.config import settings
+from typing import Dict, List, Set
+import numpy as np
+import re
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD = re.compile(r"[a-z0-9']+")
+STOPWORDS = frozenset(
+    """a an and are as at be but by for from had has have i in is it its of on
+    or our so that the their there they this to was we were with you my me very
+    just not no""".split()
+)
+DAMPING = 0.85
+MAX_ITERATIONS = 50
+TOLERANCE = 1e-4
+
+
+def split_sentences(texts: List[str]) -> List[str]:
+    """Sentences of the most recent texts, oldest first, without repeats."""
+    sentences: List[str] = []
+    seen: Set[str] = set()
+    for text in reversed(texts):
+        for sentence in reversed(_SENTENCE_END.split(text.strip())):
+            sentence = sentence.strip()
+            key = " ".join(_WORD.findall(sentence.lower()))
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            sentences.append(sentence)
+            if len(sentences) >= settings.EXTRACTIVE_MAX_INPUT_SENTENCES:
+                return sentences[::-1]
+    return sentences[::-1]
+
+
+def textrank(sentences: List[str]) -> np.ndarray:
+    """TextRank scores: PageRank over sentences linked by shared words,
+    weighted by overlap / (log |a| + log |b|) as in Mihalcea & Tarau."""
+    words = [
+        {word for word in _WORD.findall(s.lower()) if word not in STOPWORDS}
+        for s in sentences
+    ]
+    vocabulary: Dict[str, int] = {}
+    columns = [
+        [vocabulary.setdefault(word, len(vocabulary)) for word in sentence_words]
+        for sentence_words in words
+    ]
+    incidence = np.zeros((len(sentences), len(vocabulary)))
+    for row, sentence_columns in enumerate(columns):
+        incidence[row, sentence_columns] = 1
+
+    overlap = incidence @ incidence.T
+    np.fill_diagonal(overlap, 0)
+    sizes = np.log(incidence.sum(axis=1) + 1)
+    norm = sizes[:, None] + sizes[None, :]
+    weights = np.divide(overlap, norm, out=np.zeros_like(overlap), where=norm > 0)
+    out_weight = weights.sum(axis=1)
+    # Column-normalized: each sentence splits its score among its neighbours.
+    transition = np.divide(
+        weights, out_weight[None, :], out=np.zeros_like(weights), where=out_weight > 0
+    )
+
+    scores = np.ones(len(sentences))
+    for _ in range(MAX_ITERATIONS):
+        updated = (1 - DAMPING) + DAMPING * transition @ scores
+        converged = np.abs(updated - scores).max() < TOLERANCE
+        scores = updated
+        if converged:
+            break
+    return scores
+
+
+def extractive_summary(texts: List[str], max_sentences: int = 0) -> str:
+    """The highest-ranked review sentences, in their original order.
+
+    Runs locally in milliseconds, for when an LLM summary is unavailable or
+    too slow.
+    """
+    max_sentences = max_sentences or settings.EXTRACTIVE_SUMMARY_SENTENCES
+    sentences = split_sentences([text for text in texts if text])
+    if len(sentences) <= max_sentences:
+        return " ".join(sentences)
+    scores = textrank(sentences)
+    # Later (more recent) sentences win ties.
+    ranked = sorted(range(len(sentences)), key=lambda i: (scores[i], i), reverse=True)
+    return " ".join(sentences[i] for i in sorted(ranked[:max_sentences]))
@@ -0,0 +1,127 @@
+from core.config import settings
+from core.tokens import estimate_tokens
+from typing import Any, Dict, List, Tuple
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def render_detailed_summary_prompt(
+    user_input: Any, activities: Any, disabilities: Any, buildings: Any
+) -> str:
+    return f"""
+    Create a detailed, user-friendly summary of the following plan:
+
+    User Input: {user_input}
+    Suggested Activities: {activities}
+    User Disabilities: {disabilities}
+    Accessible Buildings: {buildings}
+
+    Please include:
+    1. A brief introduction based on the user's input.
+    2. Details of the suggested activities and why they were chosen.
+    3. Information about the accessible buildings, including their names and how they cater to the user's needs.
+    4. Any other relevant details that would be helpful for the user.
+
+    Format the summary in a clear, easy-to-read manner, using appropriate line breaks and sections.
+    """
+
+
+class PlanPromptService:
+    """Builds compact LLM prompts for activity plans.
+
+    Buildings are reduced to the fields that matter for the user's needs,
+    deduplicated by GID and capped at ``PLAN_PROMPT_MAX_BUILDINGS``, instead
+    of interpolating whole ``BuildingResponse`` objects into the prompt.
+    """
+
+    @staticmethod
+    def compact_building(building: Any, categories: List[str]) -> Dict[str, Any]:
+        compact = {
+            "name": building.buildingName,
+            "category": building.category,
+            "address": building.address,
+        }
+        max_chars = settings.PLAN_PROMPT_TEXT_CHARS
+        for category in categories:
+            rating = getattr(building, f"{category}_rating", None)
+            if rating is None:
+                continue
+            features = getattr(building, f"{category}_dict", None) or {}
+            text = getattr(building, f"{category}_text_aggregate", "") or ""
+            entry: Dict[str, Any] = {
+                "rating": rating,
+                "reviews": getattr(building, f"{category}_count", 0),
+            }
+            available = [
+                key.replace("_", " ")
+                for key, value in features.items()
+                if str(value).lower() == "true"
+            ]
+            if available:
+                entry["features"] = available
+            if text:
+                entry["notes"] = (
+                    text if len(text) <= max_chars else text[:max_chars] + "..."
+                )
+            compact[category.replace("_", " ")] = entry
+        return compact
+
+    @staticmethod
+    def compact_buildings(
+        buildings: List[Any], categories: List[str], limit: int
+    ) -> List[Dict[str, Any]]:
+        compacted = []
+        seen = set()
+        for building in buildings:
+            if building.GID in seen:
+                continue
+            seen.add(building.GID)
+            compacted.append(PlanPromptService.compact_building(building, categories))
+            if len(compacted) >= limit:
+                break
+        return compacted
+
+    @staticmethod
+    def detailed_summary_prompt(plan: Dict[str, Any]) -> Tuple[str, Dict[str, int]]:
+        """Returns the detailed summary prompt and its token accounting."""
+        categories = [
+            f"{disability}_accessibility" for disability in plan["user_disabilities"]
+        ]
+        buildings = PlanPromptService.compact_buildings(
+            plan["accessible_buildings"],
+            categories,
+            settings.PLAN_PROMPT_MAX_BUILDINGS,
+        )
+        activities = [
+            {"category": activity["category"], "why": activity.get("explanation")}
+            for activity in plan["suggested_activities"]
+        ]
+        prompt = render_detailed_summary_prompt(
+            plan["user_input"],
+            json.dumps(activities, separators=(",", ":"), default=str),
+            json.dumps(
+                plan["user_disabilities"], separators=(",", ":"), default=str
+            ),
+            json.dumps(buildings, separators=(",", ":"), default=str),
+        )
+
+        # The same template with the whole plan interpolated, as it used to be.
+        full_tokens = estimate_tokens(
+            render_detailed_summary_prompt(
+                plan["user_input"],
+                plan["suggested_activities"],
+                plan["user_disabilities"],
+                plan["accessible_buildings"],
+            )
+        )
+        prompt_tokens = estimate_tokens(prompt)
+        stats = {
+            "prompt_tokens": prompt_tokens,
+            "full_prompt_tokens": full_tokens,
+            "tokens_saved": max(full_tokens - prompt_tokens, 0),
+            "buildings_received": len(plan["accessible_buildings"]),
+            "buildings_sent": len(buildings),
+        }
+        return prompt, stats
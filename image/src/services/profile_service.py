@@ -2,6 +2,9 @@ from bson import ObjectId
 from db.mongodb import db
 from fastapi import HTTPException
 from models.profile_model import ProfileModel, ProfileCreate, ProfileResponse
+from core.cache import cache_bus, profile_needs_cache
+from db.writes import insert_returning
+from pymongo import ReturnDocument
 import logging
 from bson.errors import InvalidId
 
@@ -37,8 +40,8 @@ class ProfileService:
             # #logger.debug(f"Creating profile: {profile}")
             collection = ProfileService.get_collection()
             profile_dict = profile.model_dump()
-            result = await collection.insert_one(profile_dict)
-            created_profile = await collection.find_one({"_id": result.inserted_id})
+            created_profile = await insert_returning(collection, profile_dict)
+            await cache_bus.publish(profile_needs_cache, profile_dict["email"])
             # #logger.debug(f"Created profile: {created_profile}")
             return ProfileResponse.model_validate(created_profile)
         except Exception as e:
@@ -51,15 +54,19 @@ class ProfileService:
             # #logger.debug(f"Update profile: {profile}")
             collection = ProfileService.get_collection()
             profile_dict = profile.model_dump()
-            update_result = await collection.update_one(
-                {"_id": ObjectId(profile_dict["id"])}, {"$set": profile_dict}
+            # The previous email comes back in the same round trip: a profile
+            # whose email changed is cached under both.
+            previous = await collection.find_one_and_update(
+                {"_id": ObjectId(profile_dict["id"])},
+                {"$set": profile_dict},
+                return_document=ReturnDocument.BEFORE,
             )
-            if update_result.modified_count == 0:
+            if previous is None:
                 logger.error("No profile was updated.")
                 raise HTTPException(status_code=404, detail="Profile not found.")
-            updated_profile = await collection.find_one(
-                {"_id": ObjectId(profile_dict["id"])}
-            )
+            updated_profile = {**previous, **profile_dict}
+            emails = {profile_dict["email"], previous.get("email")} - {None}
+            await cache_bus.publish_many(profile_needs_cache, sorted(emails))
             # #logger.debug(f"Update profile: {updated_profile}")
             return ProfileResponse.model_validate(updated_profile)
         except Exception as e:
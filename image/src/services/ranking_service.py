@@ -0,0 +1,87 @@
+from core.config import settings
+from core.decay import effective_weight
+from models.aggregation_model import ACCESSIBILITY_CATEGORIES
+from services.accessibility_index import AccessibilityIndex, CATEGORY_BITS
+from typing import Any, Dict, List, Optional, Sequence
+import heapq
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class RankingService:
+    @staticmethod
+    def confidence_adjusted_scores(
+        index: AccessibilityIndex, categories: Sequence[str], decayed: bool = False
+    ) -> np.ndarray:
+        """Bayesian average of the requested categories as a 0-100 score.
+
+        Every building's ratings are blended with ``RANKING_PRIOR_WEIGHT``
+        pseudo-reviews at the catalog-wide mean, so a single 5-star review
+        does not outrank hundreds of slightly lower ones.
+
+        With ``decayed`` the time-decayed ratings are used, and old reviews
+        also count for less against the prior.
+        """
+        categories = categories or ACCESSIBILITY_CATEGORIES
+        columns = [ACCESSIBILITY_CATEGORIES.index(c) for c in categories]
+        if decayed:
+            sums = effective_weight(index.decayed_sums[:, columns])
+            counts = effective_weight(index.decayed_weights[:, columns])
+        else:
+            sums = index.rating_sums[:, columns]
+            counts = index.rating_counts[:, columns]
+
+        catalog_counts = counts.sum(axis=0)
+        prior_mean = np.divide(
+            sums.sum(axis=0),
+            catalog_counts,
+            out=np.full(len(columns), settings.RANKING_PRIOR_MEAN, dtype=float),
+            where=catalog_counts > 0,
+        )
+        prior_weight = settings.RANKING_PRIOR_WEIGHT
+        adjusted = (prior_weight * prior_mean + sums) / (prior_weight + counts)
+        return adjusted.mean(axis=1) / 5 * 100
+
+    @staticmethod
+    def top_k(
+        scores: np.ndarray, rows: Sequence[int], k: Optional[int]
+    ) -> List[int]:
+        if k is None or k >= len(rows):
+            return sorted(rows, key=lambda row: scores[row], reverse=True)
+        return heapq.nlargest(k, rows, key=scores.__getitem__)
+
+    @staticmethod
+    async def rank_buildings(
+        categories: List[str], k: Optional[int] = None, decayed: bool = False
+    ) -> List[Dict[str, Any]]:
+        index = await AccessibilityIndex.load()
+        if not len(index):
+            return []
+
+        unknown = [c for c in categories if c not in CATEGORY_BITS]
+        if unknown:
+            logger.warning(f"Unknown categories requested for ranking: {unknown}")
+            return []
+        categories = categories or ACCESSIBILITY_CATEGORIES
+
+        scores = RankingService.confidence_adjusted_scores(
+            index, categories, decayed
+        )
+        columns = [ACCESSIBILITY_CATEGORIES.index(c) for c in categories]
+        # Buildings nobody has rated for these needs carry no signal at all.
+        candidates = np.flatnonzero(index.rating_counts[:, columns].sum(axis=1) > 0)
+
+        ranked = RankingService.top_k(scores, candidates.tolist(), k)
+        return [
+            {
+                "GID": index.gids[row],
+                "score": round(float(scores[row]), 2),
+                "review_counts": {
+                    category: int(index.rating_counts[row, column])
+                    for category, column in zip(categories, columns)
+                },
+            }
+            for row in ranked
+        ]
@@ -0,0 +1,341 @@
+from core.cache import MISSING, cache_bus, duplicate_index_cache
+from core.config import settings
+from db.mongodb import db
+from fastapi import HTTPException
+from models.aggregation_model import ACCESSIBILITY_CATEGORIES
+from pymongo import ReplaceOne, UpdateOne
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import hashlib
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Changing any of these invalidates every stored signature; rebuild them with
+# jobs.rebuild_duplicate_index.
+PERMUTATIONS = 128
+BANDS = 32
+ROWS = PERMUTATIONS // BANDS
+SHINGLE_WORDS = 3
+_PRIME = (1 << 31) - 1
+_permutations = np.random.RandomState(20240101)
+_A = _permutations.randint(1, _PRIME, size=PERMUTATIONS).astype(np.uint64)
+_B = _permutations.randint(0, _PRIME, size=PERMUTATIONS).astype(np.uint64)
+_WORD = re.compile(r"\w+")
+
+
+def review_text(review: Dict[str, Any]) -> str:
+    parts = [review.get(f"{category}_text") for category in ACCESSIBILITY_CATEGORIES]
+    parts.append(review.get("comment"))
+    return " ".join(part.strip() for part in parts if part and part.strip())
+
+
+def minhash_signature(text: str) -> Optional[np.ndarray]:
+    """MinHash of the text's word 3-shingles, or None if it has no words.
+
+    Shingle hashes are reduced below 2^31 so ``a * x + b`` never overflows
+    64 bits.
+    """
+    words = _WORD.findall(text.lower())
+    if not words:
+        return None
+    shingles = {
+        " ".join(words[i : i + SHINGLE_WORDS])
+        for i in range(max(1, len(words) - SHINGLE_WORDS + 1))
+    }
+    hashes = np.array(
+        [
+            int.from_bytes(
+                hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(),
+                "little",
+            )
+            % _PRIME
+            for shingle in shingles
+        ],
+        dtype=np.uint64,
+    )
+    permuted = (_A[:, None] * hashes[None, :] + _B[:, None]) % np.uint64(_PRIME)
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def duplicate_of_update(review: Dict[str, Any]) -> Dict[str, Any]:
+    """Update writing a flagged review document's ``duplicate_of``."""
+    if review.get("duplicate_of"):
+        return {"$set": {"duplicate_of": review["duplicate_of"]}}
+    return {"$unset": {"duplicate_of": ""}}
+
+
+def is_counted(review) -> bool:
+    """Whether a review contributes to ratings, tallies and texts."""
+    return not (settings.SKIP_DUPLICATE_REVIEWS and review.duplicate_of)
+
+
+class DuplicateIndex:
+    """In-memory MinHash LSH index over one GID's review signatures.
+
+    Each signature is split into ``BANDS`` bands of ``ROWS`` values; reviews
+    sharing any band are candidates, and candidates are confirmed by the
+    fraction of equal signature values, which estimates Jaccard similarity.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, np.ndarray, Optional[str]]]):
+        self.signatures: Dict[str, np.ndarray] = {}
+        self.duplicate_of: Dict[str, Optional[str]] = {}
+        self.buckets: Dict[Tuple[int, bytes], List[str]] = defaultdict(list)
+        for review_id, signature, duplicate_of in entries:
+            self.add(review_id, signature, duplicate_of)
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    @staticmethod
+    def _bands(signature: np.ndarray):
+        for band in range(BANDS):
+            yield band, signature[band * ROWS : (band + 1) * ROWS].tobytes()
+
+    def add(
+        self, review_id: str, signature: np.ndarray, duplicate_of: Optional[str]
+    ) -> None:
+        if review_id in self.signatures:
+            return
+        self.signatures[review_id] = signature
+        self.duplicate_of[review_id] = duplicate_of
+        for key in self._bands(signature):
+            self.buckets[key].append(review_id)
+
+    def query(
+        self, signature: np.ndarray, exclude: Optional[str] = None
+    ) -> Optional[Tuple[str, float]]:
+        """Returns the most similar indexed review at or above the threshold,
+        resolved to the original it duplicates, with its similarity."""
+        candidates = {
+            review_id
+            for key in self._bands(signature)
+            for review_id in self.buckets.get(key, ())
+            if review_id != exclude
+        }
+        best, best_similarity = None, 0.0
+        for review_id in candidates:
+            similarity = float(np.mean(self.signatures[review_id] == signature))
+            if similarity > best_similarity:
+                best, best_similarity = review_id, similarity
+        if best is None or best_similarity < settings.DUPLICATE_SIMILARITY_THRESHOLD:
+            return None
+        return self.duplicate_of[best] or best, best_similarity
+
+
+class ReviewDuplicateService:
+    """Flags near-duplicate reviews of the same building as they are written.
+
+    Signatures are persisted in ``review_signatures`` as
+    ``{_id: review _id, GID, signature, duplicate_of}``. A GID's index is
+    loaded from them on first use and kept in ``duplicate_index_cache`` until
+    a write to that GID invalidates it, so a check is in-memory once the GID
+    is loaded. Only stored signatures are indexed, so a review can only be
+    flagged as a copy of one that was written.
+    """
+
+    stats: Dict[str, float] = {
+        "checks": 0,
+        "duplicates": 0,
+        "index_loads": 0,
+        "check_seconds": 0.0,
+    }
+
+    @staticmethod
+    def get_collection():
+        if db.db is None:
+            logger.error("Database not initialized")
+            raise HTTPException(status_code=500, detail="Database not initialized")
+        return db.db.review_signatures
+
+    @staticmethod
+    async def load_index(GID: str) -> DuplicateIndex:
+        await cache_bus.sync()
+        index = duplicate_index_cache.get(GID)
+        if index is MISSING:
+            entries = await ReviewDuplicateService.get_collection().find(
+                {"GID": GID}
+            ).to_list(None)
+            index = DuplicateIndex(
+                (
+                    str(entry["_id"]),
+                    np.frombuffer(entry["signature"], dtype=np.uint32),
+                    entry.get("duplicate_of"),
+                )
+                for entry in entries
+            )
+            duplicate_index_cache.set(GID, index)
+            ReviewDuplicateService.stats["index_loads"] += 1
+        return index
+
+    @staticmethod
+    async def flag(
+        review: Dict[str, Any], pending: Optional[Dict[str, DuplicateIndex]] = None
+    ) -> Optional[np.ndarray]:
+        """Sets or clears ``duplicate_of`` on a review document about to be
+        written and returns its signature for ``record``.
+
+        The document needs its ``_id``. The cached index only learns the
+        signature once ``record`` stores it, so a failed write leaves nothing
+        behind; reviews written together share ``pending``, which holds the
+        signatures flagged so far in their batch, so copies within it are
+        caught too.
+        """
+        review.pop("duplicate_of", None)
+        GID = review.get("GID")
+        if not GID:
+            return None
+        index = await ReviewDuplicateService.load_index(GID)
+        # Timed without the index load, which is one query per GID.
+        start = time.perf_counter()
+        review_id = str(review["_id"])
+        signature = minhash_signature(review_text(review))
+        match = None
+        if signature is not None:
+            match = index.query(signature, exclude=review_id)
+            if pending is not None:
+                batch = pending.setdefault(GID, DuplicateIndex(()))
+                batch_match = batch.query(signature, exclude=review_id)
+                if batch_match and (match is None or batch_match[1] > match[1]):
+                    match = batch_match
+                batch.add(review_id, signature, match[0] if match else None)
+        stats = ReviewDuplicateService.stats
+        stats["check_seconds"] += time.perf_counter() - start
+        stats["checks"] += 1
+        if match is not None:
+            stats["duplicates"] += 1
+            review["duplicate_of"] = match[0]
+            logger.info(f"Review {review_id} duplicates {match[0]} ({match[1]:.2f})")
+        return signature
+
+    @staticmethod
+    async def flag_batch(reviews: List[Dict[str, Any]]) -> List[Optional[np.ndarray]]:
+        """``flag`` for reviews written together, in order. Detection is best
+        effort: a review whose check fails is left unflagged."""
+        pending: Dict[str, DuplicateIndex] = {}
+        signatures = []
+        for review in reviews:
+            try:
+                signatures.append(await ReviewDuplicateService.flag(review, pending))
+            except Exception as e:
+                logger.error(f"Error checking review for duplicates: {str(e)}")
+                signatures.append(None)
+        return signatures
+
+    @staticmethod
+    async def reflag_written(
+        reviews: List[Dict[str, Any]]
+    ) -> Tuple[List[Optional[np.ndarray]], List[UpdateOne]]:
+        """Flags the written reviews of a batch in which other writes failed
+        again, as some may have been flagged as copies of a failed one.
+
+        Returns their signatures and the updates correcting ``duplicate_of``
+        on the stored documents that changed.
+        """
+        before = [review.get("duplicate_of") for review in reviews]
+        signatures = await ReviewDuplicateService.flag_batch(reviews)
+        fixes = [
+            UpdateOne({"_id": review["_id"]}, duplicate_of_update(review))
+            for review, previous in zip(reviews, before)
+            if review.get("duplicate_of") != previous
+        ]
+        return signatures, fixes
+
+    @staticmethod
+    async def reflag_dependents(
+        GID: str, dependents: List[Dict[str, Any]]
+    ) -> List[Tuple[Dict[str, Any], Optional[np.ndarray]]]:
+        """Checks again, in write order, reviews flagged as copies of a review
+        that was deleted or edited, setting or clearing their
+        ``duplicate_of``. The earliest that matches nothing else becomes the
+        original of the copies that still match it.
+
+        Their signatures are stored; returns them paired with the reviews.
+        """
+        dependent_ids = [review["_id"] for review in dependents]
+        entries = await ReviewDuplicateService.get_collection().find(
+            {"GID": GID, "_id": {"$nin": dependent_ids}}
+        ).to_list(None)
+        index = DuplicateIndex(
+            (
+                str(entry["_id"]),
+                np.frombuffer(entry["signature"], dtype=np.uint32),
+                entry.get("duplicate_of"),
+            )
+            for entry in entries
+        )
+        recorded = []
+        for review in sorted(dependents, key=lambda review: review["_id"]):
+            review.pop("duplicate_of", None)
+            review_id = str(review["_id"])
+            signature = minhash_signature(review_text(review))
+            if signature is None:
+                continue
+            match = index.query(signature, exclude=review_id)
+            index.add(review_id, signature, match[0] if match else None)
+            if match is not None:
+                review["duplicate_of"] = match[0]
+            recorded.append((review, signature))
+        await ReviewDuplicateService.record(recorded)
+        return recorded
+
+    @staticmethod
+    async def record(
+        reviews: List[Tuple[Dict[str, Any], Optional[np.ndarray]]]
+    ) -> None:
+        """Stores the signatures of written reviews; the GIDs' indexes are
+        reloaded with them on their next check, in every process."""
+        reviews = [
+            (review, signature)
+            for review, signature in reviews
+            if signature is not None and review.get("GID")
+        ]
+        if not reviews:
+            return
+        try:
+            collection = ReviewDuplicateService.get_collection()
+            await collection.bulk_write(
+                [
+                    ReplaceOne(
+                        {"_id": review["_id"]},
+                        {
+                            "_id": review["_id"],
+                            "GID": review["GID"],
+                            "signature": signature.tobytes(),
+                            "duplicate_of": review.get("duplicate_of"),
+                        },
+                        upsert=True,
+                    )
+                    for review, signature in reviews
+                ],
+                ordered=False,
+            )
+        except Exception as e:
+            logger.error(f"Error storing review signatures: {str(e)}")
+            raise
+        gids = sorted({review["GID"] for review, _ in reviews})
+        await cache_bus.publish_many(duplicate_index_cache, gids)
+
+    @staticmethod
+    async def forget(review_id: Any, GID: Optional[str]) -> None:
+        await ReviewDuplicateService.get_collection().delete_one({"_id": review_id})
+        if GID:
+            await cache_bus.publish(duplicate_index_cache, GID)
+
+    @staticmethod
+    def metrics() -> Dict[str, Any]:
+        stats = ReviewDuplicateService.stats
+        return {
+            "checks": stats["checks"],
+            "duplicates": stats["duplicates"],
+            "index_loads": stats["index_loads"],
+            "average_check_us": (
+                round(stats["check_seconds"] / stats["checks"] * 1e6, 1)
+                if stats["checks"]
+                else None
+            ),
+        }
@@ -0,0 +1,306 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from db.mongodb import db
+from fastapi import HTTPException
+from models.review_model import ReviewCreate, ReviewModel
+from services.aggregation_delta import fold_reviews
+from app_logic.review_bulding_bridge import ReviewBuildingBridge
+from services.aggregation_service import AggregationService
+from services.review_duplicate_service import ReviewDuplicateService
+from core.config import settings
+from pymongo.errors import BulkWriteError
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+import asyncio
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class ReviewQueueService:
+    """Write-behind review submission.
+
+    ``submit`` validates the review and stores it in ``review_queue`` under
+    the ID the review will keep in ``reviews``, which is all the client waits
+    for. ``ReviewQueueWorker`` later moves queued reviews into ``reviews`` in
+    batches and folds them into the aggregations and building ratings.
+    """
+
+    @staticmethod
+    def get_collection():
+        if db.db is None:
+            logger.error("Database not initialized")
+            raise HTTPException(status_code=500, detail="Database not initialized")
+        return db.db.review_queue
+
+    @staticmethod
+    async def submit(review: ReviewCreate) -> str:
+        review_id = ObjectId()
+        await ReviewQueueService.get_collection().insert_one(
+            {
+                "_id": review_id,
+                "review": review.model_dump(exclude_none=True),
+                "status": "pending",
+                "submittedAt": datetime.utcnow(),
+            }
+        )
+        return str(review_id)
+
+    @staticmethod
+    async def get_status(review_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            entry = await ReviewQueueService.get_collection().find_one(
+                {"_id": ObjectId(review_id)}, {"review": 0}
+            )
+        except InvalidId:
+            raise HTTPException(status_code=400, detail="Invalid review ID format")
+        if not entry:
+            return None
+        return {
+            "review_id": review_id,
+            "status": entry["status"],
+            "error": entry.get("error"),
+            "submitted_at": entry["submittedAt"].isoformat(),
+            "processed_at": (
+                entry["processedAt"].isoformat() if entry.get("processedAt") else None
+            ),
+        }
+
+
+class ReviewQueueWorker:
+    def __init__(self):
+        self.processed = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_lag_seconds: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _claim_batch(self):
+        # Claiming with a per-batch token lets several workers drain the queue
+        # without writing the same review twice.
+        # Batches left in "processing" by a crashed worker are claimed again.
+        collection = ReviewQueueService.get_collection()
+        stale_before = datetime.utcnow() - timedelta(
+            seconds=settings.REVIEW_QUEUE_CLAIM_TIMEOUT_SECONDS
+        )
+        claimable = {
+            "$or": [
+                {"status": "pending"},
+                {"status": "processing", "claimedAt": {"$lt": stale_before}},
+            ]
+        }
+        pending = (
+            await collection.find(claimable, {"_id": 1})
+            .sort("_id", 1)
+            .to_list(settings.REVIEW_QUEUE_BATCH_SIZE)
+        )
+        if not pending:
+            return []
+        token = uuid.uuid4().hex
+        await collection.update_many(
+            {"_id": {"$in": [entry["_id"] for entry in pending]}, **claimable},
+            {
+                "$set": {
+                    "status": "processing",
+                    "claimToken": token,
+                    "claimedAt": datetime.utcnow(),
+                }
+            },
+        )
+        return await collection.find({"claimToken": token}).to_list(None)
+
+    async def drain_once(self) -> int:
+        entries = await self._claim_batch()
+        if not entries:
+            self.last_lag_seconds = 0.0
+            return 0
+
+        now = datetime.utcnow()
+        self.last_lag_seconds = (now - entries[0]["submittedAt"]).total_seconds()
+        documents = [{**entry["review"], "_id": entry["_id"]} for entry in entries]
+        signatures = await ReviewDuplicateService.flag_batch(documents)
+
+        versions = await AggregationService.rebuild_versions(
+            document.get("GID") for document in documents
+        )
+        written = set(range(len(documents)))
+        stored_before = set()
+        failures: Dict[Any, str] = {}
+        try:
+            await AggregationService.get_reviews_collection().insert_many(
+                documents, ordered=False
+            )
+        except BulkWriteError as e:
+            for write_error in e.details.get("writeErrors", []):
+                if write_error.get("code") == DUPLICATE_KEY_ERROR:
+                    # An earlier attempt stored it; it may or may not have got
+                    # as far as the aggregation.
+                    stored_before.add(write_error["index"])
+                    continue
+                written.discard(write_error["index"])
+                review_id = documents[write_error["index"]]["_id"]
+                failures[review_id] = write_error.get("errmsg", "Write error")
+        if failures:
+            await self._reflag(documents, signatures, written)
+
+        try:
+            await ReviewDuplicateService.record(
+                [(documents[i], signatures[i]) for i in sorted(written)]
+            )
+        except Exception as e:
+            logger.error(f"Error recording review signatures: {str(e)}")
+        await self._apply_aggregations(
+            entries, documents, written, stored_before, versions
+        )
+        unbridged = await self._apply_buildings(entries, documents, written)
+
+        collection = ReviewQueueService.get_collection()
+        retried = []
+        attempts = settings.REVIEW_QUEUE_BRIDGE_ATTEMPTS
+        for entry in entries:
+            if entry["_id"] not in unbridged:
+                continue
+            if entry.get("bridgeAttempts", 0) + 1 < attempts:
+                retried.append(entry["_id"])
+            else:
+                failures[entry["_id"]] = "Building ratings could not be updated"
+        if retried:
+            # Stored and aggregated already; the next drain only retries the
+            # building update.
+            await collection.update_many(
+                {"_id": {"$in": retried}},
+                {"$set": {"status": "pending"}, "$inc": {"bridgeAttempts": 1}},
+            )
+        done = [
+            entry["_id"]
+            for entry in entries
+            if entry["_id"] not in failures and entry["_id"] not in retried
+        ]
+        if done:
+            await collection.update_many(
+                {"_id": {"$in": done}},
+                {"$set": {"status": "done", "processedAt": datetime.utcnow()}},
+            )
+        for review_id, error in failures.items():
+            await collection.update_one(
+                {"_id": review_id},
+                {
+                    "$set": {
+                        "status": "failed",
+                        "error": error,
+                        "processedAt": datetime.utcnow(),
+                    }
+                },
+            )
+
+        self.batches += 1
+        self.processed += len(done)
+        self.failed += len(failures)
+        return len(entries)
+
+    async def _reflag(self, documents, signatures, written):
+        # Reviews flagged as copies of one that failed to write would point
+        # at a review that does not exist.
+        kept = sorted(written)
+        try:
+            reflagged, fixes = await ReviewDuplicateService.reflag_written(
+                [documents[i] for i in kept]
+            )
+            if fixes:
+                await AggregationService.get_reviews_collection().bulk_write(
+                    fixes, ordered=False
+                )
+        except Exception as e:
+            logger.error(f"Error re-checking reviews for duplicates: {str(e)}")
+            return
+        for i, signature in zip(kept, reflagged):
+            signatures[i] = signature
+
+    async def _apply_aggregations(
+        self, entries, documents, written, stored_before, versions
+    ):
+        # appliedAt records that an entry's delta landed. A re-claimed entry
+        # that was stored but never marked may have been applied just before
+        # a crash, so its GID is rebuilt from the reviews instead of having
+        # the delta applied a second time.
+        pending = [i for i in sorted(written) if not entries[i].get("appliedAt")]
+        uncertain = {i for i in pending if i in stored_before}
+        reviews = [
+            ReviewModel.model_validate(documents[i])
+            for i in pending
+            if i not in uncertain
+        ]
+        await AggregationService.apply_deltas(fold_reviews(reviews).values(), versions)
+        for GID in sorted({documents[i].get("GID") for i in uncertain} - {None}):
+            await AggregationService.update_aggregation(GID)
+        if pending:
+            await ReviewQueueService.get_collection().update_many(
+                {"_id": {"$in": [entries[i]["_id"] for i in pending]}},
+                {"$set": {"appliedAt": datetime.utcnow()}},
+            )
+
+    async def _apply_buildings(self, entries, documents, written):
+        # Building ratings are running sums with no rebuild, so each entry is
+        # marked as soon as its building is updated and is never applied
+        # twice. An entry whose update failed stays unmarked and is applied
+        # on a later drain.
+        collection = ReviewQueueService.get_collection()
+        unbridged = []
+        for i in sorted(written):
+            if entries[i].get("bridgedAt"):
+                continue
+            try:
+                await ReviewBuildingBridge.apply_review(
+                    ReviewModel.model_validate(documents[i])
+                )
+            except Exception as e:
+                logger.error(f"Error updating building after review: {str(e)}")
+                unbridged.append(entries[i]["_id"])
+                continue
+            await collection.update_one(
+                {"_id": entries[i]["_id"]},
+                {"$set": {"bridgedAt": datetime.utcnow()}},
+            )
+        return unbridged
+
+    async def run(self) -> None:
+        logger.info("Review queue worker started")
+        while True:
+            try:
+                handled = await self.drain_once()
+            except Exception as e:
+                logger.error(f"Review queue worker error: {str(e)}", exc_info=True)
+                handled = 0
+            if handled < settings.REVIEW_QUEUE_BATCH_SIZE:
+                await asyncio.sleep(settings.REVIEW_QUEUE_POLL_SECONDS)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def stats(self) -> Dict[str, Any]:
+        collection = ReviewQueueService.get_collection()
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "queue_depth": await collection.count_documents({"status": "pending"}),
+            "processing": await collection.count_documents({"status": "processing"}),
+            "processed": self.processed,
+            "failed": self.failed,
+            "batches": self.batches,
+            "last_lag_seconds": self.last_lag_seconds,
+        }
+
+
+review_queue_worker = ReviewQueueWorker()
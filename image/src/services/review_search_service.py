@@ -0,0 +1,323 @@
+from array import array
+from core.config import settings
+from db.mongodb import db
+from fastapi import HTTPException
+from models.aggregation_model import ACCESSIBILITY_CATEGORIES
+from services.accessibility_index import AccessibilityIndex
+from services.review_text_service import ReviewTextService
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import logging
+import numpy as np
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    """a an and are as at be but by can do for from had has have how i in is it
+    its of on or our so that the their there they this to was we were what when
+    where which who with you my me very just any some""".split()
+)
+_SUFFIXES = ("ings", "ing", "edly", "ed", "ies", "es", "ly", "s")
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def _stem(word: str) -> str:
+    # Crude suffix stripping, enough for "studying" to meet "study".
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[: -len(suffix)]
+            return word + "y" if suffix == "ies" else word
+    return word
+
+
+def features(text: str) -> Dict[int, int]:
+    """Hashed counts of a text's stemmed words and adjacent word pairs."""
+    words = [
+        _stem(word) for word in _WORD.findall(text.lower()) if word not in STOPWORDS
+    ]
+    terms = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    counts: Dict[int, int] = {}
+    # hash() is salted per process, which is fine for an in-process index.
+    buckets = settings.SEARCH_HASH_BUCKETS
+    for term in terms:
+        bucket = hash(term) % buckets
+        counts[bucket] = counts.get(bucket, 0) + 1
+    return counts
+
+
+class ReviewSearchIndex:
+    """Hashed sparse-vector index over review texts, scored with BM25.
+
+    Every ``{GID, category, review_id, text}`` entry is a document. Terms are
+    hashed into ``SEARCH_HASH_BUCKETS`` dimensions, so memory is bounded by
+    the number of postings rather than the vocabulary, and postings are kept
+    in typed arrays (6 bytes each) so 100k+ reviews fit in a few tens of MB.
+    Replacing a GID tombstones its documents; the index is compacted once
+    half of it is dead.
+    """
+
+    def __init__(self):
+        self.gids: List[str] = []
+        self.gid_rows: Dict[str, int] = {}
+        self.gid_docs: Dict[int, List[int]] = {}
+        self.doc_gid = array("I")
+        self.doc_category = array("B")
+        self.doc_length = array("I")
+        self.alive = bytearray()
+        self.postings: Dict[int, Tuple[array, array]] = {}
+        self.live_docs = 0
+        self.live_length = 0
+
+    def __len__(self) -> int:
+        return self.live_docs
+
+    def _gid_row(self, GID: str) -> int:
+        row = self.gid_rows.get(GID)
+        if row is None:
+            row = self.gid_rows[GID] = len(self.gids)
+            self.gids.append(GID)
+        return row
+
+    def remove_gid(self, GID: str) -> None:
+        row = self.gid_rows.get(GID)
+        for doc in self.gid_docs.pop(row, []) if row is not None else []:
+            if self.alive[doc]:
+                self.alive[doc] = 0
+                self.live_docs -= 1
+                self.live_length -= self.doc_length[doc]
+
+    def add(self, GID: str, category: str, text: str) -> None:
+        counts = features(text)
+        if not counts:
+            return
+        doc = len(self.doc_gid)
+        row = self._gid_row(GID)
+        self.doc_gid.append(row)
+        self.doc_category.append(ACCESSIBILITY_CATEGORIES.index(category))
+        length = sum(counts.values())
+        self.doc_length.append(length)
+        self.alive.append(1)
+        self.gid_docs.setdefault(row, []).append(doc)
+        self.live_docs += 1
+        self.live_length += length
+        for bucket, count in counts.items():
+            posting = self.postings.get(bucket)
+            if posting is None:
+                posting = self.postings[bucket] = (array("I"), array("H"))
+            posting[0].append(doc)
+            posting[1].append(min(count, 65535))
+
+    def replace_gid(self, GID: str, entries: Iterable[Tuple[str, str]]) -> None:
+        """Replaces a GID's documents with ``(category, text)`` entries."""
+        self.remove_gid(GID)
+        for category, text in entries:
+            self.add(GID, category, text)
+
+    def needs_compaction(self) -> bool:
+        return len(self.doc_gid) > 1000 and self.live_docs < len(self.doc_gid) / 2
+
+    def search(self, query: str, k: int) -> List[Dict[str, Any]]:
+        """Top ``k`` GIDs by the BM25 score of their best matching text."""
+        counts = features(query)
+        if not counts or not self.live_docs:
+            return []
+        size = len(self.doc_gid)
+        lengths = np.frombuffer(self.doc_length, dtype=np.uint32).astype(np.float32)
+        alive = np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+        average = self.live_length / self.live_docs
+        norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / average)
+
+        scores = np.zeros(size, dtype=np.float32)
+        for bucket in counts:
+            posting = self.postings.get(bucket)
+            if posting is None:
+                continue
+            docs = np.frombuffer(posting[0], dtype=np.uint32)
+            tf = np.frombuffer(posting[1], dtype=np.uint16).astype(np.float32)
+            df = len(docs)
+            idf = np.log(1 + (size - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + norms[docs])
+
+        matched = np.flatnonzero((scores > 0) & alive)
+        if not len(matched):
+            return []
+        doc_gid = np.frombuffer(self.doc_gid, dtype=np.uint32)
+        best = np.zeros(len(self.gids), dtype=np.float32)
+        np.maximum.at(best, doc_gid[matched], scores[matched])
+        candidates = np.flatnonzero(best)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-best[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-best[candidates], kind="stable")]
+
+        results = []
+        for row in candidates.tolist():
+            # The category of the GID's best matching text, for display.
+            docs = self.gid_docs[row]
+            doc = docs[int(np.argmax(scores[docs]))]
+            results.append(
+                {
+                    "GID": self.gids[row],
+                    "score": round(float(best[row]), 4),
+                    "category": ACCESSIBILITY_CATEGORIES[self.doc_category[doc]],
+                }
+            )
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        postings = sum(len(docs) for docs, _ in self.postings.values())
+        arrays = (
+            self.doc_gid.itemsize * len(self.doc_gid)
+            + self.doc_category.itemsize * len(self.doc_category)
+            + self.doc_length.itemsize * len(self.doc_length)
+            + len(self.alive)
+            + postings * 6
+        )
+        return {
+            "documents": self.live_docs,
+            "tombstoned": len(self.doc_gid) - self.live_docs,
+            "gids": len(self.gid_rows),
+            "terms": len(self.postings),
+            "postings": postings,
+            "array_bytes": arrays,
+        }
+
+
+class ReviewSearchService:
+    """Keeps the process's ``ReviewSearchIndex`` current and queries it.
+
+    The index is built from ``review_text_buckets`` on first search. Review
+    deltas and rebuilds mark their GIDs stale in this process, and writes in
+    other processes are found through ``texts_updated_at`` on the
+    aggregations, at most once per ``SEARCH_SYNC_INTERVAL_SECONDS``; stale GIDs
+    are re-read from their buckets before the next query is answered.
+    """
+
+    index: Optional[ReviewSearchIndex] = None
+    stale: Set[str] = set()
+    watermark: Optional[datetime] = None
+    last_sync = 0.0
+    queries = 0
+    query_seconds = 0.0
+    _lock: Optional[asyncio.Lock] = None
+
+    @staticmethod
+    def get_collection():
+        if db.db is None:
+            logger.error("Database not initialized")
+            raise HTTPException(status_code=500, detail="Database not initialized")
+        return db.db.review_text_buckets
+
+    @staticmethod
+    def mark_stale(gids: Iterable[str]) -> None:
+        if ReviewSearchService.index is not None:
+            ReviewSearchService.stale.update(gids)
+
+    @staticmethod
+    async def _read_entries(
+        query: Dict[str, Any]
+    ) -> Dict[str, List[Tuple[str, str]]]:
+        buckets = (
+            await ReviewSearchService.get_collection()
+            .find(query, {"GID": 1, "category": 1, "generation": 1, "texts.text": 1})
+            .sort("_id", 1)
+            .to_list(None)
+        )
+        # Only the generation each aggregation points at is live; others are
+        # a rebuild in progress or one not yet cleaned up.
+        generations = await ReviewTextService.current_generations(
+            sorted({bucket["GID"] for bucket in buckets})
+        )
+        entries: Dict[str, List[Tuple[str, str]]] = {}
+        for bucket in buckets:
+            if bucket.get("generation") != generations.get(bucket["GID"]):
+                continue
+            entries.setdefault(bucket["GID"], []).extend(
+                (bucket["category"], entry["text"]) for entry in bucket["texts"]
+            )
+        return entries
+
+    @staticmethod
+    async def _build() -> ReviewSearchIndex:
+        start = time.perf_counter()
+        # Taken before reading so writes made during the build are re-synced.
+        watermark = datetime.utcnow()
+        index = ReviewSearchIndex()
+        for GID, entries in (await ReviewSearchService._read_entries({})).items():
+            index.replace_gid(GID, entries)
+        ReviewSearchService.watermark = watermark
+        ReviewSearchService.last_sync = time.monotonic()
+        logger.info(
+            f"Built review search index of {len(index)} texts in "
+            f"{time.perf_counter() - start:.1f}s"
+        )
+        return index
+
+    @staticmethod
+    async def _sync() -> None:
+        cls = ReviewSearchService
+        now = time.monotonic()
+        if now - cls.last_sync >= settings.SEARCH_SYNC_INTERVAL_SECONDS:
+            cls.last_sync = now
+            # Overlap the previous sync so clock skew between servers cannot
+            # hide a write; re-indexing a GID twice is harmless.
+            overlap = timedelta(seconds=settings.SEARCH_SYNC_OVERLAP_SECONDS)
+            since = cls.watermark - overlap
+            cls.watermark = datetime.utcnow()
+            changed = await (
+                AccessibilityIndex.get_collection()
+                .find({"texts_updated_at": {"$gte": since}}, {"GID": 1})
+                .to_list(None)
+            )
+            cls.stale.update(aggregation["GID"] for aggregation in changed)
+        if not cls.stale:
+            return
+        gids, cls.stale = sorted(cls.stale), set()
+        entries = await cls._read_entries({"GID": {"$in": gids}})
+        for GID in gids:
+            cls.index.replace_gid(GID, entries.get(GID, []))
+
+    @staticmethod
+    async def load() -> ReviewSearchIndex:
+        cls = ReviewSearchService
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+        # One coroutine builds or syncs while concurrent searches wait for it.
+        async with cls._lock:
+            if cls.index is None or cls.index.needs_compaction():
+                cls.stale = set()
+                cls.index = await cls._build()
+            else:
+                await cls._sync()
+            return cls.index
+
+    @staticmethod
+    async def search(query: str, k: int) -> List[Dict[str, Any]]:
+        index = await ReviewSearchService.load()
+        start = time.perf_counter()
+        results = index.search(query, k)
+        ReviewSearchService.query_seconds += time.perf_counter() - start
+        ReviewSearchService.queries += 1
+        return results
+
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        cls = ReviewSearchService
+        stats: Dict[str, Any] = cls.index.stats() if cls.index else {"documents": 0}
+        stats.update(
+            {
+                "loaded": cls.index is not None,
+                "stale_gids": len(cls.stale),
+                "queries": cls.queries,
+                "average_query_ms": (
+                    round(cls.query_seconds / cls.queries * 1000, 3)
+                    if cls.queries
+                    else None
+                ),
+            }
+        )
+        return stats
@@ -1,8 +1,24 @@
 from bson import ObjectId
+from bson.errors import InvalidId
 from db.mongodb import db
 from fastapi import HTTPException
 from models.review_model import ReviewModel, ReviewCreate, ReviewResponse
+from services.aggregation_delta import fold_reviews
+from services.aggregation_service import AggregationService
+from app_logic.review_bulding_bridge import ReviewBuildingBridge
+from services.aggregation_worker import AggregationWorker
+from services.review_duplicate_service import (
+    ReviewDuplicateService,
+    duplicate_of_update,
+)
+from core.config import settings
+from pydantic import ValidationError
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+from db.writes import insert_returning
+from typing import Any, Dict, List, Optional, Tuple
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -35,16 +51,297 @@ class ReviewService:
 
             # #logger.debug("Converting review to dict")
             review_dict = review.model_dump(exclude_none=True)
+            review_dict["_id"] = ObjectId()
+            signature = await ReviewService._flag_duplicate(review_dict)
             # #logger.debug(f"Review dict: {review_dict}")
+            versions = await AggregationService.rebuild_versions([review.GID])
+            deferred = AggregationWorker.defers(review.GID)
+            if deferred:
+                review_dict["pending_aggregation"] = versions[review.GID]
 
             # #logger.debug("Inserting review into database")
-            result = await collection.insert_one(review_dict)
-            # #logger.debug(f"Insert result: {result.inserted_id}")
-
-            created_review = await collection.find_one({"_id": result.inserted_id})
+            created_review = await insert_returning(collection, review_dict)
             # #logger.debug(f"Created review: {created_review}")
 
+            await AggregationWorker.enqueue(review.GID, created_review["_id"])
+            await ReviewService._record_signatures([(created_review, signature)])
+            if deferred:
+                try:
+                    await ReviewBuildingBridge.apply_review(
+                        ReviewModel.model_validate(created_review)
+                    )
+                except Exception as e:
+                    # The review is stored; building ratings catch up on the
+                    # next one.
+                    logger.error(f"Error updating building after review: {str(e)}")
+            else:
+                # Added the way edits and deletes move it, so the aggregation
+                # and building ratings are current without waiting for a
+                # rebuild.
+                await ReviewService._apply_change(
+                    None, ReviewModel.model_validate(created_review), versions
+                )
+
             return ReviewResponse.model_validate(created_review)
         except Exception as e:
             logger.error(f"Error creating review: {str(e)}", exc_info=True)
             raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+    @staticmethod
+    async def _flag_duplicate(review_dict: Dict[str, Any]):
+        # Detection is best effort: a review is never rejected because of it.
+        try:
+            return await ReviewDuplicateService.flag(review_dict)
+        except Exception as e:
+            logger.error(f"Error checking review for duplicates: {str(e)}")
+            return None
+
+    @staticmethod
+    async def _record_signatures(reviews) -> None:
+        try:
+            await ReviewDuplicateService.record(reviews)
+        except Exception as e:
+            logger.error(f"Error recording review signatures: {str(e)}")
+
+    @staticmethod
+    def _object_id(review_id: str) -> ObjectId:
+        try:
+            return ObjectId(review_id)
+        except InvalidId:
+            raise HTTPException(status_code=400, detail="Invalid review ID format")
+
+    @staticmethod
+    async def _apply_change(
+        previous: Optional[ReviewModel],
+        current: Optional[ReviewModel],
+        versions: Dict[str, int],
+    ) -> None:
+        """Moves aggregation and building totals from ``previous`` to
+        ``current`` with a reversible delta instead of a rescan.
+
+        ``versions`` are the aggregations' rebuild versions read before the
+        review was written; see ``AggregationService.apply_deltas``.
+        """
+        await ReviewService._apply_changes([(previous, current)], versions)
+
+    @staticmethod
+    async def _apply_changes(
+        changes: List[Tuple[Optional[ReviewModel], Optional[ReviewModel]]],
+        versions: Dict[str, int],
+    ) -> None:
+        # A review the aggregation worker has not added yet may or may not be
+        # counted by a rebuild since, so its GID is rebuilt instead.
+        unsettled = {
+            previous.GID
+            for previous, _ in changes
+            if previous and previous.GID and previous.pending_aggregation is not None
+        }
+        deltas = fold_reviews(
+            [previous for previous, _ in changes if previous], sign=-1
+        )
+        fold_reviews([current for _, current in changes if current], deltas=deltas)
+        await AggregationService.apply_deltas(
+            [delta for GID, delta in deltas.items() if GID not in unsettled],
+            versions,
+        )
+        for GID in sorted(unsettled):
+            await AggregationService.update_aggregation(GID)
+        try:
+            for previous, current in changes:
+                if previous:
+                    await ReviewBuildingBridge.apply_review(previous, sign=-1)
+                if current:
+                    await ReviewBuildingBridge.apply_review(current)
+        except Exception as e:
+            logger.error(f"Error updating building after review change: {str(e)}")
+
+    @staticmethod
+    async def _reflag_dependents(review_id: ObjectId, GID: Optional[str]) -> None:
+        """Re-checks the reviews flagged as copies of a review that was just
+        deleted or edited; otherwise they would stay flagged against a review
+        that no longer exists or no longer matches, and be counted nowhere.
+        Totals follow the reviews whose flag changes."""
+        if not GID:
+            return
+        try:
+            collection = ReviewService.get_collection()
+            dependents = await collection.find(
+                {"GID": GID, "duplicate_of": str(review_id)}
+            ).to_list(None)
+            if not dependents:
+                return
+            versions = await AggregationService.rebuild_versions([GID])
+            previous = {
+                dependent["_id"]: ReviewModel.model_validate(dependent)
+                for dependent in dependents
+            }
+            await ReviewDuplicateService.reflag_dependents(GID, dependents)
+            changes = []
+            for dependent in dependents:
+                result = await collection.update_one(
+                    {"_id": dependent["_id"], "duplicate_of": str(review_id)},
+                    duplicate_of_update(dependent),
+                )
+                # A dependent edited or deleted meanwhile was handled there.
+                if result.modified_count:
+                    changes.append(
+                        (
+                            previous[dependent["_id"]],
+                            ReviewModel.model_validate(dependent),
+                        )
+                    )
+            await ReviewService._apply_changes(changes, versions)
+        except Exception as e:
+            logger.error(f"Error re-checking copies of review {review_id}: {str(e)}")
+
+    @staticmethod
+    async def update_review(review_id: str, review: ReviewCreate):
+        try:
+            object_id = ReviewService._object_id(review_id)
+            collection = ReviewService.get_collection()
+            stored = await collection.find_one({"_id": object_id}, {"GID": 1})
+            if stored is None:
+                raise HTTPException(status_code=404, detail="Review not found")
+            versions = await AggregationService.rebuild_versions(
+                [stored.get("GID"), review.GID]
+            )
+            review_dict = review.model_dump(exclude_none=True)
+            review_dict["_id"] = object_id
+            signature = await ReviewService._flag_duplicate(review_dict)
+            # The replaced document comes back in the same round trip, so
+            # concurrent edits each reverse exactly what they overwrote.
+            previous = await collection.find_one_and_replace(
+                {"_id": object_id},
+                review_dict,
+                return_document=ReturnDocument.BEFORE,
+            )
+            if previous is None:
+                raise HTTPException(status_code=404, detail="Review not found")
+            await ReviewService._apply_change(
+                ReviewModel.model_validate(previous),
+                ReviewModel.model_validate(review_dict),
+                versions,
+            )
+            await ReviewService._record_signatures([(review_dict, signature)])
+            await ReviewService._reflag_dependents(object_id, previous.get("GID"))
+            return ReviewResponse.model_validate(review_dict)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error updating review: {str(e)}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+    @staticmethod
+    async def delete_review(review_id: str) -> bool:
+        try:
+            object_id = ReviewService._object_id(review_id)
+            collection = ReviewService.get_collection()
+            stored = await collection.find_one({"_id": object_id}, {"GID": 1})
+            if stored is None:
+                return False
+            versions = await AggregationService.rebuild_versions([stored.get("GID")])
+            previous = await collection.find_one_and_delete({"_id": object_id})
+            if previous is None:
+                return False
+            await ReviewService._apply_change(
+                ReviewModel.model_validate(previous), None, versions
+            )
+            try:
+                await ReviewDuplicateService.forget(object_id, previous.get("GID"))
+            except Exception as e:
+                logger.error(f"Error removing review signature: {str(e)}")
+            await ReviewService._reflag_dependents(object_id, previous.get("GID"))
+            return True
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error deleting review: {str(e)}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+    @staticmethod
+    async def bulk_create_reviews(
+        rows: List[Dict[str, Any]], batch_size: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Validates and inserts reviews in batches, folding each batch into
+        one aggregation delta per GID applied with a single bulk_write, and
+        into building ratings with another."""
+        batch_size = batch_size or settings.REVIEW_INGEST_BATCH_SIZE
+        collection = ReviewService.get_collection()
+        start = time.perf_counter()
+        inserted_count = 0
+        errors = []
+
+        for batch_start in range(0, len(rows), batch_size):
+            batch = rows[batch_start : batch_start + batch_size]
+            documents = []
+            positions = []
+            for offset, row in enumerate(batch):
+                try:
+                    review = ReviewCreate.model_validate(row)
+                except ValidationError as e:
+                    errors.append({"row": batch_start + offset, "error": str(e)})
+                    continue
+                document = review.model_dump(exclude_none=True)
+                document["_id"] = ObjectId()
+                documents.append(document)
+                positions.append(batch_start + offset)
+            if not documents:
+                continue
+            signatures = await ReviewDuplicateService.flag_batch(documents)
+
+            versions = await AggregationService.rebuild_versions(
+                document.get("GID") for document in documents
+            )
+            inserted = set(range(len(documents)))
+            try:
+                await collection.insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                for write_error in e.details.get("writeErrors", []):
+                    inserted.discard(write_error["index"])
+                    errors.append(
+                        {
+                            "row": positions[write_error["index"]],
+                            "error": write_error.get("errmsg", "Write error"),
+                        }
+                    )
+                # Reviews flagged as copies of one that failed to insert would
+                # point at a review that does not exist.
+                kept = sorted(inserted)
+                try:
+                    reflagged, fixes = await ReviewDuplicateService.reflag_written(
+                        [documents[i] for i in kept]
+                    )
+                    if fixes:
+                        await collection.bulk_write(fixes, ordered=False)
+                    for i, signature in zip(kept, reflagged):
+                        signatures[i] = signature
+                except Exception as e:
+                    logger.error(f"Error re-checking reviews for duplicates: {str(e)}")
+
+            inserted_count += len(inserted)
+            await ReviewService._record_signatures(
+                [(documents[i], signatures[i]) for i in sorted(inserted)]
+            )
+            # Each document's _id is recorded next to its text in the review
+            # text buckets.
+            reviews = [
+                ReviewModel.model_validate(documents[i]) for i in sorted(inserted)
+            ]
+            deltas = fold_reviews(reviews)
+            await AggregationService.apply_deltas(deltas.values(), versions)
+            try:
+                await ReviewBuildingBridge.apply_reviews(reviews)
+            except Exception as e:
+                # The reviews are stored either way, as in create_review.
+                logger.error(f"Error updating buildings after reviews: {str(e)}")
+
+        elapsed = time.perf_counter() - start
+        errors.sort(key=lambda error: error["row"])
+        return {
+            "received": len(rows),
+            "inserted": inserted_count,
+            "failed": len(errors),
+            "errors": errors,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(len(rows) / elapsed, 1) if elapsed else None,
+        }
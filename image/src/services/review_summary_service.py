@@ -0,0 +1,195 @@
+from db.mongodb import db
+from fastapi import HTTPException
+from core.config import settings
+from core.tokens import pack_by_tokens
+from openai import RateLimitError
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import asyncio
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump when the prompts change so cached summaries are not reused.
+PROMPT_VERSION = 1
+
+SYSTEM_PROMPT = "You are a helpful assistant summarizing accessibility reviews."
+
+
+def chunk_prompt(category: str, texts: List[str]) -> str:
+    full_text = "\n".join(texts)
+    return f". Disregard all numeric fields, don't apply any formatting. Only provide a summary of the reviews that aims to provide readers a quick understanding of that accessibility field for the building. Summarize the following accessibility reviews for {category.replace('_', ' ')} in 1-2 sentences, highlighting key points and areas for improvement:\n\n{full_text}"
+
+
+def merge_prompt(category: str, summaries: List[str]) -> str:
+    partial = "\n\n".join(summaries)
+    return f"Don't apply any formatting. The following are summaries of consecutive batches of accessibility reviews for {category.replace('_', ' ')} at the same building. Combine them into one summary of 1-2 sentences that gives readers a quick understanding of that accessibility field, highlighting key points and areas for improvement:\n\n{partial}"
+
+
+def content_hash(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in (str(PROMPT_VERSION), settings.SUMMARY_MODEL, *parts):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ReviewSummaryService:
+    """Incremental map-reduce summarization of a category's review texts.
+
+    Texts are packed in order into chunks of ``SUMMARY_CHUNK_TOKENS`` and every
+    completion (chunk or merge) is cached in ``summary_chunks`` under a hash of
+    its model, prompt version and input, so identical work is never paid for
+    twice. Because packing is deterministic, every chunk but the last is
+    sealed once written; sealed chunks are folded into a rolling summary kept
+    in ``review_summaries``, and a new review only costs the open last chunk,
+    any newly sealed chunk and the merges on top of them.
+    """
+
+    # Process-wide LLM usage, reported by the batch summary job.
+    usage: Dict[str, Any] = {
+        "completions": 0,
+        "cache_hits": 0,
+        "rate_limited": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+    }
+
+    @staticmethod
+    def get_chunk_collection():
+        if db.db is None:
+            logger.error("Database not initialized")
+            raise HTTPException(status_code=500, detail="Database not initialized")
+        return db.db.summary_chunks
+
+    @staticmethod
+    def get_state_collection():
+        if db.db is None:
+            logger.error("Database not initialized")
+            raise HTTPException(status_code=500, detail="Database not initialized")
+        return db.db.review_summaries
+
+    @staticmethod
+    async def _complete(client, key: str, prompt: str) -> str:
+        collection = ReviewSummaryService.get_chunk_collection()
+        usage = ReviewSummaryService.usage
+        cached = await collection.find_one({"_id": key})
+        if cached:
+            usage["cache_hits"] += 1
+            return cached["summary"]
+
+        attempt = 0
+        while True:
+            try:
+                # The client is synchronous; a thread keeps the event loop
+                # serving other requests while the completion runs.
+                response = await asyncio.to_thread(
+                    client.chat.completions.create,
+                    model=settings.SUMMARY_MODEL,
+                    messages=[
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": prompt},
+                    ],
+                )
+                break
+            except RateLimitError:
+                usage["rate_limited"] += 1
+                if attempt >= settings.SUMMARY_MAX_RETRIES:
+                    raise
+                await asyncio.sleep(settings.SUMMARY_RETRY_BASE_SECONDS * 2**attempt)
+                attempt += 1
+
+        usage["completions"] += 1
+        if response.usage is not None:
+            usage["prompt_tokens"] += response.usage.prompt_tokens
+            usage["completion_tokens"] += response.usage.completion_tokens
+        summary = response.choices[0].message.content
+        await collection.update_one(
+            {"_id": key},
+            {"$set": {"summary": summary, "createdAt": datetime.utcnow()}},
+            upsert=True,
+        )
+        return summary
+
+    @staticmethod
+    async def summarize_chunk(client, category: str, texts: List[str]) -> str:
+        key = content_hash("chunk", category, *texts)
+        return await ReviewSummaryService._complete(
+            client, key, chunk_prompt(category, texts)
+        )
+
+    @staticmethod
+    async def merge(client, category: str, summaries: List[str]) -> str:
+        """Reduces summaries level by level until one remains."""
+        while len(summaries) > 1:
+            groups = pack_by_tokens(summaries, settings.SUMMARY_CHUNK_TOKENS)
+            if len(groups) == len(summaries):
+                # Each summary fills the budget alone; merge pairwise instead.
+                groups = [summaries[i : i + 2] for i in range(0, len(summaries), 2)]
+            merged = []
+            for group in groups:
+                if len(group) == 1:
+                    merged.append(group[0])
+                    continue
+                key = content_hash("merge", category, *group)
+                merged.append(
+                    await ReviewSummaryService._complete(
+                        client, key, merge_prompt(category, group)
+                    )
+                )
+            summaries = merged
+        return summaries[0]
+
+    @staticmethod
+    async def summarize(
+        client, GID: str, category: str, texts: List[str]
+    ) -> Optional[str]:
+        chunks = pack_by_tokens(texts, settings.SUMMARY_CHUNK_TOKENS)
+        if not chunks:
+            return None
+        sealed, tail = chunks[:-1], chunks[-1]
+        sealed_hashes = [content_hash("chunk", category, *chunk) for chunk in sealed]
+
+        collection = ReviewSummaryService.get_state_collection()
+        state = await collection.find_one({"GID": GID, "category": category})
+        rolling = None
+        done = 0
+        if state:
+            # The rolling summary is reusable while the chunks it covers are
+            # unchanged; edits or deletions earlier in the history rebuild it
+            # from the cached chunk summaries.
+            count = state["sealed_count"]
+            if count <= len(sealed) and state["sealed_digest"] == content_hash(
+                *sealed_hashes[:count]
+            ):
+                rolling = state["rolling_summary"]
+                done = count
+
+        if done < len(sealed):
+            new_summaries = [
+                await ReviewSummaryService.summarize_chunk(client, category, chunk)
+                for chunk in sealed[done:]
+            ]
+            rolling = await ReviewSummaryService.merge(
+                client, category, ([rolling] if rolling else []) + new_summaries
+            )
+            await collection.update_one(
+                {"GID": GID, "category": category},
+                {
+                    "$set": {
+                        "sealed_count": len(sealed),
+                        "sealed_digest": content_hash(*sealed_hashes),
+                        "rolling_summary": rolling,
+                        "updatedAt": datetime.utcnow(),
+                    }
+                },
+                upsert=True,
+            )
+
+        tail_summary = await ReviewSummaryService.summarize_chunk(
+            client, category, tail
+        )
+        return await ReviewSummaryService.merge(
+            client, category, ([rolling] if rolling else []) + [tail_summary]
+        )
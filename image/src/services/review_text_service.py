@@ -0,0 +1,157 @@
+from db.mongodb import db
+from fastapi import HTTPException
+from core.config import settings
+from pymongo import UpdateOne
+from typing import Any, Dict, List, Optional
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class ReviewTextService:
+    """Stores review texts in fixed-size buckets per GID and category.
+
+    Each ``review_text_buckets`` document holds up to
+    ``REVIEW_TEXT_BUCKET_SIZE`` entries of ``{review_id, text}``, so no
+    aggregation document grows with its review history and only readers that
+    need every text (summarization) pay for loading them. ``count`` counts
+    entries ever appended, so removing a text never reopens a full bucket and
+    texts stay in insertion order.
+
+    A full rebuild writes a new ``generation`` of buckets next to the live
+    one; it becomes live when the aggregation's ``text_generation`` is
+    swapped to it in the same compare-and-swap that stores the rebuilt
+    aggregation, and the old generation is dropped afterwards. Readers and
+    deltas only touch the generation the aggregation points at. Buckets
+    from before generations have none, which is also what an aggregation
+    that was never rebuilt points at.
+    """
+
+    @staticmethod
+    def get_collection():
+        if db.db is None:
+            logger.error("Database not initialized")
+            raise HTTPException(status_code=500, detail="Database not initialized")
+        return db.db.review_text_buckets
+
+    @staticmethod
+    def append_operations(
+        GID: str,
+        category: str,
+        entries: List[Dict[str, Any]],
+        generation: Optional[str] = None,
+    ) -> List[UpdateOne]:
+        # One upsert per entry: it lands in any bucket with room left, or
+        # starts a new bucket once they are all full.
+        return [
+            UpdateOne(
+                {
+                    "GID": GID,
+                    "category": category,
+                    "generation": generation,
+                    "count": {"$lt": settings.REVIEW_TEXT_BUCKET_SIZE},
+                },
+                {"$push": {"texts": entry}, "$inc": {"count": 1}},
+                upsert=True,
+            )
+            for entry in entries
+        ]
+
+    @staticmethod
+    def remove_operations(
+        GID: str,
+        category: str,
+        entries: List[Dict[str, Any]],
+        generation: Optional[str] = None,
+    ) -> List[UpdateOne]:
+        return [
+            UpdateOne(
+                {
+                    "GID": GID,
+                    "category": category,
+                    "generation": generation,
+                    "texts.review_id": entry["review_id"],
+                },
+                {"$pull": {"texts": {"review_id": entry["review_id"]}}},
+            )
+            for entry in entries
+        ]
+
+    @staticmethod
+    async def apply_operations(operations: List[UpdateOne]) -> None:
+        if operations:
+            await ReviewTextService.get_collection().bulk_write(
+                operations, ordered=True
+            )
+
+    @staticmethod
+    async def current_generations(gids: List[str]) -> Dict[str, Optional[str]]:
+        """The live bucket generation of each GID's aggregation."""
+        if not gids:
+            return {}
+        aggregations = await db.db.aggregation.find(
+            {"GID": {"$in": gids}}, {"GID": 1, "text_generation": 1}
+        ).to_list(None)
+        return {
+            aggregation["GID"]: aggregation.get("text_generation")
+            for aggregation in aggregations
+        }
+
+    @staticmethod
+    async def write_generation(
+        GID: str, entries_by_category: Dict[str, List[Dict[str, Any]]]
+    ) -> str:
+        """Writes every bucket for a GID as a new generation, used by full
+        aggregation rebuilds; nothing reads it until it is made live."""
+        generation = uuid.uuid4().hex
+        size = settings.REVIEW_TEXT_BUCKET_SIZE
+        buckets = [
+            {
+                "GID": GID,
+                "category": category,
+                "generation": generation,
+                "count": len(entries[start : start + size]),
+                "texts": entries[start : start + size],
+            }
+            for category, entries in entries_by_category.items()
+            for start in range(0, len(entries), size)
+        ]
+        if buckets:
+            await ReviewTextService.get_collection().insert_many(buckets)
+        return generation
+
+    @staticmethod
+    async def drop_generation(GID: str, generation: str) -> None:
+        """Drops a generation that never became live."""
+        await ReviewTextService.get_collection().delete_many(
+            {"GID": GID, "generation": generation}
+        )
+
+    @staticmethod
+    async def drop_other_generations(GID: str, generation: str) -> None:
+        """Drops every generation but the live one once it was swapped in."""
+        await ReviewTextService.get_collection().delete_many(
+            {"GID": GID, "generation": {"$ne": generation}}
+        )
+
+    @staticmethod
+    async def get_texts(
+        GID: str,
+        category: str,
+        limit: Optional[int] = None,
+        generation: Optional[str] = None,
+    ) -> List[str]:
+        """Returns a category's texts oldest first, or the newest ``limit``,
+        from the aggregation's ``text_generation``."""
+        collection = ReviewTextService.get_collection()
+        buckets = (
+            await collection.find(
+                {"GID": GID, "category": category, "generation": generation},
+                {"texts": 1},
+            )
+            .sort("_id", 1)
+            .to_list(None)
+        )
+        texts = [entry["text"] for bucket in buckets for entry in bucket["texts"]]
+        return texts[-limit:] if limit else texts
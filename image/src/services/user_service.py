@@ -4,6 +4,7 @@ from fastapi import HTTPException
 from models.user_model import UserModel, UserCreate, UserResponse
 import logging
 from bson.errors import InvalidId
+from db.writes import insert_returning, update_returning
 
 logger = logging.getLogger(__name__)
 
@@ -34,8 +35,7 @@ class UserService:
             # #logger.debug(f"Creating user: {user}")
             collection = UserService.get_collection()
             user_dict = user.model_dump()
-            result = await collection.insert_one(user_dict)
-            created_user = await collection.find_one({"_id": result.inserted_id})
+            created_user = await insert_returning(collection, user_dict)
             # #logger.debug(f"Created user: {created_user}")
             return UserResponse.model_validate(created_user)
         except Exception as e:
@@ -66,15 +66,14 @@ class UserService:
             # #logger.debug(f"Updating user ID: {user_id} with data: {user}")
             collection = UserService.get_collection()
             user_dict = user.model_dump()
-            result = await collection.update_one(
-                {"_id": ObjectId(user_id)}, {"$set": user_dict}
+            updated_user = await update_returning(
+                collection, {"_id": ObjectId(user_id)}, {"$set": user_dict}
             )
-            if result.modified_count == 0:
+            if updated_user is None:
                 # #logger.debug("No user updated, user not found")
                 return None
-            updated_user = await UserService.get_user(user_id)
             # #logger.debug(f"Updated user: {updated_user}")
-            return updated_user
+            return UserResponse.model_validate(updated_user)
         except Exception as e:
             logger.error(f"Error updating user: {str(e)}")
             raise
@@ -0,0 +1,246 @@
+"""In-memory stand-in for the Motor database, for tests of service logic.
+
+Unlike ``benchmarks/fakes.py``, writes really apply: ``bulk_write`` runs its
+``UpdateOne`` operations and updates support ``$set``, ``$unset``, ``$inc``
+(including positional paths such as ``"mobility_accessibility_rating.0"``),
+``$setOnInsert``, ``$push`` with ``$each``/``$slice`` and ``$pull`` with
+``$in``. Filters support top-level equality, ``$in``, ``$ne`` and
+``$exists``; a missing field equals None, as in MongoDB. Tuples are stored
+as lists, as BSON would.
+"""
+
+import copy
+from types import SimpleNamespace
+
+from bson import ObjectId
+
+
+def _stored(value):
+    if isinstance(value, (list, tuple)):
+        return [_stored(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _stored(item) for key, item in value.items()}
+    return value
+
+
+def _matches_value(actual, condition):
+    if isinstance(condition, dict) and any(key.startswith("$") for key in condition):
+        for operator, operand in condition.items():
+            if operator == "$in" and actual not in operand:
+                return False
+            if operator == "$ne" and actual == operand:
+                return False
+            if operator == "$exists" and (actual is not None) != bool(operand):
+                return False
+        return True
+    return actual == condition
+
+
+def matches(document, query):
+    return all(
+        _matches_value(document.get(key), condition)
+        for key, condition in query.items()
+    )
+
+
+def _parent(document, path):
+    *parents, last = path.split(".")
+    target = document
+    for key in parents:
+        if isinstance(target, list):
+            target = target[int(key)]
+        else:
+            target = target.setdefault(key, {})
+    return target, (int(last) if isinstance(target, list) else last)
+
+
+def apply_update(document, update, inserting=False):
+    for path, value in update.get("$set", {}).items():
+        target, key = _parent(document, path)
+        target[key] = _stored(value)
+    if inserting:
+        for path, value in update.get("$setOnInsert", {}).items():
+            target, key = _parent(document, path)
+            target[key] = _stored(value)
+    for path in update.get("$unset", {}):
+        target, key = _parent(document, path)
+        if isinstance(target, dict):
+            target.pop(key, None)
+    for path, amount in update.get("$inc", {}).items():
+        target, key = _parent(document, path)
+        current = target[key] if isinstance(target, list) else target.get(key, 0)
+        target[key] = current + amount
+    for path, value in update.get("$push", {}).items():
+        target, key = _parent(document, path)
+        items = target.setdefault(key, [])
+        if isinstance(value, dict) and "$each" in value:
+            items.extend(_stored(value["$each"]))
+            if "$slice" in value:
+                items[:] = items[value["$slice"] :]
+        else:
+            items.append(_stored(value))
+    for path, condition in update.get("$pull", {}).items():
+        target, key = _parent(document, path)
+        target[key] = [
+            item
+            for item in target.get(key, [])
+            if not _matches_value(item, condition)
+        ]
+
+
+class MemoryCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, key, direction=1):
+        self.documents.sort(key=lambda d: d.get(key), reverse=direction < 0)
+        return self
+
+    async def to_list(self, length=None):
+        return self.documents if length is None else self.documents[:length]
+
+
+class MemoryCollection:
+    def __init__(self, name):
+        self.name = name
+        self.documents = []
+        # Awaited once, right after the next write, so a test can run another
+        # writer at exactly that point.
+        self.after_write = None
+
+    async def _written(self):
+        if self.after_write is not None:
+            hook, self.after_write = self.after_write, None
+            await hook()
+
+    def _project(self, document, projection):
+        document = copy.deepcopy(document)
+        if not projection:
+            return document
+        if any(projection.values()):
+            return {
+                key: value
+                for key, value in document.items()
+                if key == "_id" or projection.get(key)
+            }
+        return {key: value for key, value in document.items() if key not in projection}
+
+    def _find(self, query):
+        return next((d for d in self.documents if matches(d, query)), None)
+
+    def find(self, query=None, projection=None):
+        return MemoryCursor(
+            [
+                self._project(document, projection)
+                for document in self.documents
+                if matches(document, query or {})
+            ]
+        )
+
+    async def find_one(self, query, projection=None, sort=None):
+        document = self._find(query)
+        return self._project(document, projection) if document else None
+
+    async def insert_one(self, document):
+        document.setdefault("_id", ObjectId())
+        self.documents.append(_stored(document))
+        await self._written()
+        return SimpleNamespace(inserted_id=document["_id"])
+
+    async def insert_many(self, documents, ordered=True):
+        for document in documents:
+            document.setdefault("_id", ObjectId())
+            self.documents.append(_stored(document))
+        await self._written()
+
+    def _update(self, query, update, upsert):
+        document = self._find(query)
+        if document is not None:
+            before = copy.deepcopy(document)
+            apply_update(document, update)
+            return before, document, False
+        if not upsert:
+            return None, None, False
+        fields = {k: v for k, v in query.items() if not isinstance(v, dict)}
+        document = {"_id": ObjectId(), **fields}
+        apply_update(document, update, inserting=True)
+        self.documents.append(document)
+        return None, document, True
+
+    async def find_one_and_update(
+        self, query, update, upsert=False, return_document=False, projection=None
+    ):
+        before, after, _ = self._update(query, update, upsert)
+        await self._written()
+        # ReturnDocument.BEFORE is False, AFTER is True.
+        result = after if return_document else before
+        return self._project(result, projection) if result else None
+
+    async def find_one_and_replace(self, query, replacement, return_document=False):
+        document = self._find(query)
+        if document is None:
+            return None
+        before = copy.deepcopy(document)
+        document.clear()
+        document.update(_stored({**replacement, "_id": before["_id"]}))
+        await self._written()
+        return copy.deepcopy(document) if return_document else before
+
+    async def find_one_and_delete(self, query):
+        document = self._find(query)
+        if document is None:
+            return None
+        self.documents.remove(document)
+        await self._written()
+        return document
+
+    async def update_one(self, query, update, upsert=False):
+        before, after, upserted = self._update(query, update, upsert)
+        await self._written()
+        return SimpleNamespace(
+            matched_count=int(before is not None),
+            modified_count=int(before is not None),
+            upserted_id=after["_id"] if upserted else None,
+        )
+
+    async def update_many(self, query, update):
+        matched = [d for d in self.documents if matches(d, query)]
+        for document in matched:
+            apply_update(document, update)
+        return SimpleNamespace(matched_count=len(matched), modified_count=len(matched))
+
+    async def delete_many(self, query):
+        kept = [d for d in self.documents if not matches(d, query)]
+        deleted = len(self.documents) - len(kept)
+        self.documents = kept
+        return SimpleNamespace(deleted_count=deleted)
+
+    async def count_documents(self, query):
+        return sum(1 for d in self.documents if matches(d, query))
+
+    async def create_index(self, *args, **kwargs):
+        return None
+
+    async def bulk_write(self, operations, ordered=True):
+        matched = upserted = 0
+        for operation in operations:
+            before, _, inserted = self._update(
+                operation._filter, operation._doc, operation._upsert
+            )
+            matched += before is not None
+            upserted += inserted
+        return SimpleNamespace(
+            matched_count=matched, modified_count=matched, upserted_count=upserted
+        )
+
+
+class MemoryDatabase:
+    def __init__(self):
+        self._collections = {}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(name)
+        return self._collections[name]
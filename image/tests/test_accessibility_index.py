@@ -0,0 +1,115 @@
+"""Tests that row updates leave the accessibility index as a rebuild would.
+
+Usage (from image/):
+    python -m pytest tests
+"""
+
+import asyncio
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+# Settings() requires these at import time; nothing here connects anywhere.
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+
+from memory_db import MemoryDatabase  # noqa: E402
+
+from core.cache import accessibility_index_cache  # noqa: E402
+from db.mongodb import db  # noqa: E402
+from services.accessibility_index import (  # noqa: E402
+    AccessibilityIndex,
+    encode_categories,
+)
+
+COMPARED_ARRAYS = [
+    "rating_sums",
+    "rating_counts",
+    "present",
+    "feature_true",
+    "feature_total",
+    "scores",
+    "decayed_scores",
+    "category_masks",
+    "decayed_category_masks",
+    "feature_masks",
+]
+
+
+def aggregation(GID, rating, ramps=(1, 1), version=1):
+    return {
+        "GID": GID,
+        "version": version,
+        "mobility_accessibility_rating": [rating, 1],
+        "mobility_accessibility_decayed_rating_sum": float(rating),
+        "mobility_accessibility_decayed_weight": 1.0,
+        "mobility_accessibility_dict": {"slopedramps": list(ramps)},
+    }
+
+
+def assert_same_rows(index, rebuilt):
+    rows = [index.gid_rows[GID] for GID in rebuilt.gids]
+    assert [index.row_versions[row] for row in rows] == rebuilt.row_versions
+    for name in COMPARED_ARRAYS:
+        assert np.array_equal(getattr(index, name)[rows], getattr(rebuilt, name))
+
+
+@pytest.fixture
+def database(monkeypatch):
+    memory = MemoryDatabase()
+    monkeypatch.setattr(db, "db", memory)
+    monkeypatch.setattr(AccessibilityIndex, "stale", set())
+    accessibility_index_cache.clear()
+    yield memory
+    accessibility_index_cache.clear()
+
+
+def test_update_matches_a_rebuild():
+    index = AccessibilityIndex([aggregation("a", 5), aggregation("b", 4)])
+    changed = [aggregation("b", 1, ramps=(0, 2), version=2), aggregation("c", 5)]
+    index.update(changed)
+
+    rebuilt = AccessibilityIndex([aggregation("a", 5), *changed])
+    assert_same_rows(index, rebuilt)
+    mask = encode_categories(["mobility_accessibility"])
+    assert sorted(index.gids[row] for row in index.match(mask)) == ["a", "c"]
+
+
+def test_match_version_only_changes_with_the_masks():
+    index = AccessibilityIndex([aggregation("a", 5), aggregation("b", 4)])
+    version, match_version = index.version, index.match_version
+
+    # Still passes the threshold: scores change, masks do not.
+    index.update([aggregation("b", 5, version=2)])
+    assert index.version != version
+    assert index.match_version == match_version
+
+    index.update([aggregation("b", 1, version=3)])
+    assert index.match_version != match_version
+    assert index.row_version("b") == 3
+
+
+def test_load_rereads_only_refreshed_rows(database):
+    async def run():
+        await database.aggregation.insert_one(aggregation("a", 5))
+        await database.aggregation.insert_one(aggregation("b", 5))
+        index = await AccessibilityIndex.load()
+
+        await database.aggregation.update_one(
+            {"GID": "b"}, {"$set": aggregation("b", 1, version=2)}
+        )
+        await AccessibilityIndex.refresh(["b"])
+
+        assert await AccessibilityIndex.load() is index
+        rebuilt = AccessibilityIndex(await database.aggregation.find().to_list(None))
+        assert_same_rows(index, rebuilt)
+        assert not AccessibilityIndex.stale
+
+    asyncio.run(run())
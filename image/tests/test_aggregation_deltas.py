@@ -0,0 +1,278 @@
+"""Tests that review deltas keep aggregations equal to a full rebuild.
+
+Runs the services against ``memory_db``; the text buckets, history, building
+ratings and duplicate detection are replaced by no-ops, since only the
+aggregation documents are checked.
+
+Usage (from image/):
+    python -m pytest tests
+"""
+
+import asyncio
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+# Settings() requires these at import time; nothing here connects anywhere.
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import pytest  # noqa: E402
+from bson import ObjectId  # noqa: E402
+
+from memory_db import MemoryDatabase  # noqa: E402
+
+from app_logic.review_bulding_bridge import ReviewBuildingBridge  # noqa: E402
+from core.config import settings  # noqa: E402
+from db.mongodb import db  # noqa: E402
+from db.writes import cas_stats  # noqa: E402
+from models.aggregation_model import ACCESSIBILITY_CATEGORIES  # noqa: E402
+from models.review_model import ReviewCreate, ReviewModel  # noqa: E402
+from services.accessible_set_service import AccessibleSetService  # noqa: E402
+from services.aggregation_delta import fold_reviews  # noqa: E402
+from services.aggregation_history_service import (  # noqa: E402
+    AggregationHistoryService,
+)
+from services.aggregation_service import AggregationService  # noqa: E402
+from services.aggregation_worker import AggregationWorker  # noqa: E402
+from services.review_duplicate_service import ReviewDuplicateService  # noqa: E402
+from services.review_service import ReviewService  # noqa: E402
+from services.review_text_service import ReviewTextService  # noqa: E402
+
+GID = "test-gid"
+COMPARED_FIELDS = [
+    f"{category}_{field}"
+    for category in ACCESSIBILITY_CATEGORIES
+    for field in ("dict", "rating", "text_count")
+]
+
+
+async def _nothing(*args, **kwargs):
+    return None
+
+
+@pytest.fixture
+def database(monkeypatch):
+    memory = MemoryDatabase()
+    monkeypatch.setattr(db, "db", memory)
+
+    async def no_generations(gids):
+        return {}
+
+    async def new_generation(GID, entries):
+        return "generation"
+
+    for service, name in [
+        (ReviewTextService, "apply_operations"),
+        (ReviewTextService, "drop_generation"),
+        (ReviewTextService, "drop_other_generations"),
+        (AggregationHistoryService, "apply_deltas"),
+        (AggregationHistoryService, "rebuild"),
+        (AccessibleSetService, "refresh"),
+        (ReviewDuplicateService, "flag"),
+        (ReviewDuplicateService, "record"),
+        (ReviewDuplicateService, "forget"),
+        (ReviewDuplicateService, "reflag_dependents"),
+        (ReviewBuildingBridge, "apply_review"),
+    ]:
+        monkeypatch.setattr(service, name, _nothing)
+    monkeypatch.setattr(ReviewTextService, "current_generations", no_generations)
+    monkeypatch.setattr(ReviewTextService, "write_generation", new_generation)
+    return memory
+
+
+def review(rating, text="Ramp at the side door", **fields):
+    return {
+        "user_name": "tester",
+        "GID": GID,
+        "mobility_accessibility_rating": rating,
+        "mobility_accessibility_text": text,
+        "mobility_accessibility_dict": {"slopedramps": "true"},
+        **fields,
+    }
+
+
+async def stored_review(database, rating, **fields):
+    document = {"_id": ObjectId(), **review(rating, **fields)}
+    await database.reviews.insert_one(document)
+    return document
+
+
+async def totals(database):
+    aggregation = await database.aggregation.find_one({"GID": GID})
+    return {field: aggregation.get(field) for field in COMPARED_FIELDS}
+
+
+async def rebuilt_totals():
+    aggregation, _ = await AggregationService._recompute_aggregation(GID)
+    return {
+        field: value
+        for field, value in aggregation.model_dump(mode="json").items()
+        if field in COMPARED_FIELDS
+    }
+
+
+def test_rebuild_before_a_delta_lands_is_not_counted_twice(database):
+    async def run():
+        versions = await AggregationService.rebuild_versions([GID])
+        document = await stored_review(database, 4)
+        # The rebuild already counts the review the delta is about to add.
+        await AggregationService.update_aggregation(GID)
+        deltas = fold_reviews([ReviewModel.model_validate(document)])
+        await AggregationService.apply_deltas(deltas.values(), versions)
+
+        assert (await totals(database))["mobility_accessibility_rating"] == [4, 1]
+        assert await totals(database) == await rebuilt_totals()
+
+    asyncio.run(run())
+
+
+def test_rebuild_during_an_edit_is_not_counted_twice(database):
+    async def run():
+        document = await stored_review(database, 4)
+        await AggregationService.update_aggregation(GID)
+        database.reviews.after_write = lambda: AggregationService.update_aggregation(
+            GID
+        )
+        conflicts = cas_stats["aggregation"]["delta_conflicts"]
+
+        await ReviewService.update_review(
+            str(document["_id"]), ReviewCreate.model_validate(review(2))
+        )
+
+        assert (await totals(database))["mobility_accessibility_rating"] == [2, 1]
+        assert await totals(database) == await rebuilt_totals()
+        assert cas_stats["aggregation"]["delta_conflicts"] == conflicts + 1
+
+    asyncio.run(run())
+
+
+def test_rebuild_during_a_delete_is_not_counted_twice(database):
+    async def run():
+        kept = await stored_review(database, 5)
+        deleted = await stored_review(database, 3, mobility_accessibility_text="Lift")
+        await AggregationService.update_aggregation(GID)
+        database.reviews.after_write = lambda: AggregationService.update_aggregation(
+            GID
+        )
+
+        assert await ReviewService.delete_review(str(deleted["_id"]))
+
+        assert (await totals(database))["mobility_accessibility_rating"] == [5, 1]
+        assert await totals(database) == await rebuilt_totals()
+        assert await database.reviews.find_one({"_id": kept["_id"]})
+
+    asyncio.run(run())
+
+
+def test_concurrent_deltas_apply_without_rebuilding(database):
+    async def run():
+        conflicts = cas_stats["aggregation"]["delta_conflicts"]
+        first = await AggregationService.rebuild_versions([GID])
+        second = await AggregationService.rebuild_versions([GID])
+        documents = [await stored_review(database, 4), await stored_review(database, 2)]
+        for document, versions in zip(documents, [first, second]):
+            deltas = fold_reviews([ReviewModel.model_validate(document)])
+            await AggregationService.apply_deltas(deltas.values(), versions)
+
+        assert (await totals(database))["mobility_accessibility_rating"] == [6, 2]
+        assert await totals(database) == await rebuilt_totals()
+        assert cas_stats["aggregation"]["delta_conflicts"] == conflicts
+
+    asyncio.run(run())
+
+
+def test_created_edited_and_deleted_review_leaves_totals_at_baseline(database):
+    async def run():
+        await stored_review(database, 5, mobility_accessibility_text="Wide doors")
+        await AggregationService.update_aggregation(GID)
+        baseline = await totals(database)
+
+        created = await ReviewService.create_review(
+            ReviewCreate.model_validate(review(4))
+        )
+        assert (await totals(database))["mobility_accessibility_rating"] == [9, 2]
+        assert await totals(database) == await rebuilt_totals()
+
+        await ReviewService.update_review(
+            created.id, ReviewCreate.model_validate(review(2, text="Steep ramp"))
+        )
+        assert (await totals(database))["mobility_accessibility_rating"] == [7, 2]
+        assert await totals(database) == await rebuilt_totals()
+
+        assert await ReviewService.delete_review(created.id)
+        assert await totals(database) == baseline
+
+    asyncio.run(run())
+
+
+def test_outbox_worker_applies_reviews_as_deltas(database, monkeypatch):
+    monkeypatch.setattr(settings, "AGGREGATION_WORKER_MODE", "outbox")
+
+    async def run():
+        worker = AggregationWorker()
+        for rating in (4, 2):
+            await ReviewService.create_review(
+                ReviewCreate.model_validate(review(rating))
+            )
+        assert await database.aggregation.find_one({"GID": GID}) is None
+
+        assert await worker.process_outbox_once() == 2
+        assert (await totals(database))["mobility_accessibility_rating"] == [6, 2]
+        assert await totals(database) == await rebuilt_totals()
+        assert (worker.reviews_applied, worker.rebuilds) == (2, 0)
+        assert not await database.reviews.count_documents(
+            {"pending_aggregation": {"$exists": True}}
+        )
+        assert await worker.process_outbox_once() == 0
+
+    asyncio.run(run())
+
+
+def test_outbox_worker_rebuilds_reviews_it_cannot_claim(database, monkeypatch):
+    monkeypatch.setattr(settings, "AGGREGATION_WORKER_MODE", "outbox")
+
+    async def run():
+        worker = AggregationWorker()
+        claimed = await ReviewService.create_review(
+            ReviewCreate.model_validate(review(4))
+        )
+        deleted = await ReviewService.create_review(
+            ReviewCreate.model_validate(review(1, text="No lift"))
+        )
+        # Claimed by a run that stopped before applying it.
+        await database.reviews.update_one(
+            {"_id": ObjectId(claimed.id)}, {"$unset": {"pending_aggregation": ""}}
+        )
+        # Deleted before the worker got to it.
+        assert await ReviewService.delete_review(deleted.id)
+
+        assert await worker.process_outbox_once() == 2
+        assert (await totals(database))["mobility_accessibility_rating"] == [4, 1]
+        assert await totals(database) == await rebuilt_totals()
+        assert worker.rebuilds == 1
+
+    asyncio.run(run())
+
+
+def test_sweep_applies_reviews_whose_events_are_gone(database, monkeypatch):
+    monkeypatch.setattr(settings, "AGGREGATION_WORKER_MODE", "change_stream")
+
+    async def run():
+        worker = AggregationWorker()
+        for rating in (5, 3, 4):
+            await ReviewService.create_review(
+                ReviewCreate.model_validate(review(rating))
+            )
+        assert await database.aggregation.find_one({"GID": GID}) is None
+
+        assert await worker.sweep_pending() == 3
+        assert (await totals(database))["mobility_accessibility_rating"] == [12, 3]
+        assert await totals(database) == await rebuilt_totals()
+        assert await worker.sweep_pending() == 0
+
+    asyncio.run(run())
@@ -0,0 +1,37 @@
+"""Unit tests for review search stemming.
+
+Usage (from image/):
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+# Settings() requires these at import time; nothing here connects anywhere.
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import pytest  # noqa: E402
+
+from services.review_search_service import _stem  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "word, stem",
+    [
+        ("studies", "study"),
+        ("cities", "city"),
+        ("ponies", "pony"),
+        ("study", "study"),
+        ("studying", "study"),
+        ("ramps", "ramp"),
+        ("lies", "lie"),
+    ],
+)
+def test_stem(word, stem):
+    assert _stem(word) == stem